@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+测试 websocket 音频路径每秒音频的内存分配
+
+Measures how much memory the websocket audio path allocates per second of
+audio, comparing pipecat's defaults with the ring buffer path:
+
+  * input: protobuf deserialization + VAD buffering (16 kHz)
+  * output: resampling 16 kHz TTS audio to 24 kHz + chunking + serialization
+
+Allocations are measured with tracemalloc as the transient peak of every
+step, summed over the run (so memory that is freed right away still counts).
+
+    python bench_audio_buffer.py --seconds 30
+"""
+
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+from pipecat.audio.vad.silero import SileroVADAnalyzer
+from pipecat.frames.frames import OutputAudioRawFrame, TTSAudioRawFrame
+from pipecat.serializers.protobuf import ProtobufFrameSerializer
+from pipecat.transports.base_output import BaseOutputTransport
+from pipecat.transports.base_transport import TransportParams
+
+from src.bots.audio_buffer import RingBufferMediaSender
+from src.bots.vad import SharedSileroVADAnalyzer
+from src.bots.webrtc.frame_serializer import BotFrameSerializer
+
+IN_RATE = 16000
+OUT_RATE = 24000
+# Clients send 20 ms frames, Cartesia sends larger chunks.
+INPUT_FRAME_MS = 20
+TTS_FRAME_MS = 200
+OUTPUT_CHUNK_BYTES = OUT_RATE // 100 * 2 * 4
+
+
+class _Sink:
+    """Stands in for the media sender's audio queue."""
+
+    def __init__(self):
+        self.frames = []
+
+    async def put(self, frame):
+        self.frames.append(frame)
+
+
+class Allocations:
+    def __init__(self):
+        self.bytes = 0
+        self.time = 0.0
+
+    def __enter__(self):
+        tracemalloc.reset_peak()
+        self._base = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.time += time.perf_counter() - self._start
+        self.bytes += tracemalloc.get_traced_memory()[1] - self._base
+
+
+def speech(seconds: float, rate: int) -> np.ndarray:
+    t = np.arange(int(seconds * rate)) / rate
+    return (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16)
+
+
+async def bench_input(serializer, vad, audio: np.ndarray) -> Allocations:
+    vad.set_sample_rate(IN_RATE)
+    step = IN_RATE * INPUT_FRAME_MS // 1000
+    # Messages as the client would send them, built outside the measurement.
+    messages = [
+        await ProtobufFrameSerializer().serialize(
+            OutputAudioRawFrame(audio[i : i + step].tobytes(), IN_RATE, 1)
+        )
+        for i in range(0, len(audio) - step + 1, step)
+    ]
+
+    allocations = Allocations()
+    for message in messages:
+        with allocations:
+            frame = await serializer.deserialize(message)
+            vad.analyze_audio(frame.audio)
+    return allocations
+
+
+async def bench_output(sender_cls, serializer, audio: np.ndarray) -> Allocations:
+    sender = sender_cls(
+        None,
+        destination=None,
+        sample_rate=OUT_RATE,
+        audio_chunk_size=OUTPUT_CHUNK_BYTES,
+        params=TransportParams(audio_out_enabled=True),
+    )
+    step = IN_RATE * TTS_FRAME_MS // 1000
+    frames = [
+        TTSAudioRawFrame(audio[i : i + step].tobytes(), IN_RATE, 1)
+        for i in range(0, len(audio) - step + 1, step)
+    ]
+
+    allocations = Allocations()
+    for frame in frames:
+        sink = _Sink()
+        sender._audio_queue = sink
+        with allocations:
+            await sender.handle_audio_frame(frame)
+            for chunk in sink.frames:
+                await serializer.serialize(OutputAudioRawFrame(chunk.audio, OUT_RATE, 1))
+    return allocations
+
+
+def report(name: str, allocations: Allocations, seconds: float):
+    print(
+        f"{name:32s} {allocations.bytes / seconds / 1024:10.1f} KiB/s of audio  "
+        f"{allocations.time / seconds * 1000:7.2f} ms/s of audio"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=30)
+    args = parser.parse_args()
+
+    # A single stream never has anyone to batch with, don't wait for them.
+    os.environ.setdefault("VAD_BATCH_WINDOW_MS", "0")
+
+    audio = speech(args.seconds, IN_RATE)
+    tracemalloc.start()
+
+    report(
+        "input  pipecat (protobuf+silero)",
+        await bench_input(ProtobufFrameSerializer(), SileroVADAnalyzer(), audio),
+        args.seconds,
+    )
+    report(
+        "input  ring buffer",
+        await bench_input(BotFrameSerializer(), SharedSileroVADAnalyzer(), audio),
+        args.seconds,
+    )
+    report(
+        "output pipecat (soxr+bytearray)",
+        await bench_output(BaseOutputTransport.MediaSender, ProtobufFrameSerializer(), audio),
+        args.seconds,
+    )
+    report(
+        "output ring buffer",
+        await bench_output(RingBufferMediaSender, BotFrameSerializer(), audio),
+        args.seconds,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+测试列表接口每条记录的 CPU 开销：Beanie 文档与原始投影
+
+Compares the CPU time per listed document of the two read paths of the
+conversation and message list endpoints:
+
+  * beanie: Beanie documents (validators included), .dict(by_alias=True),
+    the response model, then FastAPI style model_dump + json.dumps
+  * raw: a projected Motor cursor, plain dicts and one dumps() call
+    (orjson when installed)
+
+Seeds --conversations conversations and one conversation of --messages
+messages in the MongoDB in MONGODB_URL, reads them back in pages of
+--page-size, and deletes them afterwards.
+
+    python bench_list_endpoints.py --conversations 2000 --messages 5000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING
+
+from src.common.database import MongoDB
+from src.common.models import Conversation, ConversationModel, Message, MessageModel
+from src.webapp import serializers
+from src.webapp.serializers import (
+    CONVERSATION_PROJECTION,
+    MESSAGE_PROJECTION,
+    conversation_json,
+    dumps,
+    message_json,
+)
+
+BENCH_TITLE = "bench_list_endpoints"
+
+
+async def seed(conversations: int, messages: int) -> str:
+    start = datetime.utcnow()
+    await Conversation.get_motor_collection().insert_many(
+        [
+            {
+                "title": BENCH_TITLE,
+                "archived": True,
+                "createdAt": start - timedelta(seconds=i),
+                "updatedAt": start - timedelta(seconds=i),
+                "messageCount": 0,
+                "createdBy": str(ObjectId()),
+                "isRemove": False,
+            }
+            for i in range(conversations)
+        ]
+    )
+    conversation_id = str(ObjectId())
+    await Message.get_motor_collection().insert_many(
+        [
+            {
+                "_id": str(ObjectId()),
+                "conversationId": conversation_id,
+                "content": {"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i} " * 8},
+                "messageNumber": i + 1,
+                "language_code": "english",
+                "createdAt": start + timedelta(milliseconds=i),
+                "updatedAt": start + timedelta(milliseconds=i),
+                "extra_metadata": {"source": "bench"},
+            }
+            for i in range(messages)
+        ]
+    )
+    return conversation_id
+
+
+def to_json(model) -> bytes:
+    # What FastAPI does with a response_model.
+    return json.dumps(model.model_dump(mode="json", by_alias=True)).encode()
+
+
+async def conversations_beanie(page_size: int, skip: int) -> int:
+    docs = (
+        await Conversation.find({"archived": True, "title": BENCH_TITLE})
+        .sort([("updatedAt", DESCENDING), ("_id", DESCENDING)])
+        .skip(skip)
+        .limit(page_size)
+        .to_list()
+    )
+    for doc in docs:
+        to_json(ConversationModel.model_validate(doc.dict(by_alias=True)))
+    return len(docs)
+
+
+async def conversations_raw(page_size: int, skip: int) -> int:
+    docs = (
+        await Conversation.get_motor_collection()
+        .find({"archived": True, "title": BENCH_TITLE}, CONVERSATION_PROJECTION)
+        .sort([("updatedAt", DESCENDING), ("_id", DESCENDING)])
+        .skip(skip)
+        .limit(page_size)
+        .to_list(page_size)
+    )
+    dumps({"conversations": [conversation_json(doc) for doc in docs]})
+    return len(docs)
+
+
+def messages_beanie(conversation_id: str):
+    async def page(page_size: int, skip: int) -> int:
+        docs = (
+            await Message.find({"conversationId": conversation_id})
+            .sort([("createdAt", ASCENDING), ("_id", ASCENDING)])
+            .skip(skip)
+            .limit(page_size)
+            .to_list()
+        )
+        for doc in docs:
+            data = doc.dict()
+            data["_id"] = data.pop("id")
+            to_json(MessageModel.model_validate(data))
+        return len(docs)
+
+    return page
+
+
+def messages_raw(conversation_id: str):
+    async def page(page_size: int, skip: int) -> int:
+        docs = (
+            await Message.get_motor_collection()
+            .find({"conversationId": conversation_id}, MESSAGE_PROJECTION)
+            .sort([("createdAt", ASCENDING), ("_id", ASCENDING)])
+            .skip(skip)
+            .limit(page_size)
+            .to_list(page_size)
+        )
+        dumps({"messages": [message_json(doc, conversation_id) for doc in docs]})
+        return len(docs)
+
+    return page
+
+
+async def run(name: str, read_page, total: int, page_size: int):
+    # One warm-up page so first connections and imports aren't measured.
+    await read_page(page_size, 0)
+    read = 0
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    while read < total:
+        count = await read_page(page_size, read)
+        if not count:
+            break
+        read += count
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    print(
+        f"{name:24s} {read:7d} docs  cpu {cpu / read * 1e6:8.1f} us/doc  "
+        f"wall {wall / read * 1e6:8.1f} us/doc"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    load_dotenv()
+    await MongoDB.init([Conversation, Message])
+    print(f"serializer: {'orjson' if serializers.orjson else 'json'}")
+    conversation_id = await seed(args.conversations, args.messages)
+    try:
+        await run("conversations beanie", conversations_beanie, args.conversations, args.page_size)
+        await run("conversations raw", conversations_raw, args.conversations, args.page_size)
+        await run("messages beanie", messages_beanie(conversation_id), args.messages, args.page_size)
+        await run("messages raw", messages_raw(conversation_id), args.messages, args.page_size)
+    finally:
+        await Conversation.get_motor_collection().delete_many({"title": BENCH_TITLE, "archived": True})
+        await Message.get_motor_collection().delete_many({"conversationId": conversation_id})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
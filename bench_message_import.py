@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+测试批量导入消息的吞吐量：逐条创建与批量导入
+
+Compares importing a conversation's messages one POST /messages call at a
+time (--concurrency calls in flight) with a single call to the bulk import
+endpoint, as NDJSON and as a JSON array, in messages per second. Requests
+go through the ASGI app in process, so the numbers are the server side cost
+against the MongoDB in MONGODB_URL. The messages are deleted afterwards.
+
+    python bench_message_import.py --messages 10000 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from dotenv import load_dotenv
+from fastapi import FastAPI
+
+from src.common.database import MongoDB
+from src.common.models import Attachment, Conversation, Message
+from src.webapp.api.conversations import router
+
+
+def make_messages(count: int) -> list:
+    return [
+        {
+            "content": {"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i} " * 8},
+            "extra_metadata": {"source": "bench"},
+        }
+        for i in range(count)
+    ]
+
+
+async def one_by_one(client: httpx.AsyncClient, conversation_id: str, messages: list, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(message: dict):
+        async with semaphore:
+            response = await client.post(f"/conversations/{conversation_id}/messages", json=message)
+            response.raise_for_status()
+
+    await asyncio.gather(*[post(message) for message in messages])
+
+
+async def bulk(client: httpx.AsyncClient, conversation_id: str, body: bytes, content_type: str):
+    async def chunks():
+        # Sent in pieces, as a client streaming its export would.
+        for i in range(0, len(body), 64 * 1024):
+            yield body[i : i + 64 * 1024]
+
+    response = await client.post(
+        f"/conversations/{conversation_id}/messages/import",
+        content=chunks(),
+        headers={"Content-Type": content_type},
+    )
+    response.raise_for_status()
+    result = response.json()
+    assert result["failed"] == 0, result["errors"][:5]
+
+
+async def run(name: str, client: httpx.AsyncClient, send):
+    response = await client.post("/conversations", json={"title": f"bench {name}"})
+    conversation_id = response.json()["_id"]
+    start = time.perf_counter()
+    count = await send(conversation_id)
+    elapsed = time.perf_counter() - start
+    print(f"{name:24s} {count:7d} messages in {elapsed:7.2f}s  {count / elapsed:9.1f} messages/s")
+    await Message.find({"conversationId": conversation_id}).delete()
+    await (await Conversation.get(conversation_id)).delete()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=16, help="POSTs in flight one by one")
+    args = parser.parse_args()
+
+    load_dotenv()
+    await MongoDB.init([Conversation, Message, Attachment])
+    app = FastAPI()
+    app.include_router(router)
+    messages = make_messages(args.messages)
+    ndjson = "\n".join(json.dumps(message) for message in messages).encode()
+    array = json.dumps(messages).encode()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+
+        async def send_one_by_one(conversation_id: str) -> int:
+            await one_by_one(client, conversation_id, messages, args.concurrency)
+            return len(messages)
+
+        async def send_ndjson(conversation_id: str) -> int:
+            await bulk(client, conversation_id, ndjson, "application/x-ndjson")
+            return len(messages)
+
+        async def send_array(conversation_id: str) -> int:
+            await bulk(client, conversation_id, array, "application/json")
+            return len(messages)
+
+        await run(f"one by one (x{args.concurrency})", client, send_one_by_one)
+        await run("import ndjson", client, send_ndjson)
+        await run("import json array", client, send_array)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+测试会话注册表各个后端的查询延迟
+
+Measures register/lookup latency of every session registry backend, plus the
+round trip of a request forwarded to another process over the Unix socket.
+
+    python bench_session_registry.py --sessions 10000 --mongo
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+from src.common.database import MongoDB
+from src.common.metrics import percentile
+from src.webapp.session_registry import SessionForwarder, create_session_registry
+
+
+def report(name: str, samples: list[float]):
+    us = [s * 1e6 for s in samples]
+    print(
+        f"{name:28s} n={len(us):6d} "
+        f"p50={percentile(us, 50):8.1f}us p99={percentile(us, 99):8.1f}us max={max(us):8.1f}us"
+    )
+
+
+async def bench_registry(name: str, url: str, sessions: int):
+    registry = create_session_registry(url)
+    ids = [uuid.uuid4().hex for _ in range(sessions)]
+
+    register = []
+    for session_id in ids:
+        start = time.perf_counter()
+        await registry.register(session_id, "unix:///tmp/owner.sock")
+        register.append(time.perf_counter() - start)
+
+    lookup = []
+    for session_id in ids:
+        start = time.perf_counter()
+        await registry.lookup(session_id)
+        lookup.append(time.perf_counter() - start)
+
+    for session_id in ids:
+        await registry.unregister(session_id)
+    await registry.close()
+
+    report(f"{name} register", register)
+    report(f"{name} lookup", lookup)
+
+
+async def bench_forward(requests: int):
+    async def handler(message: dict) -> dict:
+        return {"pc_id": message["request"]["pc_id"], "sdp": "", "type": "answer"}
+
+    forwarder = SessionForwarder()
+    await forwarder.start(handler)
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await forwarder.forward(forwarder.address, {"type": "offer", "request": {"pc_id": "x"}})
+        samples.append(time.perf_counter() - start)
+    await forwarder.stop()
+    report("forward (unix socket)", samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--mongo", action="store_true", help="Also benchmark the MongoDB backend")
+    args = parser.parse_args()
+
+    await bench_registry("memory", "memory://", args.sessions)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        await bench_registry("sqlite", f"sqlite:///{os.path.join(tmp, 'sessions.db')}", args.sessions)
+
+    if args.mongo:
+        load_dotenv()
+        await MongoDB.init([])
+        await bench_registry("mongodb", "mongodb://", args.sessions)
+
+    await bench_forward(min(args.sessions, 2000))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+测试推测式 LLM 生成对响应延迟的影响
+
+Replays scripted user turns through the user context aggregator and a fake
+LLM, with and without SpeculativeLLM:
+
+  * a scripted STT pushes interim transcripts while the user talks, then
+    VAD stop and the final transcript (after --endpointing ms)
+  * with probability --divergence the final transcript differs from the
+    last interim (the user's last word was misheard), so the speculation
+    has to be thrown away
+  * the fake LLM answers after --ttfb ms and then streams --tokens tokens
+
+Latency is measured from VAD stop to the first LLM text frame leaving the
+LLM stage, as the TTS would see it. Before that, one matching and one
+diverging turn check that a hit keeps the speculative answer and a miss
+cancels it and runs the LLM again.
+
+    python bench_speculative_llm.py --turns 50 --divergence 0.2
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from pipecat.frames.frames import (
+    EndFrame,
+    Frame,
+    InterimTranscriptionFrame,
+    LLMFullResponseEndFrame,
+    LLMTextFrame,
+    TranscriptionFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContext
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+from src.bots.fake_services import FakeLLMService
+from src.bots.speculative import SpeculativeLLM
+from src.common.metrics import metrics
+from src.common.metrics import percentile
+
+UTTERANCES = [
+    "what is the weather like in london today",
+    "can you recommend a good book about history",
+    "tell me a short story about a brave little fox",
+    "how do i make a cup of green tea",
+    "remind me what we talked about yesterday",
+]
+
+
+class ResponseCollector(FrameProcessor):
+    def __init__(self):
+        super().__init__()
+        self.first_text_at = None
+        self.done = asyncio.Event()
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, LLMTextFrame) and self.first_text_at is None:
+            self.first_text_at = time.monotonic()
+        elif isinstance(frame, LLMFullResponseEndFrame):
+            self.done.set()
+        await self.push_frame(frame, direction)
+
+
+async def scripted_turn(task: PipelineTask, utterance: str, diverge: bool, args) -> float:
+    """Queue one user turn like Deepgram would and return when VAD stopped."""
+    words = utterance.split()
+    await task.queue_frame(UserStartedSpeakingFrame())
+    for n in range(1, len(words) + 1):
+        # Every word shows up in an interim, the last one twice.
+        for _ in range(2 if n == len(words) else 1):
+            await asyncio.sleep(args.interim_interval / 1000)
+            await task.queue_frame(InterimTranscriptionFrame(" ".join(words[:n]), "user", ""))
+
+    await asyncio.sleep(args.stop_secs)
+    stopped_at = time.monotonic()
+    await task.queue_frame(UserStoppedSpeakingFrame())
+
+    final = utterance if not diverge else " ".join(words[:-1] + ["please"])
+    await asyncio.sleep(args.endpointing / 1000)
+    await task.queue_frame(TranscriptionFrame(final.capitalize() + ".", "user", ""))
+    return stopped_at
+
+
+def build_pipeline(speculative_enabled: bool, args):
+    llm = FakeLLMService(
+        ttfb=args.ttfb / 1000, tokens=args.tokens, tokens_per_second=1000 / args.token_interval
+    )
+    context = OpenAILLMContext([{"role": "system", "content": "You are a helpful assistant."}])
+    aggregator = llm.create_context_aggregator(context)
+    collector = ResponseCollector()
+    speculative = SpeculativeLLM(llm, context) if speculative_enabled else None
+
+    processors = [
+        *([speculative.listener()] if speculative else []),
+        aggregator.user(),
+        *([speculative.gate()] if speculative else []),
+        llm,
+        collector,
+        aggregator.assistant(),
+    ]
+    task = PipelineTask(Pipeline(processors))
+    return task, llm, context, collector, speculative
+
+
+async def check_outcomes(args):
+    """Assert what a matching and a diverging final do to a speculation."""
+    for diverge in (False, True):
+        metrics.reset()
+        task, llm, context, collector, _ = build_pipeline(True, args)
+        runner = PipelineRunner(handle_sigint=False)
+        run_task = asyncio.create_task(runner.run(task))
+
+        utterance = UTTERANCES[0]
+        await scripted_turn(task, utterance, diverge, args)
+        await collector.done.wait()
+        await task.queue_frame(EndFrame())
+        await run_task
+
+        counter = metrics.counter
+        assert counter("bot.llm.speculation.started") == 1, counter("bot.llm.speculation.started")
+        assert counter("bot.llm.speculation.superseded") == 0
+        user_messages = [m["content"] for m in context.messages if m["role"] == "user"]
+        if not diverge:
+            # The speculative completion is the answer, the LLM never runs again.
+            assert counter("bot.llm.speculation.hit") == 1
+            assert counter("bot.llm.speculation.miss") == 0
+            assert llm.requests == 1, llm.requests
+        else:
+            # Cancelled, and the LLM runs on the final transcript instead.
+            assert counter("bot.llm.speculation.hit") == 0
+            assert counter("bot.llm.speculation.miss") == 1
+            assert llm.requests == 2, llm.requests
+            assert user_messages[-1].lower().rstrip(".") != utterance
+        hit_rate = metrics.snapshot()["gauges"]["bot.llm.speculation.hit_rate"]
+        assert hit_rate == (0.0 if diverge else 1.0), hit_rate
+    print("speculation outcomes ok")
+
+
+async def run(name: str, speculative_enabled: bool, args) -> list[float]:
+    random.seed(args.seed)
+    metrics.reset()
+
+    task, llm, context, collector, speculative = build_pipeline(speculative_enabled, args)
+    runner = PipelineRunner(handle_sigint=False)
+    run_task = asyncio.create_task(runner.run(task))
+
+    latencies = []
+    for turn in range(args.turns):
+        utterance = UTTERANCES[turn % len(UTTERANCES)]
+        diverge = random.random() < args.divergence
+        collector.first_text_at = None
+        collector.done.clear()
+        stopped_at = await scripted_turn(task, utterance, diverge, args)
+        await collector.done.wait()
+        latencies.append(collector.first_text_at - stopped_at)
+
+    await task.queue_frame(EndFrame())
+    await run_task
+
+    hits = metrics.counter("bot.llm.speculation.hit")
+    misses = metrics.counter("bot.llm.speculation.miss")
+    print(
+        f"{name:12s} p50 {percentile(latencies, 50) * 1000:6.0f} ms  "
+        f"p90 {percentile(latencies, 90) * 1000:6.0f} ms  "
+        f"llm requests {llm.requests:4d}  tokens {llm.tokens_generated:6d}"
+        + (
+            f"  hit rate {hits / max(hits + misses, 1):5.1%}  "
+            f"wasted tokens {metrics.counter('bot.llm.speculation.wasted_tokens'):5.0f}"
+            if speculative
+            else ""
+        )
+    )
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--divergence", type=float, default=0.2, help="Share of finals that differ")
+    parser.add_argument("--ttfb", type=float, default=450, help="Fake LLM TTFB (ms)")
+    parser.add_argument("--tokens", type=int, default=30, help="Tokens per answer")
+    parser.add_argument("--token-interval", type=float, default=15, help="ms between tokens")
+    parser.add_argument("--interim-interval", type=float, default=120, help="ms between interims")
+    parser.add_argument("--stop-secs", type=float, default=0.5, help="VAD stop_secs")
+    parser.add_argument("--endpointing", type=float, default=150, help="VAD stop to final (ms)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    await check_outcomes(args)
+    await run("baseline", False, args)
+    await run("speculative", True, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+测试生成摘要的单次开销：完整 Pipeline 与直接调用 LLM 客户端
+
+Compares the per-summary overhead of the old summarization path (a new LLM
+service, Pipeline, PipelineRunner and PipelineTask per summary) with the
+pooled one-shot CompletionClient. Both talk to a local OpenAI compatible
+server that answers after --latency ms, so what's left is the client side
+cost: wall time above the server latency, allocated memory (tracemalloc
+peak per summary) and RSS growth over the run.
+
+    python bench_summarize.py --summaries 200 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import time
+import tracemalloc
+
+from aiohttp import web
+from pipecat.frames.frames import EndFrame
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.aggregators.llm_response import LLMAssistantAggregatorParams
+from pipecat.processors.aggregators.openai_llm_context import (
+    OpenAILLMContext,
+    OpenAILLMContextFrame,
+)
+from pipecat.services.openai.llm import OpenAILLMService
+
+from src.bots.llm_client import CompletionClient
+from src.bots.summarize import TITLE_PROMPT
+from src.common.metrics import percentile
+
+TITLE = "Green tea brewing tips"
+
+MESSAGES = [
+    {"role": "user", "content": "How do I make a cup of green tea?"},
+    {"role": "assistant", "content": "Heat water to about 80 degrees and steep for two minutes."},
+    {"role": "user", "content": "Can I use boiling water?"},
+    {"role": "assistant", "content": "Better not, it makes green tea bitter."},
+]
+
+
+async def start_fake_server(latency: float) -> web.AppRunner:
+    async def completions(request: web.Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        if not body.get("stream"):
+            return web.json_response(
+                {
+                    "id": "fake",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": body["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": TITLE},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {"prompt_tokens": 60, "completion_tokens": 4, "total_tokens": 64},
+                }
+            )
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for word in TITLE.split():
+            chunk = {
+                "id": "fake",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": word + " "}}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 8765).start()
+    return runner
+
+
+async def summarize_with_pipeline(base_url: str) -> str:
+    # What generate_summary_with_llm used to do for every summary.
+    llm = OpenAILLMService(api_key="fake", model="fake", base_url=base_url)
+    context = OpenAILLMContext(MESSAGES + [{"role": "user", "content": TITLE_PROMPT}])
+    aggregator = llm.create_context_aggregator(
+        context, assistant_params=LLMAssistantAggregatorParams(expect_stripped_words=False)
+    )
+    task = PipelineTask(Pipeline([llm, aggregator.assistant()]))
+    await task.queue_frames([OpenAILLMContextFrame(context), EndFrame()])
+    await PipelineRunner(handle_sigint=False).run(task)
+    return context.get_messages()[-1]["content"].strip()
+
+
+async def run(name: str, summarize, args):
+    # One warm-up call so imports and first connections aren't measured.
+    await summarize()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(latencies: list):
+        async with semaphore:
+            start = time.perf_counter()
+            title = await summarize()
+            latencies.append(time.perf_counter() - start)
+            assert title == TITLE, title
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[one(latencies) for _ in range(args.summaries)])
+    elapsed = time.perf_counter() - start
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+    # tracemalloc slows everything down, memory gets a pass of its own.
+    tracemalloc.start()
+    await asyncio.gather(*[one([]) for _ in range(args.concurrency)])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    overhead = [(latency - args.latency / 1000) * 1000 for latency in latencies]
+    print(
+        f"{name:10s} overhead p50 {percentile(overhead, 50):7.2f} ms  "
+        f"p99 {percentile(overhead, 99):7.2f} ms  "
+        f"{args.summaries / elapsed:7.1f} summaries/s  "
+        f"peak alloc {peak / 2**10 / args.concurrency:8.1f} KiB/summary  "
+        f"rss +{rss_growth / 2**10:6.1f} MiB"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--summaries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=50, help="Fake server latency (ms)")
+    args = parser.parse_args()
+
+    server = await start_fake_server(args.latency / 1000)
+    base_url = "http://127.0.0.1:8765/v1"
+    client = CompletionClient("bench.llm", api_key="fake", model="fake", base_url=base_url)
+
+    # ru_maxrss only ever grows, the lighter path goes first.
+    await run("direct", lambda: client.complete(MESSAGES + [{"role": "user", "content": TITLE_PROMPT}]), args)
+    await run("pipeline", lambda: summarize_with_pipeline(base_url), args)
+
+    await client.close()
+    await server.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
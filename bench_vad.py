@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+对比每个会话独立加载 Silero VAD 与共享批量 VAD 的内存和 CPU 开销
+
+Simulates N concurrent audio streams, each feeding a 32 ms chunk every 32 ms
+from its own thread (like each transport's VAD executor does), and reports
+memory per session and CPU per concurrent stream.
+
+    python bench_vad.py --streams 100 500 --seconds 10
+"""
+
+import argparse
+import gc
+import resource
+import threading
+import time
+
+import numpy as np
+
+from pipecat.audio.vad.silero import SileroVADAnalyzer
+
+from src.bots.vad import SharedSileroVADAnalyzer, get_vad_engine
+from src.common.metrics import metrics
+
+SAMPLE_RATE = 16000
+CHUNK_SAMPLES = 512
+CHUNK_SECONDS = CHUNK_SAMPLES / SAMPLE_RATE
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * resource.getpagesize() / (1024 * 1024)
+
+
+def make_audio(seconds: float) -> bytes:
+    rng = np.random.default_rng(0)
+    samples = (rng.standard_normal(int(SAMPLE_RATE * seconds)) * 3000).astype(np.int16)
+    return samples.tobytes()
+
+
+def run(analyzer_cls, streams: int, seconds: float) -> dict:
+    gc.collect()
+    rss_before = rss_mb()
+
+    analyzers = []
+    for _ in range(streams):
+        analyzer = analyzer_cls()
+        analyzer.set_sample_rate(SAMPLE_RATE)
+        analyzers.append(analyzer)
+
+    rss_after_setup = rss_mb()
+    audio = make_audio(seconds)
+    chunk_bytes = CHUNK_SAMPLES * 2
+    late_chunks = [0]
+    lock = threading.Lock()
+
+    def stream(analyzer):
+        next_tick = time.monotonic()
+        for offset in range(0, len(audio) - chunk_bytes, chunk_bytes):
+            analyzer.voice_confidence(audio[offset : offset + chunk_bytes])
+            next_tick += CHUNK_SECONDS
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                with lock:
+                    late_chunks[0] += 1
+
+    threads = [threading.Thread(target=stream, args=(a,)) for a in analyzers]
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.monotonic() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    total_chunks = streams * (len(audio) // chunk_bytes)
+    return {
+        "streams": streams,
+        "setup_mb_per_session": (rss_after_setup - rss_before) / streams,
+        "cpu_percent_per_stream": 100 * cpu / wall / streams,
+        "late_chunk_ratio": late_chunks[0] / total_chunks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--skip-baseline", action="store_true")
+    args = parser.parse_args()
+
+    # Load the shared model up front so its one-off cost isn't billed to sessions.
+    get_vad_engine()
+
+    for streams in args.streams:
+        variants = [("shared", SharedSileroVADAnalyzer)]
+        if not args.skip_baseline:
+            variants.insert(0, ("per-session", SileroVADAnalyzer))
+        for name, cls in variants:
+            metrics.reset()
+            result = run(cls, streams, args.seconds)
+            line = (
+                f"{name:12s} streams={result['streams']:4d} "
+                f"mem/session={result['setup_mb_per_session']:.3f}MB "
+                f"cpu/stream={result['cpu_percent_per_stream']:.3f}% "
+                f"late={result['late_chunk_ratio']:.2%}"
+            )
+            if name == "shared":
+                batch = metrics.summary("bot.vad.batch_size")
+                line += f" batch_p50={batch['p50']} batch_max={batch['max']}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
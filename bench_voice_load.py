@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+测试单台服务器能承载多少并发语音会话
+
+Load generator for the voice server. For every concurrency level it opens
+that many sessions against a running server (over /api/bot/ws or WebRTC via
+/api/bot), and each session talks: it streams an utterance of PCM in real
+time, waits for the bot to answer and listen to it, and does it again.
+
+Start the server with the stand-in services so the providers are neither
+paid nor the bottleneck (their latency and token rate are configurable,
+see src/bots/fake_services.py):
+
+    BOT_FAKE_SERVICES=1 sesame run
+
+    python bench_voice_load.py --levels 1,10,25,50 --turns 3
+    python bench_voice_load.py --transport webrtc --audio utterance.wav
+
+Per level it reports the sessions sustained (all turns answered), rejected
+(admission control) and failed, the turn latency percentiles (end of the
+utterance to the first bot audio) and the server's CPU, event loop lag and
+RSS as sampled from /api/metrics while the level ran. WebRTC needs aiortc.
+
+With --drain-check PID (the server process) it checks the graceful drain
+instead: after one session it opens another, sends SIGTERM to the server
+and asserts /api/ready answers 503 while that session keeps going, and
+that the server exits once it ends (run it with --no-reload, so the PID
+is the server itself).
+
+    BOT_FAKE_SERVICES=1 sesame run --no-reload
+    python bench_voice_load.py --drain-check $(pgrep -f "uvicorn src.webapp.main:app")
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import time
+import wave
+from typing import List, Optional
+
+import aiohttp
+import numpy as np
+import websockets
+from pipecat.frames.frames import OutputAudioRawFrame
+
+from src.bots.webrtc.frame_serializer import (
+    BotFrameSerializer,
+    encode_delimited,
+    encode_message_frame,
+)
+from src.common.metrics import percentile
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+# Bot audio louder than this (RMS of int16 samples) counts as speech.
+SPEECH_RMS = 500
+# The bot is done talking after this much quiet.
+ANSWER_END_SECONDS = 1.0
+SERVER_METRICS = "bot.voice.capacity"
+# How long the drain check gives the server to exit after the last session.
+DRAIN_EXIT_TIMEOUT_SECONDS = 30.0
+
+
+class SessionRejected(Exception):
+    pass
+
+
+def load_utterance(path: Optional[str]) -> np.ndarray:
+    """16 kHz mono int16 samples of the utterance the sessions say."""
+    if path:
+        with wave.open(path, "rb") as f:
+            samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+            if f.getnchannels() > 1:
+                samples = samples[:: f.getnchannels()]
+            rate = f.getframerate()
+        if rate != SAMPLE_RATE:
+            positions = np.arange(0, len(samples), rate / SAMPLE_RATE)
+            samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+        return samples
+
+    # Without a recording: two seconds of a synthetic vowel-like voice (a
+    # glottal pulse train through three formants, four syllables a second),
+    # which Silero takes for speech.
+    from scipy.signal import lfilter
+
+    t = np.arange(2 * SAMPLE_RATE) / SAMPLE_RATE
+    f0 = 120 + 20 * np.sin(2 * np.pi * 0.7 * t)
+    voice = (np.diff(np.floor(np.cumsum(f0 / SAMPLE_RATE)), prepend=0) > 0).astype(float)
+    for formant, bandwidth in ((700, 130), (1220, 70), (2600, 160)):
+        r = np.exp(-np.pi * bandwidth / SAMPLE_RATE)
+        theta = 2 * np.pi * formant / SAMPLE_RATE
+        voice = lfilter([1 - r], [1, -2 * r * np.cos(theta), r * r], voice)
+    voice *= np.sqrt((0.5 * (1 - np.cos(2 * np.pi * 4 * t))).clip(0, 1))
+    return (voice / np.abs(voice).max() * 0.5 * 32767).astype(np.int16)
+
+
+def rms(samples: np.ndarray) -> float:
+    return float(np.sqrt(np.mean(samples.astype(np.float32) ** 2))) if len(samples) else 0.0
+
+
+class Conversation:
+    """What one simulated caller says and hears.
+
+    ``next_frame()`` gives the 20 ms of microphone audio to send next and
+    ``heard()`` takes the bot audio as it arrives; together they play the
+    turns and time the answers.
+    """
+
+    def __init__(self, utterance: np.ndarray, turns: int, turn_timeout: float):
+        self._utterance = utterance
+        self._turns = turns
+        self._turn_timeout = turn_timeout
+        self._silence = np.zeros(FRAME_SAMPLES, dtype=np.int16)
+        self._position: Optional[int] = 0
+        self._said_at = 0.0
+        self._answered = False
+        self._last_speech = 0.0
+        self.latencies: List[float] = []
+        self.done = asyncio.Event()
+        self.error: Optional[str] = None
+
+    def next_frame(self) -> np.ndarray:
+        now = time.monotonic()
+        if self._position is not None:
+            frame = self._utterance[self._position : self._position + FRAME_SAMPLES]
+            self._position += FRAME_SAMPLES
+            if self._position >= len(self._utterance):
+                self._position = None
+                self._said_at = now
+                self._answered = False
+            if len(frame) < FRAME_SAMPLES:
+                frame = np.concatenate([frame, self._silence[len(frame) :]])
+            return frame
+
+        if not self._answered and now - self._said_at > self._turn_timeout:
+            self.error = f"no answer within {self._turn_timeout:.0f}s"
+            self.done.set()
+        elif self._answered and now - self._last_speech > ANSWER_END_SECONDS:
+            # The bot is done, the caller takes the next turn.
+            if len(self.latencies) >= self._turns:
+                self.done.set()
+            else:
+                self._position = 0
+        return self._silence
+
+    def heard(self, samples: np.ndarray):
+        if rms(samples) < SPEECH_RMS:
+            return
+        now = time.monotonic()
+        if self._position is None and not self._answered:
+            self._answered = True
+            self.latencies.append(now - self._said_at)
+        self._last_speech = now
+
+
+async def run_websocket_session(base_url: str, conversation: Conversation, args):
+    async with aiohttp.ClientSession() as http:
+        params = {"conversation_id": args.conversation_id, "bot_profile": "voice"}
+        async with http.post(f"{base_url}/api/bot/connect", json=params) as response:
+            if response.status in (429, 503):
+                raise SessionRejected(f"/connect returned {response.status}")
+            response.raise_for_status()
+            token = (await response.json())["token"]
+
+    serializer = BotFrameSerializer(length_prefixed=True)
+    ws_url = base_url.replace("http", "ws", 1) + "/api/bot/ws"
+    async with websockets.connect(ws_url, max_size=None) as websocket:
+        await websocket.send(encode_delimited(encode_message_frame({"token": token})))
+        try:
+            await websocket.recv()
+        except websockets.ConnectionClosed as e:
+            if e.rcvd and e.rcvd.code == 1013:
+                raise SessionRejected(e.rcvd.reason)
+            raise
+
+        async def receive():
+            async for message in websocket:
+                if isinstance(message, str):
+                    continue
+                for record in serializer.split(message):
+                    frame = await serializer.deserialize(record)
+                    if frame is not None and hasattr(frame, "audio"):
+                        conversation.heard(np.frombuffer(frame.audio, dtype=np.int16))
+
+        async def send():
+            next_at = time.monotonic()
+            while not conversation.done.is_set():
+                samples = conversation.next_frame()
+                frame = OutputAudioRawFrame(samples.tobytes(), SAMPLE_RATE, 1)
+                await websocket.send(await serializer.serialize(frame))
+                next_at += FRAME_MS / 1000
+                await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+
+        receiver = asyncio.create_task(receive())
+        try:
+            await send()
+        finally:
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+
+
+async def run_webrtc_session(base_url: str, conversation: Conversation, args):
+    from aiortc import MediaStreamTrack, RTCPeerConnection, RTCSessionDescription
+    from av import AudioFrame
+
+    rate = 48000
+    upsample = rate // SAMPLE_RATE
+
+    class MicrophoneTrack(MediaStreamTrack):
+        kind = "audio"
+
+        def __init__(self):
+            super().__init__()
+            self._start = None
+            self._pts = 0
+
+        async def recv(self):
+            if self._start is None:
+                self._start = time.monotonic()
+            wait = self._start + self._pts / rate - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            samples = np.repeat(conversation.next_frame(), upsample)
+            frame = AudioFrame.from_ndarray(samples.reshape(1, -1), format="s16", layout="mono")
+            frame.sample_rate = rate
+            frame.pts = self._pts
+            self._pts += len(samples)
+            return frame
+
+    pc = RTCPeerConnection()
+    listeners = []
+
+    @pc.on("track")
+    def on_track(track):
+        async def listen():
+            while True:
+                frame = await track.recv()
+                samples = frame.to_ndarray().reshape(-1)
+                # Interleaved stereo, one channel is enough.
+                conversation.heard(samples[:: len(frame.layout.channels)].astype(np.int16))
+
+        listeners.append(asyncio.create_task(listen()))
+
+    pc.addTrack(MicrophoneTrack())
+    try:
+        await pc.setLocalDescription(await pc.createOffer())
+        offer = {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
+        async with aiohttp.ClientSession() as http:
+            async with http.post(f"{base_url}/api/bot", json=offer) as response:
+                if response.status in (429, 503):
+                    raise SessionRejected(f"/api/bot returned {response.status}")
+                response.raise_for_status()
+                answer = await response.json()
+        await pc.setRemoteDescription(RTCSessionDescription(answer["sdp"], answer["type"]))
+        await conversation.done.wait()
+    finally:
+        for listener in listeners:
+            listener.cancel()
+        await asyncio.gather(*listeners, return_exceptions=True)
+        await pc.close()
+
+
+async def sample_server(base_url: str, samples: List[dict], stop: asyncio.Event):
+    async with aiohttp.ClientSession() as http:
+        while not stop.is_set():
+            try:
+                async with http.get(f"{base_url}/api/metrics") as response:
+                    samples.append((await response.json())["gauges"])
+            except Exception:
+                pass
+            try:
+                await asyncio.wait_for(stop.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def run_level(sessions: int, utterance: np.ndarray, args) -> dict:
+    run_session = run_websocket_session if args.transport == "websocket" else run_webrtc_session
+    result = {"sustained": 0, "rejected": 0, "failed": 0, "latencies": [], "errors": {}}
+
+    async def caller(index: int):
+        # Spread the arrivals, a real crowd doesn't dial in the same millisecond.
+        await asyncio.sleep(args.ramp * index / sessions)
+        conversation = Conversation(utterance, args.turns, args.turn_timeout)
+        try:
+            await asyncio.wait_for(
+                run_session(args.url, conversation, args),
+                args.turn_timeout * (args.turns + 1) + len(utterance) / SAMPLE_RATE * args.turns,
+            )
+        except SessionRejected:
+            result["rejected"] += 1
+            return
+        except Exception as e:
+            conversation.error = conversation.error or f"{type(e).__name__}: {e}"
+        result["latencies"].extend(conversation.latencies)
+        if conversation.error or len(conversation.latencies) < args.turns:
+            result["failed"] += 1
+            error = conversation.error or "session ended early"
+            result["errors"][error] = result["errors"].get(error, 0) + 1
+        else:
+            result["sustained"] += 1
+
+    samples: List[dict] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_server(args.url, samples, stop))
+    await asyncio.gather(*[caller(i) for i in range(sessions)])
+    stop.set()
+    await sampler
+
+    def gauge(name: str) -> List[float]:
+        return [s[f"{SERVER_METRICS}.{name}"] for s in samples if f"{SERVER_METRICS}.{name}" in s]
+
+    result["cpu"] = gauge("cpu")
+    result["loop_lag"] = gauge("loop_lag")
+    result["rss"] = gauge("rss")
+    return result
+
+
+async def check_drain(utterance: np.ndarray, args):
+    """SIGTERM the server with a session live: it must drain, not cancel it."""
+    run_session = run_websocket_session if args.transport == "websocket" else run_webrtc_session
+
+    # Every session starts a pipeline runner, none may take the signal over.
+    first = Conversation(utterance, 1, args.turn_timeout)
+    await run_session(args.url, first, args)
+    assert len(first.latencies) == 1, f"first session failed: {first.error}"
+
+    live = Conversation(utterance, 1000, args.turn_timeout)
+    session = asyncio.create_task(run_session(args.url, live, args))
+    await asyncio.sleep(len(utterance) / SAMPLE_RATE)
+    assert not session.done(), f"second session failed: {live.error}"
+
+    os.kill(args.drain_check, signal.SIGTERM)
+    await asyncio.sleep(1.0)
+    async with aiohttp.ClientSession() as http:
+        async with http.get(f"{args.url}/api/ready") as response:
+            assert response.status == 503, f"/api/ready returned {response.status} after SIGTERM"
+    assert not session.done(), "SIGTERM ended the live session instead of draining"
+
+    session.cancel()
+    await asyncio.gather(session, return_exceptions=True)
+    deadline = time.monotonic() + DRAIN_EXIT_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        try:
+            os.kill(args.drain_check, 0)
+        except ProcessLookupError:
+            print("drain ok")
+            return
+        await asyncio.sleep(0.5)
+    raise AssertionError(f"server still running {DRAIN_EXIT_TIMEOUT_SECONDS:.0f}s after the drain")
+
+
+def report(sessions: int, result: dict):
+    latencies = [s * 1000 for s in result["latencies"]]
+    cpu, lag, rss = result["cpu"], result["loop_lag"], result["rss"]
+
+    def pct(values, p):
+        value = percentile(values, p)
+        return f"{value:6.0f}" if value is not None else "     -"
+
+    print(
+        f"{sessions:5d} {result['sustained']:9d} {result['rejected']:8d} {result['failed']:6d} "
+        f"{pct(latencies, 50)} {pct(latencies, 90)} {pct(latencies, 99)}  "
+        f"{(max(cpu) if cpu else 0) * 100:5.0f}% {(max(lag) if lag else 0) * 1000:7.1f} "
+        f"{(max(rss) if rss else 0) / 2**20:7.0f}"
+    )
+    for error, count in result["errors"].items():
+        print(f"      {count} x {error}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:7860", help="Server base URL")
+    parser.add_argument("--transport", choices=["websocket", "webrtc"], default="websocket")
+    parser.add_argument("--levels", default="1,5,10,25,50", help="Concurrent sessions per level")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per session")
+    parser.add_argument("--audio", help="WAV file of one utterance (synthetic voice if omitted)")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds to open a level's sessions")
+    parser.add_argument("--turn-timeout", type=float, default=15.0, help="Seconds to wait for an answer")
+    parser.add_argument("--conversation-id", default="684fcc587556fc7d2f2a1e66")
+    parser.add_argument("--drain-check", type=int, metavar="PID", help="Check the SIGTERM drain")
+    args = parser.parse_args()
+
+    utterance = load_utterance(args.audio)
+    if args.drain_check:
+        await check_drain(utterance, args)
+        return
+    print(
+        f"{args.transport}, {args.turns} turn(s) of {len(utterance) / SAMPLE_RATE:.1f}s per session\n"
+        f"{'level':>5} {'sustained':>9} {'rejected':>8} {'failed':>6} "
+        f"{'p50':>6} {'p90':>6} {'p99':>6}  {'cpu':>6} {'lag ms':>7} {'rss MB':>7}"
+    )
+    for sessions in [int(level) for level in args.levels.split(",")]:
+        report(sessions, await run_level(sessions, utterance, args))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+测试 /api/bot/ws 会话协议的单连接吞吐量
+
+Measures the throughput of a single websocket connection carrying 20 ms
+16 kHz audio frames, decoded the way the bot transport does it:
+
+  * protobuf: one pipecat protobuf Frame per websocket message (the old
+    protocol, decoded with ProtobufFrameSerializer)
+  * delimited xN: the session protocol, N length-prefixed frames per
+    websocket message (decoded with BotFrameSerializer)
+
+Overhead is what goes on the wire per frame on top of the raw audio
+(protobuf fields, length prefix and the websocket header of a masked
+client frame).
+
+    python bench_websocket_protocol.py --seconds 600
+"""
+
+import argparse
+import asyncio
+import time
+
+import websockets
+from pipecat.frames.frames import OutputAudioRawFrame
+from pipecat.serializers.protobuf import ProtobufFrameSerializer
+
+from src.bots.webrtc.frame_serializer import BotFrameSerializer
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000 * 2
+
+
+def websocket_header_size(payload: int) -> int:
+    # 2 bytes + extended length + 4 bytes of client mask.
+    if payload < 126:
+        return 6
+    if payload < 65536:
+        return 8
+    return 14
+
+
+async def build_messages(serializer, frames: int, per_message: int) -> list[bytes]:
+    audio = bytes(FRAME_BYTES)
+    records = [
+        await serializer.serialize(OutputAudioRawFrame(audio, SAMPLE_RATE, 1))
+        for _ in range(per_message)
+    ]
+    message = b"".join(records)
+    return [message] * (frames // per_message)
+
+
+async def run(name: str, serializer, frames: int, per_message: int):
+    messages = await build_messages(serializer, frames, per_message)
+    received = 0
+    done = asyncio.Event()
+
+    async def handler(websocket):
+        nonlocal received
+        async for message in websocket:
+            records = (
+                serializer.split(message)
+                if isinstance(serializer, BotFrameSerializer)
+                else (message,)
+            )
+            for record in records:
+                await serializer.deserialize(record)
+                received += 1
+            if received >= len(messages) * per_message:
+                done.set()
+
+    async with websockets.serve(handler, "127.0.0.1", 0, max_size=None) as server:
+        port = server.sockets[0].getsockname()[1]
+        async with websockets.connect(f"ws://127.0.0.1:{port}", max_size=None) as client:
+            start = time.perf_counter()
+            for message in messages:
+                await client.send(message)
+            await done.wait()
+            elapsed = time.perf_counter() - start
+
+    wire = sum(len(m) + websocket_header_size(len(m)) for m in messages)
+    overhead = wire / received - FRAME_BYTES
+    print(
+        f"{name:16s} {received / elapsed:10.0f} frames/s "
+        f"({received * FRAME_MS / 1000 / elapsed:7.0f}x realtime) "
+        f"{wire / elapsed / 1e6:7.1f} MB/s  overhead {overhead:5.1f} B/frame"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=600, help="Seconds of audio to send")
+    args = parser.parse_args()
+    frames = int(args.seconds * 1000 / FRAME_MS)
+
+    await run("protobuf", ProtobufFrameSerializer(), frames, 1)
+    for per_message in (1, 5, 10):
+        await run(
+            f"delimited x{per_message}",
+            BotFrameSerializer(length_prefixed=True),
+            frames,
+            per_message,
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,17 +5,45 @@ import { useAppState } from "@/hooks/useAppState";
 import { Message, normalizeMessageText } from "@/lib/messages";
 import { RTVIEvent } from "@pipecat-ai/client-js";
 import { useRTVIClientEvent } from "@pipecat-ai/client-react";
-import { useCallback, useState } from "react";
+import { LoaderCircleIcon } from "lucide-react";
+import { useCallback, useEffect, useRef, useState } from "react";
 
 interface Props {
   autoscroll?: boolean;
   messages: Message[];
+  hasOlderMessages?: boolean;
+  isFetchingOlderMessages?: boolean;
+  onLoadOlderMessages?: () => void;
 }
 
-export default function ChatMessages({ autoscroll = true, messages }: Props) {
+export default function ChatMessages({
+  autoscroll = true,
+  messages,
+  hasOlderMessages = false,
+  isFetchingOlderMessages = false,
+  onLoadOlderMessages,
+}: Props) {
+  const loadingRef = useRef<HTMLDivElement>(null);
   const { conversationId } = useAppState();
   const [isBotSpeaking, setIsBotSpeaking] = useState(false);
 
+  // Older messages are loaded when the user scrolls up to the top.
+  useEffect(() => {
+    if (isFetchingOlderMessages || !loadingRef.current) return;
+
+    const intersectionObserver = new IntersectionObserver((entries) => {
+      entries.forEach((entry) => {
+        if (entry.isIntersecting && !isFetchingOlderMessages) {
+          onLoadOlderMessages?.();
+        }
+      });
+    });
+    intersectionObserver.observe(loadingRef.current);
+    return () => {
+      intersectionObserver.disconnect();
+    };
+  }, [onLoadOlderMessages, isFetchingOlderMessages, hasOlderMessages]);
+
   useRTVIClientEvent(
     RTVIEvent.BotStartedSpeaking,
     useCallback(() => {
@@ -37,6 +65,11 @@ export default function ChatMessages({ autoscroll = true, messages }: Props) {
 
   return (
     <div className="flex flex-col gap-4">
+      {hasOlderMessages && (
+        <div ref={loadingRef} className="flex items-center justify-center">
+          <LoaderCircleIcon className="animate-spin" size={16} />
+        </div>
+      )}
       {messages
         .filter((m) => m.content.role !== "system")
         .filter((m) => normalizeMessageText(m).trim() !== "")
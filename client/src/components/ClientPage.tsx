@@ -43,7 +43,13 @@ export function ClientPage() {
     websocketEnabled,
   } = useAppState();
 
-  const { conversation, isFetching } = useConversation(conversationId);
+  const {
+    conversation,
+    isFetching,
+    fetchOlderMessages,
+    hasOlderMessages,
+    isFetchingOlderMessages,
+  } = useConversation(conversationId);
   const messages = conversation?.messages ?? [];
   const visibleMessages = messages.filter((m) => m.content.role !== "system");
 
@@ -203,6 +209,9 @@ export function ClientPage() {
             <ChatMessages
               autoscroll={!showScrollToBottom}
               messages={messages}
+              hasOlderMessages={hasOlderMessages}
+              isFetchingOlderMessages={isFetchingOlderMessages}
+              onLoadOlderMessages={fetchOlderMessages}
             />
           ) : conversationType === "text-voice" ? (
             <div className="flex flex-col gap-4 items-center justify-center h-full my-auto">
@@ -45,7 +45,13 @@ export function ClientPage() {
     websocketEnabled,
   } = useAppState();
 
-  const { conversation, isFetching } = useConversation(conversationId);
+  const {
+    conversation,
+    isFetching,
+    fetchOlderMessages,
+    hasOlderMessages,
+    isFetchingOlderMessages,
+  } = useConversation(conversationId);
   const messages = conversation?.messages ?? [];
   const visibleMessages = messages.filter((m) => m.content.role !== "system");
 
@@ -223,6 +229,9 @@ export function ClientPage() {
                   <ChatMessages
                     autoscroll={!showScrollToBottom}
                     messages={messages}
+                    hasOlderMessages={hasOlderMessages}
+                    isFetchingOlderMessages={isFetchingOlderMessages}
+                    onLoadOlderMessages={fetchOlderMessages}
                   />
                 ) : (
                   <div className="flex flex-col gap-4 items-center justify-center h-full my-auto">
@@ -1,12 +1,28 @@
-import { getConversation } from "@/lib/conversations";
-import { useQuery, useQueryClient } from "@tanstack/react-query";
+import {
+  ConversationMessagesPage,
+  ConversationModel,
+  getConversation,
+} from "@/lib/conversations";
+import {
+  InfiniteData,
+  useInfiniteQuery,
+  useQueryClient,
+} from "@tanstack/react-query";
 
 export const useConversation = (conversationId: string) => {
-  const { data: conversation, ...query } = useQuery({
+  // The first page holds the latest messages, the next ones go back in time.
+  const { data, ...query } = useInfiniteQuery<
+    ConversationMessagesPage | null,
+    Error,
+    InfiniteData<ConversationMessagesPage | null, string | null>
+  >({
     queryKey: ["conversation", conversationId],
-    queryFn: async () => {
+    initialPageParam: null,
+    getNextPageParam: (lastPage) =>
+      lastPage?.has_more ? lastPage.before_cursor ?? undefined : undefined,
+    queryFn: async ({ pageParam }) => {
       if (!conversationId) return null;
-      return await getConversation(conversationId);
+      return await getConversation(conversationId, pageParam as string | null);
     },
   });
   const queryClient = useQueryClient();
@@ -14,9 +30,24 @@ export const useConversation = (conversationId: string) => {
     queryClient.invalidateQueries({
       queryKey: ["conversation", conversationId],
     });
+
+  const latest = data?.pages[0];
+  const conversation: ConversationModel | null = latest
+    ? {
+        ...latest.conversation,
+        messages: [...(data?.pages ?? [])]
+          .reverse()
+          .flatMap((page) => page?.messages ?? []),
+      }
+    : null;
   return {
     conversation,
     ...query,
+    // Loading older messages doesn't hide the ones already shown.
+    isFetching: query.isFetching && !query.isFetchingNextPage,
+    fetchOlderMessages: query.fetchNextPage,
+    hasOlderMessages: query.hasNextPage,
+    isFetchingOlderMessages: query.isFetchingNextPage,
     invalidate,
   };
 };
@@ -1,4 +1,4 @@
-import { ConversationModel, getConversations } from "@/lib/conversations";
+import { ConversationPage, getConversations } from "@/lib/conversations";
 import {
   InfiniteData,
   useInfiniteQuery,
@@ -11,23 +11,20 @@ interface Props {
 
 export const useConversations = ({ searchQuery = "" }: Props = {}) => {
   const { data, ...query } = useInfiniteQuery<
-    ConversationModel[],
+    ConversationPage,
     Error,
-    InfiniteData<ConversationModel[], number>
+    InfiniteData<ConversationPage, string | null>
   >({
     queryKey: ["conversations", searchQuery],
     initialData: {
       pages: [],
       pageParams: [],
     },
-    initialPageParam: 1,
-    getNextPageParam: (lastPage = [], _allPages, lastPageParam) => {
-      if (lastPage.length < 20) return undefined;
-      return (lastPageParam as number) + 1;
-    },
+    initialPageParam: null,
+    getNextPageParam: (lastPage) => lastPage?.next_cursor ?? undefined,
     queryFn: async ({ pageParam }) => {
       return await getConversations({
-        page: pageParam as number,
+        cursor: pageParam as string | null,
         searchQuery,
       });
     },
@@ -37,7 +34,7 @@ export const useConversations = ({ searchQuery = "" }: Props = {}) => {
     queryClient.invalidateQueries({
       queryKey: ["conversations"],
     });
-  const conversations = data.pages.reduce((arr, page) => [...arr, ...page], []);
+  const conversations = data.pages.flatMap((page) => page.conversations);
   return {
     conversations,
     ...query,
@@ -10,18 +10,23 @@ export interface ConversationModel {
 }
 
 interface GetConversationsParams {
-  page: number;
+  cursor: string | null;
   searchQuery?: string;
 }
 
+export interface ConversationPage {
+  conversations: ConversationModel[];
+  next_cursor: string | null;
+}
+
 const PAGE_SIZE = 20;
 
 export async function getConversations({
-  page,
+  cursor,
   searchQuery = "",
-}: GetConversationsParams) {
+}: GetConversationsParams): Promise<ConversationPage> {
   const params = new URLSearchParams();
-  params.append("page", String(page));
+  if (cursor) params.append("cursor", cursor);
   params.append("per_page", String(PAGE_SIZE));
   if (searchQuery) params.append("q", searchQuery.trim());
   try {
@@ -29,35 +34,37 @@ export async function getConversations({
       `${import.meta.env.VITE_SERVER_URL}/conversations?${params.toString()}`,
     );
     if (response.ok) {
-      return (await response.json()) as ConversationModel[];
+      return (await response.json()) as ConversationPage;
     }
-    return [];
+    return { conversations: [], next_cursor: null };
   } catch (e) {
     console.error(e);
-    return [];
+    return { conversations: [], next_cursor: null };
   }
 }
 
-interface GetConversationAndMessagesResponse {
+export interface ConversationMessagesPage {
   conversation: ConversationModel;
   messages: Message[];
+  before_cursor: string | null;
+  has_more: boolean;
 }
 
-export async function getConversation(conversationId: string) {
+// Latest page of messages of a conversation, or the one before `before`.
+export async function getConversation(
+  conversationId: string,
+  before: string | null = null,
+): Promise<ConversationMessagesPage | null> {
+  const params = new URLSearchParams();
+  if (before) params.append("before", before);
   try {
     const response = await fetch(
       `${
         import.meta.env.VITE_SERVER_URL
-      }/conversations/${conversationId}/messages`,
+      }/conversations/${conversationId}/messages?${params.toString()}`,
     );
     if (response.ok) {
-      const json =
-        (await response.json()) as GetConversationAndMessagesResponse;
-      const conversation: ConversationModel = {
-        ...json.conversation,
-        messages: json.messages,
-      };
-      return conversation;
+      return (await response.json()) as ConversationMessagesPage;
     }
     return null;
   } catch (e) {
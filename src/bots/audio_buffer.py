@@ -0,0 +1,261 @@
+import math
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from pipecat.audio.resamplers.base_audio_resampler import BaseAudioResampler
+from pipecat.audio.utils import create_default_resampler
+from pipecat.frames.frames import OutputAudioRawFrame
+from pipecat.transports.base_output import BaseOutputTransport
+
+# How much audio the output ring holds. TTS frames larger than this are
+# simply written in several passes.
+DEFAULT_OUTPUT_RING_SECONDS = 1.0
+
+# Resampling tables are cached per (phase, chunk length); providers send
+# chunks of a handful of sizes so this stays small.
+MAX_RESAMPLER_TABLES = 64
+
+
+def as_samples(data) -> np.ndarray:
+    """View ``data`` (bytes, bytearray, memoryview or ndarray) as int16 samples, without copying."""
+    if isinstance(data, np.ndarray):
+        return data
+    return np.frombuffer(data, dtype=np.int16)
+
+
+class AudioRingBuffer:
+    """Preallocated ring of int16 samples.
+
+    ``write`` copies samples in place (no allocation) and ``read`` hands out a
+    view of the next samples. The view points into the ring itself unless the
+    requested samples wrap around, in which case they are gathered into a
+    preallocated scratch array. Either way it's only valid until the next
+    ``write`` or ``read``.
+
+    When full, the oldest samples are dropped.
+    """
+
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._buffer = np.zeros(capacity, dtype=np.int16)
+        self._scratch = np.zeros(capacity, dtype=np.int16)
+        self._start = 0
+        self._size = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def free(self) -> int:
+        return self._capacity - self._size
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+    def write(self, data):
+        samples = as_samples(data)
+        count = len(samples)
+        if count > self._capacity:
+            self.dropped += count - self._capacity
+            samples = samples[-self._capacity :]
+            count = self._capacity
+
+        overflow = self._size + count - self._capacity
+        if overflow > 0:
+            self.dropped += overflow
+            self._start = (self._start + overflow) % self._capacity
+            self._size -= overflow
+
+        end = (self._start + self._size) % self._capacity
+        first = min(count, self._capacity - end)
+        self._buffer[end : end + first] = samples[:first]
+        if first < count:
+            self._buffer[: count - first] = samples[first:]
+        self._size += count
+
+    def read(self, count: int) -> np.ndarray:
+        if count > self._size:
+            raise ValueError(f"Only {self._size} samples buffered, {count} requested")
+
+        start = self._start
+        if start + count <= self._capacity:
+            view = self._buffer[start : start + count]
+        else:
+            first = self._capacity - start
+            self._scratch[:first] = self._buffer[start:]
+            self._scratch[first:count] = self._buffer[: count - first]
+            view = self._scratch[:count]
+
+        self._start = (start + count) % self._capacity
+        self._size -= count
+        return view
+
+
+class LinearResampler(BaseAudioResampler):
+    """Streaming, vectorized linear interpolation resampler for mono int16 audio.
+
+    Positions are tracked as exact fractions, and the last input sample plus
+    the phase are carried over between calls, so consecutive chunks join
+    without clicks. Index and weight tables are cached per chunk length and
+    the output goes into preallocated arrays.
+
+    Only used to upsample (e.g. 16 kHz TTS to 24 kHz): without a low-pass
+    filter, downsampling would alias, so that is left to pipecat's default
+    (SoX) resampler.
+    """
+
+    def __init__(self):
+        self._rates: Optional[Tuple[int, int]] = None
+        self._fallback: Optional[BaseAudioResampler] = None
+        self._tables: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray, np.ndarray, int]] = {}
+        self._extended = np.zeros(0, dtype=np.float32)
+        self._work = np.zeros(0, dtype=np.float32)
+        self._lower = np.zeros(0, dtype=np.float32)
+        self._output = np.zeros(0, dtype=np.int16)
+        self._last = 0.0
+        self._phase = 0
+
+    def reset(self):
+        self._last = 0.0
+        self._phase = 0
+
+    async def resample(self, audio: bytes, in_rate: int, out_rate: int) -> bytes:
+        if in_rate == out_rate:
+            return audio
+        if in_rate > out_rate:
+            if self._fallback is None:
+                self._fallback = create_default_resampler()
+            return await self._fallback.resample(audio, in_rate, out_rate)
+        return self.process(as_samples(audio), in_rate, out_rate).tobytes()
+
+    def process(self, samples: np.ndarray, in_rate: int, out_rate: int) -> np.ndarray:
+        """Resample ``samples``, returning a view that is valid until the next call."""
+        divisor = math.gcd(in_rate, out_rate)
+        rates = (in_rate // divisor, out_rate // divisor)
+        if rates != self._rates:
+            self._rates = rates
+            self._tables.clear()
+            self.reset()
+
+        count = len(samples)
+        if count == 0:
+            return self._output[:0]
+
+        indices, upper, weights, produced = self._table(count)
+        self._ensure_capacity(count + 1, produced)
+
+        # Extended input: the previous chunk's last sample followed by this chunk.
+        extended = self._extended[: count + 1]
+        extended[0] = self._last
+        extended[1:] = samples
+        self._last = extended[count]
+
+        work = self._work[:produced]
+        lower = self._lower[:produced]
+        output = self._output[:produced]
+        # y = e[i] + (e[i + 1] - e[i]) * w
+        np.take(extended, upper, out=work)
+        np.take(extended, indices, out=lower)
+        np.subtract(work, lower, out=work)
+        np.multiply(work, weights, out=work)
+        np.add(work, lower, out=work)
+        np.rint(work, out=work)
+        np.copyto(output, work, casting="unsafe")
+        return output
+
+    def _table(self, count: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+        in_rate, out_rate = self._rates
+        key = (self._phase, count)
+        table = self._tables.get(key)
+        if table is None:
+            # Output sample k sits at input position (phase + k * in) / out,
+            # measured from the carried-over sample, and must stay below count.
+            produced = -(-(count * out_rate - self._phase) // in_rate)
+            positions = self._phase + np.arange(produced, dtype=np.int64) * in_rate
+            indices = positions // out_rate
+            weights = ((positions % out_rate) / out_rate).astype(np.float32)
+            if len(self._tables) >= MAX_RESAMPLER_TABLES:
+                self._tables.clear()
+            table = (indices, indices + 1, weights, produced)
+            self._tables[key] = table
+        self._phase = self._phase + table[3] * in_rate - count * out_rate
+        return table
+
+    def _ensure_capacity(self, extended: int, produced: int):
+        if len(self._extended) < extended:
+            self._extended = np.zeros(extended, dtype=np.float32)
+        if len(self._work) < produced:
+            self._work = np.zeros(produced, dtype=np.float32)
+            self._lower = np.zeros(produced, dtype=np.float32)
+            self._output = np.zeros(produced, dtype=np.int16)
+
+
+class RingBufferMediaSender(BaseOutputTransport.MediaSender):
+    """Media sender that chunks output audio through an ``AudioRingBuffer``.
+
+    pipecat's sender appends every frame to a ``bytearray``, copies each chunk
+    out twice and then re-slices the remaining buffer, which is quadratic in
+    the size of long TTS frames. Here audio is (re)sampled straight into the
+    ring and each chunk is copied once, into the bytes of the frame that is
+    sent.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._resampler = LinearResampler()
+        channels = self._params.audio_out_channels
+        self._chunk_samples = self._audio_chunk_size // 2
+        capacity = max(
+            int(self._sample_rate * channels * DEFAULT_OUTPUT_RING_SECONDS), 2 * self._chunk_samples
+        )
+        self._ring = AudioRingBuffer(capacity)
+
+    async def start(self, frame):
+        await super().start(frame)
+        self._ring.clear()
+
+    async def handle_audio_frame(self, frame: OutputAudioRawFrame):
+        if not self._params.audio_out_enabled:
+            return
+
+        samples = as_samples(frame.audio)
+        if frame.sample_rate != self._sample_rate:
+            if frame.num_channels == 1 and frame.sample_rate < self._sample_rate:
+                samples = self._resampler.process(samples, frame.sample_rate, self._sample_rate)
+            else:
+                samples = as_samples(
+                    await self._resampler.resample(
+                        frame.audio, frame.sample_rate, self._sample_rate
+                    )
+                )
+
+        cls = type(frame)
+        offset = 0
+        while offset < len(samples):
+            count = min(self._ring.free, len(samples) - offset)
+            self._ring.write(samples[offset : offset + count])
+            offset += count
+            while len(self._ring) >= self._chunk_samples:
+                chunk = self._ring.read(self._chunk_samples)
+                await self._audio_queue.put(
+                    cls(
+                        chunk.tobytes(),
+                        sample_rate=self._sample_rate,
+                        num_channels=frame.num_channels,
+                    )
+                )
+
+    async def _bot_stopped_speaking(self):
+        was_speaking = self._bot_speaking
+        await super()._bot_stopped_speaking()
+        if was_speaking:
+            # Same as pipecat's sender: drop leftovers shorter than a chunk.
+            self._ring.clear()
+            self._resampler.reset()
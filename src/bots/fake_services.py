@@ -0,0 +1,183 @@
+import asyncio
+import itertools
+import math
+import os
+from typing import AsyncGenerator, Dict, Tuple
+
+import numpy as np
+from openai.types.chat import ChatCompletionChunk
+from openai.types.chat.chat_completion_chunk import Choice, ChoiceDelta
+from openai.types.completion_usage import CompletionUsage
+
+from pipecat.frames.frames import (
+    Frame,
+    TranscriptionFrame,
+    TTSAudioRawFrame,
+    TTSStartedFrame,
+    TTSStoppedFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection
+from pipecat.services.openai.llm import OpenAILLMService
+from pipecat.services.stt_service import STTService
+from pipecat.services.tts_service import TTSService
+from pipecat.utils.time import time_now_iso8601
+
+from src.common.timer_wheel import timer_wheel
+
+# Replaces Deepgram, DeepSeek and Cartesia with the local stand-ins below, to
+# load test the server without paying (or waiting) for the providers.
+FAKE_SERVICES = os.getenv("BOT_FAKE_SERVICES", "").lower() in ("1", "true", "yes")
+
+DEFAULT_FAKE_STT_LATENCY_SECONDS = 0.3
+DEFAULT_FAKE_LLM_TTFB_SECONDS = 0.4
+DEFAULT_FAKE_LLM_TOKENS = 40
+DEFAULT_FAKE_LLM_TOKENS_PER_SECOND = 50.0
+DEFAULT_FAKE_TTS_TTFB_SECONDS = 0.15
+# Roughly how fast speech goes, decides how much audio a text becomes.
+DEFAULT_FAKE_TTS_CHARS_PER_SECOND = 15.0
+
+FAKE_TRANSCRIPTS = [
+    "What is the weather like today?",
+    "Can you tell me a short story?",
+    "How do I make a cup of green tea?",
+    "Remind me what we talked about yesterday.",
+]
+
+# Size of the audio frames the fake TTS produces.
+FAKE_TTS_CHUNK_SECONDS = 0.2
+
+
+class FakeSTTService(STTService):
+    """Transcribes every utterance VAD detects, ``latency`` seconds after it ends.
+
+    The audio itself is ignored, the transcripts cycle through
+    ``FAKE_TRANSCRIPTS``.
+    """
+
+    def __init__(self, *, latency: float = DEFAULT_FAKE_STT_LATENCY_SECONDS, **kwargs):
+        super().__init__(**kwargs)
+        self._latency = latency
+        self._transcripts = itertools.cycle(FAKE_TRANSCRIPTS)
+
+    async def run_stt(self, audio: bytes) -> AsyncGenerator[Frame, None]:
+        yield None
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, UserStoppedSpeakingFrame):
+            timer_wheel.call_later(self._latency, self._transcribe)
+
+    async def _transcribe(self):
+        await self.push_frame(TranscriptionFrame(next(self._transcripts), "", time_now_iso8601()))
+
+
+class FakeLLMService(OpenAILLMService):
+    """Streams ``tokens`` tokens after ``ttfb`` seconds, without any network."""
+
+    def __init__(
+        self,
+        *,
+        ttfb: float = DEFAULT_FAKE_LLM_TTFB_SECONDS,
+        tokens: int = DEFAULT_FAKE_LLM_TOKENS,
+        tokens_per_second: float = DEFAULT_FAKE_LLM_TOKENS_PER_SECOND,
+        **kwargs,
+    ):
+        super().__init__(api_key="fake", model="fake", **kwargs)
+        self._ttfb = ttfb
+        self._tokens = tokens
+        self._token_interval = 1 / tokens_per_second if tokens_per_second > 0 else 0
+        self.requests = 0
+        self.tokens_generated = 0
+
+    async def get_chat_completions(self, context, messages):
+        self.requests += 1
+        return self._stream()
+
+    async def _stream(self):
+        await asyncio.sleep(self._ttfb)
+        for i in range(self._tokens):
+            self.tokens_generated += 1
+            # A sentence every ten words, so the TTS gets to speak early.
+            word = f"word{i}." if i % 10 == 9 else f"word{i}"
+            yield ChatCompletionChunk(
+                id="fake",
+                choices=[Choice(index=0, delta=ChoiceDelta(content=f"{word} "))],
+                created=0,
+                model="fake",
+                object="chat.completion.chunk",
+            )
+            await asyncio.sleep(self._token_interval)
+        # Like the real API with stream_options.include_usage.
+        yield ChatCompletionChunk(
+            id="fake",
+            choices=[],
+            created=0,
+            model="fake",
+            object="chat.completion.chunk",
+            usage=CompletionUsage(
+                prompt_tokens=0, completion_tokens=self._tokens, total_tokens=self._tokens
+            ),
+        )
+
+
+class FakeTTSService(TTSService):
+    """Answers every text with a tone as long as the text would take to say."""
+
+    def __init__(
+        self,
+        *,
+        ttfb: float = DEFAULT_FAKE_TTS_TTFB_SECONDS,
+        chars_per_second: float = DEFAULT_FAKE_TTS_CHARS_PER_SECOND,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self._ttfb = ttfb
+        self._chars_per_second = chars_per_second
+        self._voice_id = "fake"
+        self._settings = {"language": "en"}
+        self._tones: Dict[Tuple[int, int], bytes] = {}
+
+    def can_generate_metrics(self) -> bool:
+        return True
+
+    async def run_tts(self, text: str) -> AsyncGenerator[Frame, None]:
+        await self.start_ttfb_metrics()
+        yield TTSStartedFrame()
+        await asyncio.sleep(self._ttfb)
+        await self.stop_ttfb_metrics()
+
+        chunk = self._tone(self.sample_rate)
+        chunks = max(1, math.ceil(len(text) / self._chars_per_second / FAKE_TTS_CHUNK_SECONDS))
+        for _ in range(chunks):
+            yield TTSAudioRawFrame(chunk, self.sample_rate, 1)
+        yield TTSStoppedFrame()
+
+    def _tone(self, sample_rate: int) -> bytes:
+        key = (sample_rate, int(sample_rate * FAKE_TTS_CHUNK_SECONDS))
+        if key not in self._tones:
+            t = np.arange(key[1]) / sample_rate
+            # 250 Hz fits a whole number of periods in a chunk, no clicks.
+            self._tones[key] = (np.sin(2 * np.pi * 250 * t) * 8000).astype(np.int16).tobytes()
+        return self._tones[key]
+
+
+def create_fake_services() -> Tuple[FakeSTTService, FakeLLMService, FakeTTSService]:
+    stt = FakeSTTService(
+        latency=float(os.getenv("BOT_FAKE_STT_LATENCY", DEFAULT_FAKE_STT_LATENCY_SECONDS))
+    )
+    llm = FakeLLMService(
+        ttfb=float(os.getenv("BOT_FAKE_LLM_TTFB", DEFAULT_FAKE_LLM_TTFB_SECONDS)),
+        tokens=int(os.getenv("BOT_FAKE_LLM_TOKENS", DEFAULT_FAKE_LLM_TOKENS)),
+        tokens_per_second=float(
+            os.getenv("BOT_FAKE_LLM_TOKENS_PER_SECOND", DEFAULT_FAKE_LLM_TOKENS_PER_SECOND)
+        ),
+    )
+    tts = FakeTTSService(
+        ttfb=float(os.getenv("BOT_FAKE_TTS_TTFB", DEFAULT_FAKE_TTS_TTFB_SECONDS)),
+        chars_per_second=float(
+            os.getenv("BOT_FAKE_TTS_CHARS_PER_SECOND", DEFAULT_FAKE_TTS_CHARS_PER_SECOND)
+        ),
+    )
+    return stt, llm, tts
@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+from loguru import logger
+
+from pipecat.frames.frames import (
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    TTSAudioRawFrame,
+    TTSStartedFrame,
+    TTSStoppedFrame,
+    TTSTextFrame,
+)
+from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContextFrame
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+from src.common.metrics import metrics
+
+# Greeting texts per language, replaced by the JSON file in BOT_GREETINGS_FILE
+# ({"en": ["...", ...], ...}) if set.
+DEFAULT_GREETINGS: Dict[str, List[str]] = {
+    "en": [
+        "Hi there! I'm Sesame, your voice assistant. How can I help you today?",
+        "Hello! It's lovely to hear from you. I'm Sesame, what would you like to talk about?",
+        "Hey, welcome! I'm Sesame. Ask me anything, I'm all ears.",
+    ],
+    "zh": [
+        "你好！我是芝麻，你的语音助手。今天有什么可以帮你的吗？",
+        "嗨，很高兴见到你！我是芝麻，想聊点什么呢？",
+    ],
+}
+
+DEFAULT_GREETING_CACHE_DIR = ".cache/greetings"
+DEFAULT_GREETING_SAMPLE_RATE = 24000
+
+CARTESIA_TTS_URL = "https://api.cartesia.ai/tts/bytes"
+CARTESIA_VERSION = "2024-11-13"
+CARTESIA_MODEL = "sonic-2"
+
+# Size of the audio frames a greeting is played in (16-bit mono).
+GREETING_CHUNK_SECONDS = 0.2
+
+
+def _load_greeting_texts() -> Dict[str, List[str]]:
+    path = os.getenv("BOT_GREETINGS_FILE")
+    if not path:
+        return DEFAULT_GREETINGS
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class Greeting:
+    def __init__(self, text: str, audio: bytes, sample_rate: int):
+        self.text = text
+        self.audio = audio
+        self.sample_rate = sample_rate
+
+
+class GreetingCache:
+    """Greeting texts rendered to audio ahead of time, per voice and language.
+
+    ``start()`` renders every text of every configured ``(voice_id,
+    language)`` in the background with Cartesia's HTTP API. Rendered audio is
+    also kept on disk, so restarts and worker processes only render what's
+    missing. Until a voice is ready ``get()`` returns ``None`` and sessions
+    greet through the LLM as before.
+    """
+
+    def __init__(
+        self,
+        *,
+        texts: Dict[str, List[str]],
+        cache_dir: str = DEFAULT_GREETING_CACHE_DIR,
+        sample_rate: int = DEFAULT_GREETING_SAMPLE_RATE,
+    ):
+        self._texts = texts
+        self._cache_dir = cache_dir
+        self._sample_rate = sample_rate
+        self._greetings: Dict[Tuple[str, str], List[Greeting]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, voices: Iterable[Tuple[str, str]]):
+        api_key = os.getenv("CARTESIA_API_KEY")
+        if not api_key:
+            logger.warning("CARTESIA_API_KEY is not set, greetings are not cached")
+            return
+        if not self._task:
+            self._task = asyncio.create_task(self._render_all(list(voices), api_key))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def get(self, voice_id: str, language: str) -> Optional[Greeting]:
+        greetings = self._greetings.get((voice_id, language))
+        return random.choice(greetings) if greetings else None
+
+    async def _render_all(self, voices: List[Tuple[str, str]], api_key: str):
+        os.makedirs(self._cache_dir, exist_ok=True)
+        async with aiohttp.ClientSession() as session:
+            for voice_id, language in voices:
+                greetings = []
+                for text in self._texts.get(language, []):
+                    try:
+                        audio = await self._render(session, api_key, voice_id, language, text)
+                        greetings.append(Greeting(text, audio, self._sample_rate))
+                    except Exception as e:
+                        metrics.increment("bot.greeting.render.failed")
+                        logger.warning(f"Unable to render greeting [{text}]: {e}")
+                if greetings:
+                    self._greetings[(voice_id, language)] = greetings
+                    logger.info(f"{len(greetings)} greeting(s) ready for {voice_id}/{language}")
+
+    async def _render(
+        self,
+        session: aiohttp.ClientSession,
+        api_key: str,
+        voice_id: str,
+        language: str,
+        text: str,
+    ) -> bytes:
+        key = f"{CARTESIA_MODEL}|{voice_id}|{language}|{self._sample_rate}|{text}"
+        path = os.path.join(self._cache_dir, hashlib.sha1(key.encode()).hexdigest() + ".pcm")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+
+        payload = {
+            "model_id": CARTESIA_MODEL,
+            "transcript": text,
+            "voice": {"mode": "id", "id": voice_id},
+            "output_format": {
+                "container": "raw",
+                "encoding": "pcm_s16le",
+                "sample_rate": self._sample_rate,
+            },
+            "language": language,
+        }
+        headers = {"Cartesia-Version": CARTESIA_VERSION, "X-API-Key": api_key}
+        async with session.post(CARTESIA_TTS_URL, json=payload, headers=headers) as response:
+            response.raise_for_status()
+            audio = await response.read()
+
+        # Written aside and renamed, so other processes never read half a file.
+        partial = f"{path}.{os.getpid()}.tmp"
+        with open(partial, "wb") as f:
+            f.write(audio)
+        os.replace(partial, path)
+        metrics.increment("bot.greeting.rendered")
+        return audio
+
+
+class GreetingResponder:
+    """Answers the greeting request of a session with a cached greeting.
+
+    ``gate()`` goes before the LLM. The first time the LLM is asked to run
+    on a context ending with the greeting prompt, and the cache has a
+    greeting for the session's voice, the context is held back and
+    ``player()``, which goes right after the TTS, plays the cached audio
+    instead. The text goes through the assistant aggregator like a generated
+    answer, so it ends up in the context.
+    """
+
+    def __init__(self, cache: GreetingCache, prompt: str, voice_id: str, language: str):
+        self._cache = cache
+        self._prompt = prompt
+        self._voice_id = voice_id
+        self._language = language
+        self._greeted = False
+        self._gate = _GreetingGate(self)
+        self._player = _GreetingPlayer()
+
+    def gate(self) -> FrameProcessor:
+        return self._gate
+
+    def player(self) -> FrameProcessor:
+        return self._player
+
+    async def _maybe_greet(self, frame: OpenAILLMContextFrame) -> bool:
+        if self._greeted:
+            return False
+        messages = frame.context.messages
+        if not messages or messages[-1] != {"role": "user", "content": self._prompt}:
+            return False
+        self._greeted = True
+
+        greeting = self._cache.get(self._voice_id, self._language)
+        if not greeting:
+            metrics.increment("bot.greeting.cache.miss")
+            return False
+        metrics.increment("bot.greeting.cache.hit")
+        await self._player.play(greeting)
+        return True
+
+
+class _GreetingGate(FrameProcessor):
+    def __init__(self, responder: GreetingResponder):
+        super().__init__()
+        self._responder = responder
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, OpenAILLMContextFrame) and await self._responder._maybe_greet(frame):
+            return
+
+        await self.push_frame(frame, direction)
+
+
+class _GreetingPlayer(FrameProcessor):
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        await self.push_frame(frame, direction)
+
+    async def play(self, greeting: Greeting):
+        # Same frames the LLM and TTS would have produced.
+        chunk = int(greeting.sample_rate * GREETING_CHUNK_SECONDS) * 2
+        await self.push_frame(LLMFullResponseStartFrame())
+        await self.push_frame(TTSStartedFrame())
+        for i in range(0, len(greeting.audio), chunk):
+            await self.push_frame(
+                TTSAudioRawFrame(greeting.audio[i : i + chunk], greeting.sample_rate, 1)
+            )
+        await self.push_frame(TTSTextFrame(greeting.text))
+        await self.push_frame(TTSStoppedFrame())
+        await self.push_frame(LLMFullResponseEndFrame())
+
+
+greeting_cache = GreetingCache(
+    texts=_load_greeting_texts(),
+    cache_dir=os.getenv("BOT_GREETING_CACHE_DIR", DEFAULT_GREETING_CACHE_DIR),
+)
@@ -7,6 +7,8 @@ from src.bots.rtvi import create_rtvi_processor
 from src.bots.types import BotConfig, BotParams
 from src.common.config import SERVICE_API_KEYS
 from src.common.models import Attachment, Message
+from src.common.response_cache import invalidate_conversation
+from src.common.sequences import reserve_message_numbers
 from fastapi import HTTPException, status
 from loguru import logger
 from openai._types import NOT_GIVEN
@@ -181,7 +183,13 @@ async def http_bot_pipeline(
     @storage.on_context_message
     async def on_context_message(messages: list[Any]):
         try:
-            for msg in messages:
+            # One block of numbers for everything the turn added.
+            numbers = await reserve_message_numbers(str(params.conversation_id), len(messages))
+            if numbers is None:
+                # Unnumbered messages would be out of order in every read.
+                logger.error(f"Conversation {params.conversation_id} not found, not storing {len(messages)} message(s)")
+                return
+            for index, msg in enumerate(messages):
                 # 根据消息角色决定用户ID
                 if msg.get('role') == 'user':
                     user_id = str(params.user_id)  # 确保转换为字符串
@@ -196,8 +204,11 @@ async def http_bot_pipeline(
                     body=msg['content'],
                     userId=user_id,  # 使用正确的字段名
                     contentType="text",
+                    message_number=numbers.number(index),
+                    created_at=numbers.created_at(index),
                 )
                 await message_doc.insert()
+            invalidate_conversation(str(params.conversation_id))
         except Exception as e:
             logger.error(f"Error storing messages: {e}")
             # 添加更详细的错误信息
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from loguru import logger
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    InternalServerError,
+    RateLimitError,
+)
+
+from src.common.metrics import metrics
+
+# Gemini's OpenAI compatible endpoint, so one client works for every provider.
+GEMINI_OPENAI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+
+DEFAULT_SUMMARY_LLM_MODEL = "gemini-2.0-flash-exp"
+DEFAULT_COMPLETION_TIMEOUT_SECONDS = 20.0
+DEFAULT_COMPLETION_RETRIES = 2
+DEFAULT_COMPLETION_MAX_CONNECTIONS = 16
+
+# Backoff before retry n is RETRY_BACKOFF_SECONDS * 2 ** n, plus jitter.
+RETRY_BACKOFF_SECONDS = 0.5
+
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError)
+
+
+class CompletionError(Exception):
+    pass
+
+
+class CompletionClient:
+    """One-shot chat completions for offline jobs (titles, summaries).
+
+    Sends a single non-streaming request per call over a pooled HTTP client,
+    without the frame machinery a pipeline needs for a live conversation.
+    Each attempt is bounded by ``timeout`` seconds and connection errors,
+    timeouts, rate limits and server errors are retried ``retries`` times
+    with exponential backoff.
+
+    The HTTP client is created on first use and belongs to that event loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        api_key: Optional[str],
+        model: str,
+        base_url: Optional[str] = None,
+        timeout: float = DEFAULT_COMPLETION_TIMEOUT_SECONDS,
+        retries: int = DEFAULT_COMPLETION_RETRIES,
+        max_connections: int = DEFAULT_COMPLETION_MAX_CONNECTIONS,
+    ):
+        self._name = name
+        self._api_key = api_key
+        self._model = model
+        self._base_url = base_url
+        self._timeout = timeout
+        self._retries = retries
+        self._max_connections = max_connections
+        self._client: Optional[AsyncOpenAI] = None
+
+    @property
+    def available(self) -> bool:
+        return bool(self._api_key)
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+    ) -> str:
+        """Complete ``messages`` and return the text of the answer.
+
+        Raises:
+            CompletionError: If no API key is configured, all attempts
+                failed or the answer is empty.
+        """
+        if not self.available:
+            raise CompletionError(f"{self._name}: no API key configured")
+
+        client = self._get_client()
+        params = {}
+        if max_tokens is not None:
+            params["max_tokens"] = max_tokens
+        if temperature is not None:
+            params["temperature"] = temperature
+
+        for attempt in range(self._retries + 1):
+            start = time.monotonic()
+            try:
+                response = await client.chat.completions.create(
+                    model=self._model, messages=messages, **params
+                )
+            except RETRYABLE_ERRORS as e:
+                metrics.increment(f"{self._name}.errors")
+                if attempt == self._retries:
+                    raise CompletionError(f"{self._name}: {e}") from e
+                delay = RETRY_BACKOFF_SECONDS * 2**attempt * (1 + random.random())
+                logger.warning(f"{self._name}: {type(e).__name__}, retrying in {delay:.1f}s")
+                metrics.increment(f"{self._name}.retries")
+                await asyncio.sleep(delay)
+                continue
+
+            metrics.observe(f"{self._name}.latency", time.monotonic() - start)
+            if response.usage:
+                metrics.increment(f"{self._name}.tokens", response.usage.total_tokens)
+            content = response.choices[0].message.content if response.choices else None
+            if not content or not content.strip():
+                raise CompletionError(f"{self._name}: empty answer")
+            return content.strip()
+
+    async def close(self):
+        if self._client:
+            await self._client.close()
+            self._client = None
+
+    def _get_client(self) -> AsyncOpenAI:
+        if not self._client:
+            self._client = AsyncOpenAI(
+                api_key=self._api_key,
+                base_url=self._base_url,
+                # Retries are ours, with backoff that fits batch jobs.
+                max_retries=0,
+                timeout=self._timeout,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self._max_connections,
+                        max_keepalive_connections=self._max_connections,
+                    ),
+                    timeout=self._timeout,
+                ),
+            )
+        return self._client
+
+
+def _summary_llm() -> CompletionClient:
+    # Gemini by default, any OpenAI compatible provider with SUMMARY_LLM_BASE_URL.
+    base_url = os.getenv("SUMMARY_LLM_BASE_URL")
+    return CompletionClient(
+        "bot.summarize.llm",
+        api_key=os.getenv("SUMMARY_LLM_API_KEY") or (None if base_url else os.getenv("GEMINI_API_KEY")),
+        model=os.getenv("SUMMARY_LLM_MODEL", DEFAULT_SUMMARY_LLM_MODEL),
+        base_url=base_url or GEMINI_OPENAI_BASE_URL,
+        timeout=float(os.getenv("SUMMARY_LLM_TIMEOUT", DEFAULT_COMPLETION_TIMEOUT_SECONDS)),
+        retries=int(os.getenv("SUMMARY_LLM_RETRIES", DEFAULT_COMPLETION_RETRIES)),
+    )
+
+
+summary_llm = _summary_llm()
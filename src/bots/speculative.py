@@ -0,0 +1,308 @@
+import asyncio
+import os
+import re
+import time
+from typing import List, Optional
+
+from loguru import logger
+
+from pipecat.frames.frames import (
+    CancelFrame,
+    EndFrame,
+    Frame,
+    InterimTranscriptionFrame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    LLMTextFrame,
+    StartInterruptionFrame,
+    TranscriptionFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.processors.aggregators.openai_llm_context import (
+    OpenAILLMContext,
+    OpenAILLMContextFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.openai.base_llm import BaseOpenAILLMService
+
+from src.common.metrics import metrics
+
+# Off unless BOT_SPECULATIVE_LLM is set: a wrong guess costs real tokens.
+SPECULATIVE_LLM = os.getenv("BOT_SPECULATIVE_LLM", "").lower() in ("1", "true", "yes")
+
+# An interim is stable once the same text came back this many times in a row
+# (or as soon as VAD says the user stopped talking).
+DEFAULT_STABLE_INTERIMS = 2
+# Don't bother speculating on fragments shorter than this (in characters,
+# words don't work for Chinese).
+DEFAULT_MIN_CHARS = 4
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_transcript(text: str) -> str:
+    """Interim and final transcripts differ in casing and punctuation only."""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub("", text.lower())).strip()
+
+
+class _Speculation:
+    def __init__(self, text: str, history: int):
+        self.text = text
+        self.key = normalize_transcript(text)
+        # Number of context messages the guess was built on.
+        self.history = history
+        self.started_at = time.monotonic()
+        # Completion text as it streams in, None marks the end.
+        self.chunks: asyncio.Queue = asyncio.Queue()
+        self.chunk_count = 0
+        # Completion tokens of the usage chunk closing the stream.
+        self.usage: Optional[int] = None
+        self.failed = False
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def completion_tokens(self) -> int:
+        # Cancelled streams never get to the usage, a chunk is about a token.
+        return self.usage if self.usage is not None else self.chunk_count
+
+
+class SpeculativeLLM:
+    """Starts the LLM on a stable interim transcript, before the final one.
+
+    ``listener()`` goes right after the STT service and watches interim
+    transcripts. Once one is stable a completion is requested for the context
+    plus that text, and buffered. ``gate()`` goes between the user context
+    aggregator and the LLM: when the aggregator pushes the context with the
+    final user message, a speculation for the same text (ignoring casing and
+    punctuation) is replayed downstream as if the LLM had produced it, and
+    the context never reaches the LLM. Otherwise the speculation is cancelled
+    and the LLM runs as usual.
+
+    Speculations are counted under ``bot.llm.speculation.*``: ``hit`` and
+    ``miss`` when the final transcript did or didn't match, ``superseded``
+    when a newer interim replaced them before any final, and
+    ``wasted_tokens`` for the completion tokens of all that were thrown
+    away: the usage the LLM reported, or the chunks streamed so far for a
+    stream cancelled before its usage came. Their prompt tokens aren't
+    counted. ``hit_rate`` only covers hits and misses.
+    """
+
+    def __init__(
+        self,
+        llm: BaseOpenAILLMService,
+        context: OpenAILLMContext,
+        *,
+        stable_interims: int = DEFAULT_STABLE_INTERIMS,
+        min_chars: int = DEFAULT_MIN_CHARS,
+    ):
+        self._llm = llm
+        self._context = context
+        self._stable_interims = stable_interims
+        self._min_chars = min_chars
+        self._listener = _InterimListener(self)
+        self._gate = _SpeculationGate(self)
+        self._speculation: Optional[_Speculation] = None
+        # Finals of the current user turn, not yet in the context.
+        self._finals: List[str] = []
+        self._last_interim = ""
+        self._repeats = 0
+        self._user_speaking = False
+
+    def listener(self) -> FrameProcessor:
+        return self._listener
+
+    def gate(self) -> FrameProcessor:
+        return self._gate
+
+    #
+    # Listener side
+    #
+
+    async def _on_user_started_speaking(self):
+        self._user_speaking = True
+
+    async def _on_user_stopped_speaking(self):
+        self._user_speaking = False
+        # Nothing more is coming, the latest interim is as good as it gets.
+        if self._last_interim:
+            await self._maybe_speculate(self._last_interim)
+
+    async def _on_interim(self, text: str):
+        key = normalize_transcript(text)
+        if key and key == normalize_transcript(self._last_interim):
+            self._repeats += 1
+        else:
+            self._repeats = 1
+        self._last_interim = text
+
+        if self._repeats >= self._stable_interims or not self._user_speaking:
+            await self._maybe_speculate(text)
+
+    async def _on_final(self, text: str):
+        self._finals.append(text)
+        self._last_interim = ""
+        self._repeats = 0
+
+    async def _maybe_speculate(self, interim: str):
+        text = " ".join(self._finals + [interim])
+        key = normalize_transcript(text)
+        if len(key) < self._min_chars:
+            return
+        if self._speculation and self._speculation.key == key:
+            return
+        await self._discard("superseded")
+
+        speculation = _Speculation(text, len(self._context.messages))
+        speculation.task = asyncio.create_task(self._generate(speculation))
+        self._speculation = speculation
+        metrics.increment("bot.llm.speculation.started")
+        logger.debug(f"Speculating on interim transcript: [{text}]")
+
+    async def _generate(self, speculation: _Speculation):
+        messages = self._context.get_messages() + [{"role": "user", "content": speculation.text}]
+        try:
+            chunks = await self._llm.get_chat_completions(self._context, messages)
+            async for chunk in chunks:
+                if chunk.usage:
+                    speculation.usage = chunk.usage.completion_tokens
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    speculation.chunk_count += 1
+                    speculation.chunks.put_nowait(content)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            speculation.failed = True
+            logger.warning(f"Speculative generation failed: {e}")
+        finally:
+            speculation.chunks.put_nowait(None)
+
+    async def _discard(self, outcome: str):
+        speculation = self._speculation
+        self._speculation = None
+        if not speculation:
+            return
+        if speculation.task:
+            speculation.task.cancel()
+            await asyncio.gather(speculation.task, return_exceptions=True)
+        metrics.increment(f"bot.llm.speculation.{outcome}")
+        metrics.increment("bot.llm.speculation.wasted_tokens", speculation.completion_tokens)
+        self._update_hit_rate()
+
+    def _update_hit_rate(self):
+        # Only speculations checked against a final transcript.
+        hits = metrics.counter("bot.llm.speculation.hit")
+        misses = metrics.counter("bot.llm.speculation.miss")
+        if hits + misses:
+            metrics.set_gauge("bot.llm.speculation.hit_rate", hits / (hits + misses))
+
+    #
+    # Gate side
+    #
+
+    async def _claim(self, context: OpenAILLMContext) -> Optional[_Speculation]:
+        """The speculation matching the final user message of ``context``, if any."""
+        self._finals = []
+        self._last_interim = ""
+        self._repeats = 0
+
+        speculation = self._speculation
+        if not speculation:
+            return None
+
+        messages = context.messages
+        final = messages[-1] if messages else {}
+        content = final.get("content")
+        matches = (
+            not speculation.failed
+            and final.get("role") == "user"
+            and isinstance(content, str)
+            and len(messages) == speculation.history + 1
+            and normalize_transcript(content) == speculation.key
+        )
+        if not matches:
+            await self._discard("miss")
+            return None
+
+        self._speculation = None
+        metrics.increment("bot.llm.speculation.hit")
+        metrics.observe("bot.llm.speculation.head_start", time.monotonic() - speculation.started_at)
+        self._update_hit_rate()
+        return speculation
+
+    async def _cancel(self):
+        if self._speculation and self._speculation.task:
+            self._speculation.task.cancel()
+        self._speculation = None
+
+
+class _InterimListener(FrameProcessor):
+    def __init__(self, speculative: SpeculativeLLM):
+        super().__init__()
+        self._speculative = speculative
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, InterimTranscriptionFrame):
+            await self._speculative._on_interim(frame.text)
+        elif isinstance(frame, TranscriptionFrame):
+            await self._speculative._on_final(frame.text)
+        elif isinstance(frame, UserStartedSpeakingFrame):
+            await self._speculative._on_user_started_speaking()
+        elif isinstance(frame, UserStoppedSpeakingFrame):
+            await self._speculative._on_user_stopped_speaking()
+        elif isinstance(frame, (EndFrame, CancelFrame)):
+            await self._speculative._cancel()
+
+        await self.push_frame(frame, direction)
+
+
+class _SpeculationGate(FrameProcessor):
+    def __init__(self, speculative: SpeculativeLLM):
+        super().__init__()
+        self._speculative = speculative
+        self._replaying: Optional[_Speculation] = None
+        self._replay_task: Optional[asyncio.Task] = None
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, OpenAILLMContextFrame):
+            speculation = await self._speculative._claim(frame.context)
+            if speculation:
+                await self._cancel_replay()
+                self._replaying = speculation
+                self._replay_task = self.create_task(self._replay(speculation))
+                return
+        elif isinstance(frame, EndFrame):
+            # Like the LLM, finish the response before ending.
+            if self._replay_task:
+                await self.wait_for_task(self._replay_task)
+                self._replay_task = None
+        elif isinstance(frame, (StartInterruptionFrame, CancelFrame)):
+            await self._cancel_replay()
+
+        await self.push_frame(frame, direction)
+
+    async def _replay(self, speculation: _Speculation):
+        # Same frames the LLM service would have pushed.
+        await self.push_frame(LLMFullResponseStartFrame())
+        while True:
+            text = await speculation.chunks.get()
+            if text is None:
+                break
+            await self.push_frame(LLMTextFrame(text))
+        await self.push_frame(LLMFullResponseEndFrame())
+
+    async def _cancel_replay(self):
+        if self._replay_task:
+            await self.cancel_task(self._replay_task)
+            self._replay_task = None
+        if self._replaying and self._replaying.task:
+            self._replaying.task.cancel()
+        self._replaying = None
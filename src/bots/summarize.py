@@ -1,91 +1,236 @@
 from typing import Dict, List, Optional
 
-from src.common.config import SERVICE_API_KEYS
+from beanie.odm.queries.find import FindMany
+from src.bots.http.bot import decrypt_cryptojs
+from src.bots.llm_client import CompletionClient, CompletionError, summary_llm
+from src.common.database import raw_id
+from src.common.metrics import metrics
 from src.common.models import Conversation, Message
+from src.common.response_cache import invalidate_conversation
 from loguru import logger
 
-from pipecat.frames.frames import EndFrame
-from pipecat.pipeline.pipeline import Pipeline
-from pipecat.pipeline.runner import PipelineRunner
-from pipecat.pipeline.task import PipelineTask
-from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContextFrame
-from pipecat.services.llm_service import OpenAILLMContext
-from pipecat.services.google.llm import GoogleLLMContext, GoogleLLMService
+# Titles of conversations that haven't been summarized yet.
+UNTITLED_TITLES = [None, "", "New conversation"]
 
+# Only the latest messages go into a title, they say enough about it.
+DEFAULT_SUMMARY_MESSAGE_LIMIT = 20
 
-async def generate_summary_with_llm(messages: List[Dict[str, str]]) -> Optional[str]:
+LLM_ROLES = ("system", "user", "assistant")
+
+TITLE_PROMPT = "Summarize our conversation into just a few words. It will be used as a label for this conversation. Avoid using any special characters."
+# A few words, with room for languages that take more tokens per word.
+TITLE_MAX_TOKENS = 32
+
+ROLLING_SUMMARY_PROMPT = "You keep a running summary of a conversation between a user and an assistant. Update the summary with the new messages. Keep the facts, names, preferences, decisions and open questions later replies may need and drop small talk. Answer with the updated summary only, in the language of the conversation, in at most 200 words."
+ROLLING_SUMMARY_MAX_TOKENS = 400
+# New messages folded into the summary per LLM call, which keeps every
+# call the same size however long the conversation gets.
+DEFAULT_ROLLING_SUMMARY_CHUNK = 40
+
+
+async def load_conversation_messages(
+    conversation_id: str, limit: int = DEFAULT_SUMMARY_MESSAGE_LIMIT
+) -> List[Dict[str, str]]:
     """
-    Generate summary using the LLM service with message validation
+    Load the latest messages of a conversation as LLM messages, oldest first
 
     Args:
-        messages: List of message dictionaries with 'role' and 'content'
-        llm: Initialized LLM service instance
+        conversation_id: ID of the conversation
+        limit: Maximum number of messages to load
 
     Returns:
-        Optional[str]: Generated summary or None if generation fails
+        List[Dict[str, str]]: Messages with 'role' and (decrypted) 'content'
+    """
+    docs = (
+        await Message.get_motor_collection()
+        .find({"conversationId": conversation_id}, {"body": 1, "content": 1, "role": 1, "userId": 1})
+        .sort([("createdAt", -1), ("_id", -1)])
+        .limit(limit)
+        .to_list(limit)
+    )
+    # Chat app messages have an encrypted body, API ones an LLM message.
+    messages = [llm_message(doc, None) for doc in reversed(docs)]
+    return [message for message in messages if message]
+
+
+def _after_summary(conversation: Conversation) -> dict:
+    # Messages are ordered by (createdAt, _id), the summary covers them up
+    # to its high-water mark.
+    query = {"conversationId": str(conversation.id)}
+    if conversation.summaryUntil:
+        query["$or"] = [
+            {"createdAt": {"$gt": conversation.summaryUntil}},
+            {
+                "createdAt": conversation.summaryUntil,
+                "_id": {"$gt": raw_id(conversation.summaryMessageId)},
+            },
+        ]
+    return query
 
-    Raises:
-        ValueError: If LLM response is empty or invalid
+
+def messages_after_summary(conversation: Conversation) -> FindMany[Message]:
+    """Query for the messages the conversation's summary doesn't cover yet, oldest first."""
+    return Message.find(_after_summary(conversation)).sort([("createdAt", 1), ("_id", 1)])
+
+
+def summary_message(conversation: Conversation) -> Optional[Dict[str, str]]:
     """
-    llm_api_key = SERVICE_API_KEYS["gemini"]
+    The conversation's rolling summary as an LLM message
 
-    if llm_api_key is None:
+    Followed by ``messages_after_summary()`` it stands in for the whole
+    history in an LLM context.
+    """
+    if not conversation.summary:
         return None
+    return {
+        "role": "system",
+        "content": f"Summary of the conversation so far:\n{conversation.summary}",
+    }
 
-    llm = GoogleLLMService(
-        api_key=str(SERVICE_API_KEYS["gemini"]),
-        model="gemini-2.0-flash-exp",
-    )
 
-    try:
-        messages.append(
-            {
-                "role": "user",
-                "content": "Summarize our conversation into just a few words. It will be used as a label for this conversation. Avoid using any special characters.",
-            }
-        )
+async def update_rolling_summary(
+    conversation_id: str,
+    llm: CompletionClient = summary_llm,
+    chunk: int = DEFAULT_ROLLING_SUMMARY_CHUNK,
+) -> Optional[Conversation]:
+    """
+    Fold the messages since the last summary into the conversation's summary
+
+    Only the previous summary and the new messages go to the LLM, ``chunk``
+    messages per call, so the cost doesn't grow with the conversation. A
+    chunk without any text moves the mark without an LLM call. The
+    summary and its high-water mark are saved after every call, and only if
+    nobody moved the mark meanwhile; if someone did their summary stands.
+
+    Args:
+        conversation_id: ID of the conversation
+        llm: Completion client to use, the shared summary client by default
+        chunk: Maximum number of new messages per LLM call
 
-        ctx = OpenAILLMContext(messages)
+    Returns:
+        Optional[Conversation]: The updated conversation, None if it doesn't exist
+
+    Raises:
+        CompletionError: If the LLM fails, the summary so far is kept
+    """
+    conversation = await Conversation.get(conversation_id)
+    if not conversation:
+        return None
 
-        sys_ctx_aggregator = llm.create_context_aggregator(
-            ctx, assistant_expect_stripped_words=False
+    projection = {"body": 1, "content": 1, "role": 1, "userId": 1, "createdAt": 1}
+    while True:
+        docs = (
+            await Message.get_motor_collection()
+            .find(_after_summary(conversation), projection)
+            .sort([("createdAt", 1), ("_id", 1)])
+            .limit(chunk)
+            .to_list(chunk)
+        )
+        if not docs:
+            break
+
+        messages = [llm_message(doc, conversation.createdBy) for doc in docs]
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages if m)
+        if transcript:
+            summary = await llm.complete(
+                [
+                    {"role": "system", "content": ROLLING_SUMMARY_PROMPT},
+                    {
+                        "role": "user",
+                        "content": f"Summary so far:\n{conversation.summary or '(none)'}\n\n"
+                        f"New messages:\n{transcript}",
+                    },
+                ],
+                max_tokens=ROLLING_SUMMARY_MAX_TOKENS,
+            )
+        else:
+            # Nothing to summarize (e.g. only attachments), just move the mark.
+            summary = conversation.summary
+
+        update = {
+            "summary": summary,
+            "summaryUntil": docs[-1]["createdAt"],
+            "summaryMessageId": str(docs[-1]["_id"]),
+            "summaryMessageCount": conversation.summaryMessageCount + len(docs),
+        }
+        result = await Conversation.get_motor_collection().update_one(
+            {"_id": conversation.id, "summaryMessageId": conversation.summaryMessageId},
+            {"$set": update},
         )
-        ctx_frame = OpenAILLMContextFrame(ctx)
-        if isinstance(llm, GoogleLLMService):
-            GoogleLLMContext.upgrade_to_google(ctx)
+        if not result.modified_count:
+            logger.info(f"Summary of conversation {conversation_id} was updated elsewhere")
+            return await Conversation.get(conversation_id)
+        for field, value in update.items():
+            setattr(conversation, field, value)
+        metrics.increment("bot.summarize.rolling.messages", len(docs))
 
-        pipeline = Pipeline([llm, sys_ctx_aggregator.assistant()])
-        runner = PipelineRunner(handle_sigint=False)
-        task = PipelineTask(pipeline)
+        if len(docs) < chunk:
+            break
 
-        await task.queue_frames([ctx_frame, EndFrame()])
-        await runner.run(task)
+    return conversation
 
-        # Validate LLM response
-        response_messages = ctx.get_messages_for_persistent_storage()
-        if not response_messages:
-            raise ValueError("No response received from LLM")
 
-        if len(response_messages) == 0:
-            raise ValueError("Empty response from LLM")
+def message_role(doc: dict, created_by: Optional[str]) -> str:
+    """LLM role of a raw message document of a conversation started by ``created_by``."""
+    if doc.get("role") in LLM_ROLES:
+        return doc["role"]
+    # Without a role, whoever started the conversation is the user.
+    user_id = doc.get("userId")
+    if created_by and user_id is not None and str(user_id) != created_by:
+        return "assistant"
+    return "user"
 
-        summary = response_messages[-1].get("content")
-        summary = summary[0].get("text")
 
-        if not summary:
-            raise ValueError("No content in LLM response")
+def llm_message(doc: dict, created_by: Optional[str]) -> Optional[Dict[str, str]]:
+    """A raw message document as an LLM message, None if it has no text.
+
+    Messages written through the API hold an LLM message in ``content``,
+    those of the chat app an encrypted ``body`` (as in ``message_json``).
+    """
+    content = doc.get("content")
+    if isinstance(content, dict):
+        text = content.get("content")
+        if isinstance(text, list):
+            # Multi-part content, only the text parts matter here.
+            text = " ".join(part["text"] for part in text if isinstance(part, dict) and part.get("text"))
+        role = content.get("role")
+        if role not in LLM_ROLES:
+            role = message_role(doc, created_by)
+    else:
+        body = doc.get("body")
+        text = decrypt_cryptojs(body, "future") if body else None
+        role = message_role(doc, created_by)
+    if not isinstance(text, str) or not text.strip():
+        return None
+    return {"role": role, "content": text}
+
 
-        # Optionally validate summary content
-        summary = summary.strip()
-        if len(summary) == 0:
-            raise ValueError("Empty summary content from LLM")
+async def generate_summary_with_llm(
+    messages: List[Dict[str, str]], llm: CompletionClient = summary_llm
+) -> Optional[str]:
+    """
+    Generate summary using a one-shot completion with message validation
+
+    Args:
+        messages: List of message dictionaries with 'role' and 'content'
+        llm: Completion client to use, the shared summary client by default
 
+    Returns:
+        Optional[str]: Generated summary or None if generation fails
+    """
+    if not llm.available:
+        return None
+
+    try:
+        summary = await llm.complete(
+            messages + [{"role": "user", "content": TITLE_PROMPT}],
+            max_tokens=TITLE_MAX_TOKENS,
+        )
         logger.info(f"Generated summary: {summary}")
         return summary
 
-    except ValueError as ve:
-        # Log specific validation errors
-        logger.error(f"Validation error in LLM response: {str(ve)}")
+    except CompletionError as e:
+        logger.error(f"Failed to generate summary: {str(e)}")
         return None
     except Exception as e:
         # Log unexpected errors
@@ -104,6 +249,7 @@ async def update_conversation_title(conversation_id: str, new_title: str) -> boo
             return False
         conversation.title = new_title
         await conversation.save()
+        invalidate_conversation(conversation_id)
         logger.info(f"Successfully updated conversation title to: {new_title}")
         return True
     except Exception as e:
@@ -123,7 +269,7 @@ async def generate_conversation_summary(conversation_id: str, db=None) -> Option
             logger.error(f"Conversation {conversation_id} not found")
             return
 
-        messages = [msg.content for msg in await Message.find(Message.conversation_id == conversation_id).sort(Message.message_number).to_list()]
+        messages = await load_conversation_messages(conversation_id)
         if not messages:
             logger.info(f"No messages found in conversation {conversation_id}")
             return
@@ -0,0 +1,185 @@
+import asyncio
+import heapq
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from src.bots.llm_client import summary_llm
+from src.bots.summarize import update_rolling_summary
+from src.common.metrics import metrics
+from src.common.timer_wheel import Timer, timer_wheel
+
+DEFAULT_SUMMARY_DEBOUNCE_SECONDS = 30.0
+DEFAULT_SUMMARY_MAX_QUEUE = 1000
+DEFAULT_SUMMARY_CONCURRENCY = 2
+
+
+class SummaryScheduler:
+    """Runs ``work(conversation_id)`` in the background, once per burst of activity.
+
+    ``request()`` is cheap and safe to call on every read or write of a
+    conversation:
+
+      * debounce: the work runs once a conversation has had no requests for
+        ``debounce`` seconds, however many came before
+      * dedupe: a conversation is never waiting or running twice; requests
+        while it runs schedule one more run after it
+      * priority: of the conversations that are due, the most recently
+        active go first
+      * bounds: at most ``max_queue`` conversations wait and ``concurrency``
+        run at once. When the queue is full the least recently active due
+        conversation makes room, or the new request is dropped if none is
+        due yet; either is summarized on its next request
+
+    Must be used from the event loop's thread.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        work: Callable[[str], Awaitable[Any]],
+        *,
+        debounce: float = DEFAULT_SUMMARY_DEBOUNCE_SECONDS,
+        max_queue: int = DEFAULT_SUMMARY_MAX_QUEUE,
+        concurrency: int = DEFAULT_SUMMARY_CONCURRENCY,
+        enabled: bool = True,
+    ):
+        self._name = name
+        self._work = work
+        self._debounce = debounce
+        self._max_queue = max(1, max_queue)
+        self._concurrency = max(1, concurrency)
+        self._enabled = enabled
+        # Time of the latest request, per conversation that is waiting or running.
+        self._last_request: Dict[str, float] = {}
+        # Conversations waiting out their debounce.
+        self._debouncing: Dict[str, Timer] = {}
+        # Conversations that are due, as (-last request, id); ids no longer in
+        # _due are stale entries, skipped when popped.
+        self._heap: List[Tuple[float, str]] = []
+        self._due: Set[str] = set()
+        self._running: Set[str] = set()
+        self._rerun: Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def waiting(self) -> int:
+        return len(self._debouncing) + len(self._due)
+
+    def request(self, conversation_id: str):
+        if not self._enabled:
+            return
+        metrics.increment(f"{self._name}.requested")
+        self._last_request[conversation_id] = time.monotonic()
+
+        if conversation_id in self._running:
+            self._rerun.add(conversation_id)
+            return
+        if conversation_id in self._debouncing or conversation_id in self._due:
+            # Already on its way, the new request only moves its debounce on.
+            return
+
+        if self.waiting >= self._max_queue and not self._evict():
+            del self._last_request[conversation_id]
+            metrics.increment(f"{self._name}.dropped")
+            return
+        self._debouncing[conversation_id] = timer_wheel.call_later(
+            self._debounce, self._on_quiet, conversation_id
+        )
+        self._update_gauges()
+
+    async def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self._concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for timer in self._debouncing.values():
+            timer.cancel()
+        self._debouncing.clear()
+        self._heap.clear()
+        self._due.clear()
+        self._last_request.clear()
+
+    def _on_quiet(self, conversation_id: str):
+        remaining = self._last_request[conversation_id] + self._debounce - time.monotonic()
+        if remaining > 0:
+            self._debouncing[conversation_id] = timer_wheel.call_later(
+                remaining, self._on_quiet, conversation_id
+            )
+            return
+        del self._debouncing[conversation_id]
+        self._due.add(conversation_id)
+        heapq.heappush(self._heap, (-self._last_request[conversation_id], conversation_id))
+        self._wakeup.set()
+        self._update_gauges()
+
+    def _evict(self) -> bool:
+        # Make room by dropping the least recently active due conversation.
+        candidates = [(-priority, id) for priority, id in self._heap if id in self._due]
+        if not candidates:
+            return False
+        _, conversation_id = min(candidates)
+        self._due.discard(conversation_id)
+        del self._last_request[conversation_id]
+        metrics.increment(f"{self._name}.evicted")
+        return True
+
+    def _next_due(self) -> Optional[str]:
+        while self._heap:
+            _, conversation_id = heapq.heappop(self._heap)
+            if conversation_id in self._due:
+                self._due.remove(conversation_id)
+                return conversation_id
+        return None
+
+    async def _worker(self):
+        while True:
+            conversation_id = self._next_due()
+            if conversation_id is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            self._running.add(conversation_id)
+            self._update_gauges()
+            start = time.monotonic()
+            try:
+                await self._work(conversation_id)
+                metrics.increment(f"{self._name}.completed")
+            except Exception as e:
+                metrics.increment(f"{self._name}.failed")
+                logger.warning(f"{self._name}: work for conversation {conversation_id} failed: {e}")
+            finally:
+                metrics.observe(f"{self._name}.duration", time.monotonic() - start)
+                self._running.discard(conversation_id)
+
+            if conversation_id in self._rerun:
+                self._rerun.discard(conversation_id)
+                self._debouncing[conversation_id] = timer_wheel.call_later(
+                    self._debounce, self._on_quiet, conversation_id
+                )
+            else:
+                del self._last_request[conversation_id]
+            self._update_gauges()
+
+    def _update_gauges(self):
+        metrics.set_gauge(f"{self._name}.waiting", self.waiting)
+        metrics.set_gauge(f"{self._name}.running", len(self._running))
+
+
+summary_scheduler = SummaryScheduler(
+    "bot.summarize.scheduler",
+    update_rolling_summary,
+    debounce=float(os.getenv("SUMMARY_DEBOUNCE", DEFAULT_SUMMARY_DEBOUNCE_SECONDS)),
+    max_queue=int(os.getenv("SUMMARY_MAX_QUEUE", DEFAULT_SUMMARY_MAX_QUEUE)),
+    concurrency=int(os.getenv("SUMMARY_CONCURRENCY", DEFAULT_SUMMARY_CONCURRENCY)),
+    # Without an LLM there is nothing to schedule.
+    enabled=summary_llm.available,
+)
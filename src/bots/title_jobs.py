@@ -0,0 +1,225 @@
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+from pymongo import UpdateOne
+
+from src.bots.summarize import (
+    UNTITLED_TITLES,
+    generate_summary_with_llm,
+    load_conversation_messages,
+)
+from src.common.database import MongoDB, raw_id
+from src.common.metrics import metrics
+from src.common.models import Conversation, JobCheckpoint, Message
+from src.common.response_cache import invalidate_conversation
+
+DEFAULT_TITLE_JOB_CONCURRENCY = 4
+# Provider quota left for titles, shared by all the job's workers.
+DEFAULT_TITLE_JOB_REQUESTS_PER_MINUTE = 60
+# Conversations read per page of the scan; titles are written and the
+# checkpoint saved once per page.
+DEFAULT_TITLE_JOB_PAGE_SIZE = 100
+# Too short a conversation doesn't say what it's about yet.
+DEFAULT_TITLE_JOB_MIN_MESSAGES = 4
+# How often the server runs the job, 0 to only run it by hand:
+#   python -m src.bots.title_jobs [--limit N]
+DEFAULT_TITLE_JOB_INTERVAL_SECONDS = 0
+
+# Longest the pacer backs off to while the provider keeps failing.
+MAX_BACKOFF_FACTOR = 32
+
+
+class RequestPacer:
+    """Spaces requests out to at most ``per_minute`` a minute.
+
+    After a failed request the spacing doubles (up to ``MAX_BACKOFF_FACTOR``
+    times), and it comes back down as requests succeed again, so a job
+    slows down on its own when the provider starts rate limiting.
+    """
+
+    def __init__(self, per_minute: float):
+        self._interval = 60 / per_minute if per_minute > 0 else 0
+        self._factor = 1.0
+        self._next = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        start = max(now, self._next)
+        self._next = start + self._interval * self._factor
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def failed(self):
+        self._factor = min(self._factor * 2, MAX_BACKOFF_FACTOR)
+
+    def succeeded(self):
+        self._factor = max(1.0, self._factor / 2)
+
+
+class TitleBatchJob:
+    """Gives untitled conversations a title, in bulk and off the request path.
+
+    A run scans the untitled conversations in ``_id`` order, a page at a
+    time, and summarizes each with up to ``concurrency`` LLM requests in
+    flight, paced by a ``RequestPacer``. The titles of a page are written
+    with one unordered bulk write, and only to conversations that are still
+    untitled (users may have renamed them meanwhile). Then the page's last
+    ``_id`` is checkpointed, so an interrupted run resumes where it stopped.
+
+    When the scan reaches the end the checkpoint is reset, and the next run
+    goes over the conversations that were too short or failed again.
+
+    Only run it in one place at a time (one server, or the CLI), runs don't
+    coordinate with each other.
+    """
+
+    def __init__(
+        self,
+        name: str = "titles",
+        *,
+        concurrency: int = DEFAULT_TITLE_JOB_CONCURRENCY,
+        requests_per_minute: float = DEFAULT_TITLE_JOB_REQUESTS_PER_MINUTE,
+        page_size: int = DEFAULT_TITLE_JOB_PAGE_SIZE,
+        min_messages: int = DEFAULT_TITLE_JOB_MIN_MESSAGES,
+        summarize: Callable[[List[Dict[str, str]]], Awaitable[Optional[str]]] = generate_summary_with_llm,
+    ):
+        self._name = name
+        self._metrics = f"bot.summarize.{name}"
+        self._concurrency = max(1, concurrency)
+        self._pacer = RequestPacer(requests_per_minute)
+        self._page_size = page_size
+        self._min_messages = min_messages
+        self._summarize = summarize
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self, limit: Optional[int] = None) -> Dict[str, int]:
+        """Title conversations from the checkpoint on.
+
+        Args:
+            limit: Stop after scanning this many conversations.
+
+        Returns:
+            Dict[str, int]: How many conversations were scanned, titled,
+            skipped (too short) and failed.
+        """
+        stats = {"scanned": 0, "titled": 0, "skipped": 0, "failed": 0}
+        started = time.monotonic()
+        checkpoint = await JobCheckpoint.get(self._name) or JobCheckpoint(id=self._name)
+        semaphore = asyncio.Semaphore(self._concurrency)
+        collection = Conversation.get_motor_collection()
+
+        while limit is None or stats["scanned"] < limit:
+            query: Dict[str, Any] = {"title": {"$in": UNTITLED_TITLES}, "isRemove": {"$ne": True}}
+            if checkpoint.cursor:
+                cursor = raw_id(checkpoint.cursor)
+                if isinstance(cursor, str):
+                    # $gt only matches ids of the cursor's own type, and
+                    # string ids sort before every ObjectId.
+                    query["$or"] = [{"_id": {"$gt": cursor}}, {"_id": {"$type": "objectId"}}]
+                else:
+                    query["_id"] = {"$gt": cursor}
+            page_size = self._page_size if limit is None else min(self._page_size, limit - stats["scanned"])
+            ids = [
+                doc["_id"]
+                async for doc in collection.find(query, {"_id": 1}).sort("_id", 1).limit(page_size)
+            ]
+
+            titles = await asyncio.gather(*[self._title(id, semaphore, stats) for id in ids])
+            updates = [
+                UpdateOne({"_id": id, "title": {"$in": UNTITLED_TITLES}}, {"$set": {"title": title}})
+                for id, title in zip(ids, titles)
+                if title
+            ]
+            if updates:
+                result = await collection.bulk_write(updates, ordered=False)
+                stats["titled"] += result.modified_count
+                metrics.increment(f"{self._metrics}.titled", result.modified_count)
+                for id, title in zip(ids, titles):
+                    if title:
+                        invalidate_conversation(str(id))
+            stats["scanned"] += len(ids)
+
+            # A short page is the end of the scan, start over next time.
+            done = len(ids) < page_size
+            checkpoint.cursor = None if done else str(ids[-1])
+            checkpoint.processed += len(ids)
+            checkpoint.updatedAt = datetime.utcnow()
+            await checkpoint.save()
+            if done:
+                break
+
+        elapsed = time.monotonic() - started
+        metrics.set_gauge(f"{self._metrics}.rate", stats["scanned"] / elapsed * 3600 if elapsed else 0)
+        logger.info(f"Title job {self._name} finished in {elapsed:.1f}s: {stats}")
+        return stats
+
+    async def _title(self, conversation_id: Any, semaphore: asyncio.Semaphore, stats: dict) -> Optional[str]:
+        async with semaphore:
+            messages = await load_conversation_messages(str(conversation_id))
+            if len(messages) < self._min_messages:
+                stats["skipped"] += 1
+                return None
+
+            await self._pacer.wait()
+            start = time.monotonic()
+            try:
+                title = await self._summarize(messages)
+            except Exception as e:
+                logger.warning(f"Title job {self._name}: failed to summarize {conversation_id}: {e}")
+                title = None
+            metrics.observe(f"{self._metrics}.latency", time.monotonic() - start)
+
+            if not title:
+                self._pacer.failed()
+                stats["failed"] += 1
+                metrics.increment(f"{self._metrics}.failed")
+                return None
+            self._pacer.succeeded()
+            return title
+
+    async def start(self, interval: float):
+        """Run the job every ``interval`` seconds in the background."""
+        if not self._task and interval > 0:
+            self._task = asyncio.create_task(self._run_every(interval))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run_every(self, interval: float):
+        while True:
+            try:
+                await self.run()
+            except Exception as e:
+                logger.exception(f"Title job {self._name} failed: {e}")
+            await asyncio.sleep(interval)
+
+
+title_batch_job = TitleBatchJob(
+    concurrency=int(os.getenv("TITLE_JOB_CONCURRENCY", DEFAULT_TITLE_JOB_CONCURRENCY)),
+    requests_per_minute=float(
+        os.getenv("TITLE_JOB_REQUESTS_PER_MINUTE", DEFAULT_TITLE_JOB_REQUESTS_PER_MINUTE)
+    ),
+    page_size=int(os.getenv("TITLE_JOB_PAGE_SIZE", DEFAULT_TITLE_JOB_PAGE_SIZE)),
+    min_messages=int(os.getenv("TITLE_JOB_MIN_MESSAGES", DEFAULT_TITLE_JOB_MIN_MESSAGES)),
+)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Title untitled conversations")
+    parser.add_argument("--limit", type=int, help="Stop after this many conversations")
+    args = parser.parse_args()
+
+    await MongoDB.init([Conversation, Message, JobCheckpoint])
+    await title_batch_job.run(args.limit)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
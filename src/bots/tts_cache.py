@@ -0,0 +1,277 @@
+import hashlib
+import mmap
+import os
+import re
+import uuid
+from collections import OrderedDict
+from typing import AsyncGenerator, Dict, Optional
+
+from loguru import logger
+
+from pipecat.frames.frames import (
+    Frame,
+    StartInterruptionFrame,
+    TTSAudioRawFrame,
+    TTSSpeakFrame,
+    TTSStartedFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection
+from pipecat.services.cartesia.tts import CartesiaTTSService
+
+from src.common.metrics import metrics
+
+DEFAULT_TTS_CACHE_DIR = ".cache/tts"
+# Disk budget, 0 disables the cache.
+DEFAULT_TTS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Segments kept mapped in memory.
+DEFAULT_TTS_CACHE_MEMORY_ENTRIES = 128
+# Longer texts are unlikely to repeat.
+DEFAULT_TTS_CACHE_MAX_CHARS = 200
+
+# Size of the audio frames a cached segment is played in (16-bit mono).
+TTS_CACHE_CHUNK_SECONDS = 0.2
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_tts_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+class TTSCache:
+    """Synthesized audio, keyed by text and everything that changes how it sounds.
+
+    Segments are raw PCM files in ``directory``, evicted least recently used
+    first once they take more than ``max_bytes``. The most recently used
+    ``memory_entries`` of them stay memory-mapped, so replaying a phrase reads
+    straight from the page cache instead of the file.
+    """
+
+    def __init__(
+        self,
+        *,
+        directory: str = DEFAULT_TTS_CACHE_DIR,
+        max_bytes: int = DEFAULT_TTS_CACHE_MAX_BYTES,
+        memory_entries: int = DEFAULT_TTS_CACHE_MEMORY_ENTRIES,
+        max_chars: int = DEFAULT_TTS_CACHE_MAX_CHARS,
+    ):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._memory_entries = memory_entries
+        self._max_chars = max_chars
+        self._mapped: "OrderedDict[str, mmap.mmap]" = OrderedDict()
+        # Segments on disk and their size, least recently used first. Loaded
+        # from the directory on first use.
+        self._disk: Optional["OrderedDict[str, int]"] = None
+        self._disk_bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_bytes > 0
+
+    def key(
+        self,
+        text: str,
+        *,
+        model: str,
+        voice_id: str,
+        language: Optional[str],
+        speed,
+        emotion,
+        sample_rate: int,
+    ) -> Optional[str]:
+        """The cache key of ``text`` with the given settings, ``None`` if it isn't cacheable."""
+        normalized = normalize_tts_text(text)
+        if not self.enabled or not normalized or len(normalized) > self._max_chars:
+            return None
+        emotion = ",".join(emotion) if emotion else ""
+        raw = f"{model}|{voice_id}|{language}|{speed}|{emotion}|{sample_rate}|{normalized}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[mmap.mmap]:
+        segment = self._mapped.get(key)
+        if segment is not None:
+            self._mapped.move_to_end(key)
+            self._touch(key)
+            metrics.increment("bot.tts.cache.hit.memory")
+            return segment
+
+        disk = self._load_disk()
+        if key not in disk:
+            metrics.increment("bot.tts.cache.miss")
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                segment = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to map cached TTS segment {key}: {e}")
+            self._forget(key)
+            metrics.increment("bot.tts.cache.miss")
+            return None
+
+        self._mapped[key] = segment
+        while len(self._mapped) > self._memory_entries:
+            self._mapped.popitem(last=False)
+        self._touch(key)
+        metrics.increment("bot.tts.cache.hit.disk")
+        return segment
+
+    def put(self, key: str, audio: bytes):
+        if not audio:
+            return
+        disk = self._load_disk()
+        path = self._path(key)
+        # Written aside and renamed, so readers never map half a file.
+        partial = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(partial, "wb") as f:
+                f.write(audio)
+            os.replace(partial, path)
+        except OSError as e:
+            logger.warning(f"Unable to store TTS segment {key}: {e}")
+            return
+
+        self._disk_bytes += len(audio) - disk.pop(key, 0)
+        disk[key] = len(audio)
+        metrics.increment("bot.tts.cache.stored")
+        while self._disk_bytes > self._max_bytes and len(disk) > 1:
+            oldest = next(iter(disk))
+            self._forget(oldest)
+            try:
+                os.remove(self._path(oldest))
+            except OSError:
+                pass
+            metrics.increment("bot.tts.cache.evicted")
+        metrics.set_gauge("bot.tts.cache.bytes", self._disk_bytes)
+
+    def _touch(self, key: str):
+        if self._disk is not None and key in self._disk:
+            self._disk.move_to_end(key)
+
+    def _forget(self, key: str):
+        self._mapped.pop(key, None)
+        if self._disk is not None and key in self._disk:
+            self._disk_bytes -= self._disk.pop(key)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.pcm")
+
+    def _load_disk(self) -> "OrderedDict[str, int]":
+        if self._disk is None:
+            os.makedirs(self._directory, exist_ok=True)
+            entries = []
+            for entry in os.scandir(self._directory):
+                if entry.name.endswith(".pcm"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name[: -len(".pcm")], stat.st_size))
+            self._disk = OrderedDict((key, size) for _, key, size in sorted(entries))
+            self._disk_bytes = sum(self._disk.values())
+            metrics.set_gauge("bot.tts.cache.bytes", self._disk_bytes)
+        return self._disk
+
+
+class CachedCartesiaTTSService(CartesiaTTSService):
+    """Cartesia TTS that replays standalone utterances from a ``TTSCache``.
+
+    Only texts spoken on their own through a ``TTSSpeakFrame`` (``tts say``
+    actions, acknowledgements, error messages) are cached: they get an audio
+    context of their own, so all of its audio belongs to that text. Sentences
+    streamed from the LLM share a context and always go to Cartesia.
+    """
+
+    def __init__(self, *, cache: TTSCache, **kwargs):
+        super().__init__(**kwargs)
+        self._cache = cache
+        self._speaking = False
+        # Audio contexts being recorded for the cache and their audio so far.
+        self._recordings: Dict[str, tuple] = {}
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        if isinstance(frame, TTSSpeakFrame):
+            self._speaking = True
+            try:
+                await super().process_frame(frame, direction)
+            finally:
+                self._speaking = False
+            return
+        await super().process_frame(frame, direction)
+
+    async def _handle_interruption(self, frame: StartInterruptionFrame, direction: FrameDirection):
+        await super()._handle_interruption(frame, direction)
+        self._recordings.clear()
+
+    async def run_tts(self, text: str) -> AsyncGenerator[Frame, None]:
+        key = None
+        # Text joining an open context can't be told apart from the rest.
+        if self._speaking and not self._context_id:
+            key = self._cache.key(
+                text,
+                model=self.model_name,
+                voice_id=self._voice_id,
+                language=self._settings["language"],
+                speed=self._settings["speed"],
+                emotion=self._settings["emotion"],
+                sample_rate=self.sample_rate,
+            )
+
+        if key is None:
+            async for frame in super().run_tts(text):
+                yield frame
+            return
+
+        segment = self._cache.get(key)
+        if segment is not None:
+            logger.debug(f"{self}: Replaying cached TTS [{text}]")
+            yield TTSStartedFrame()
+            await self._play_cached(text, segment)
+            yield None
+            return
+
+        async for frame in super().run_tts(text):
+            yield frame
+        if self._context_id:
+            self._recordings[self._context_id] = (key, [])
+
+    async def append_to_audio_context(self, context_id: str, frame: TTSAudioRawFrame):
+        recording = self._recordings.get(context_id)
+        if recording:
+            recording[1].append(frame.audio)
+        await super().append_to_audio_context(context_id, frame)
+
+    async def remove_audio_context(self, context_id: str):
+        recording = self._recordings.pop(context_id, None)
+        if recording:
+            key, chunks = recording
+            self._cache.put(key, b"".join(chunks))
+        await super().remove_audio_context(context_id)
+
+    async def _play_cached(self, text: str, segment: mmap.mmap):
+        # Goes through an audio context of its own, so it plays in order with
+        # whatever Cartesia is still sending, and ends the way Cartesia's
+        # "done" message does.
+        context_id = str(uuid.uuid4())
+        await self.create_audio_context(context_id)
+
+        chunk = int(self.sample_rate * TTS_CACHE_CHUNK_SECONDS) * 2
+        for i in range(0, len(segment), chunk):
+            await self.append_to_audio_context(
+                context_id, TTSAudioRawFrame(segment[i : i + chunk], self.sample_rate, 1)
+            )
+
+        # Spread the words over the audio, there are no real timestamps.
+        words = text.split()
+        duration = len(segment) / 2 / self.sample_rate
+        self.start_word_timestamps()
+        await self.add_word_timestamps(
+            [(word, duration * i / len(words)) for i, word in enumerate(words)]
+            + [("TTSStoppedFrame", 0), ("Reset", 0)]
+        )
+        await self.remove_audio_context(context_id)
+
+
+tts_cache = TTSCache(
+    directory=os.getenv("BOT_TTS_CACHE_DIR", DEFAULT_TTS_CACHE_DIR),
+    max_bytes=int(os.getenv("BOT_TTS_CACHE_MAX_BYTES", DEFAULT_TTS_CACHE_MAX_BYTES)),
+    memory_entries=int(os.getenv("BOT_TTS_CACHE_MEMORY_ENTRIES", DEFAULT_TTS_CACHE_MEMORY_ENTRIES)),
+    max_chars=int(os.getenv("BOT_TTS_CACHE_MAX_CHARS", DEFAULT_TTS_CACHE_MAX_CHARS)),
+)
@@ -0,0 +1,149 @@
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from loguru import logger
+
+from pipecat.frames.frames import (
+    BotStartedSpeakingFrame,
+    LLMTextFrame,
+    MetricsFrame,
+    TranscriptionFrame,
+    TTSAudioRawFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.metrics.metrics import TTFBMetricsData
+from pipecat.observers.base_observer import BaseObserver, FramePushed
+from pipecat.services.llm_service import LLMService
+from pipecat.services.stt_service import STTService
+from pipecat.services.tts_service import TTSService
+from pipecat.transports.base_input import BaseInputTransport
+from pipecat.transports.base_output import BaseOutputTransport
+
+from src.common.metrics import metrics
+
+# Most recent turn records kept for /api/metrics/turns.
+DEFAULT_TURN_RECORDS = 256
+
+# Waterfall stages, in the order they normally happen. Each is measured from
+# the moment the user actually stopped talking (VAD stop minus stop_secs).
+TURN_STAGES = ["vad_stop", "stt_final", "llm_first_token", "tts_first_audio", "audio_out"]
+
+turn_records: Deque[dict] = deque(maxlen=DEFAULT_TURN_RECORDS)
+
+# Called with every turn record, e.g. by bot workers to report their turns
+# to the web process (see src/bots/webrtc/workers.py).
+turn_listeners: List[Callable[[dict], None]] = []
+
+
+def record_turn(record: dict):
+    """Keep a completed turn for ``/api/metrics/turns`` and its histograms."""
+    turn_records.append(record)
+    for stage, seconds in record["waterfall"].items():
+        metrics.observe(f"bot.turn.{stage}", seconds)
+    for kind in ("llm", "tts"):
+        if record.get(f"{kind}_ttfb") is not None:
+            metrics.observe(f"bot.turn.{kind}_ttfb", record[f"{kind}_ttfb"])
+    for listener in turn_listeners:
+        listener(record)
+
+
+class _Turn:
+    def __init__(self, number: int, started_at: int):
+        self.number = number
+        self.started_at = started_at
+        self.stop_secs = 0.0
+        # Pipeline clock times (ns) of each stage.
+        self.events: Dict[str, int] = {}
+        # Provider TTFB from FrameProcessorMetrics, in seconds.
+        self.ttfb: Dict[str, float] = {}
+
+
+class TurnTracer(BaseObserver):
+    """Breaks the voice-to-voice latency of every user turn into stages.
+
+    A turn starts when the user starts speaking. From the frames that go
+    through the pipeline it records when VAD declared the end of speech,
+    when the final transcription, the first LLM token and the first TTS audio
+    were produced and when the first bot audio left the output transport,
+    plus the LLM and TTS TTFB reported by the services' metrics.
+
+    Each completed turn is logged and passed to ``record_turn``, which
+    appends it to ``turn_records`` and observes its stages as
+    ``bot.turn.<stage>`` histograms (for percentiles in ``/api/metrics``).
+    Turns the user abandons by speaking again before the bot answers are
+    only counted.
+    """
+
+    def __init__(self, session_id: str):
+        super().__init__()
+        self._session_id = session_id
+        self._turns = 0
+        self._turn: Optional[_Turn] = None
+
+    async def on_push_frame(self, data: FramePushed):
+        frame = data.frame
+        source = data.source
+
+        # Frames are seen at every hop, only their origin matters.
+        if isinstance(frame, UserStartedSpeakingFrame) and isinstance(source, BaseInputTransport):
+            if self._turn and "vad_stop" in self._turn.events:
+                metrics.increment("bot.turn.abandoned")
+            self._turns += 1
+            self._turn = _Turn(self._turns, data.timestamp)
+            return
+
+        turn = self._turn
+        if not turn:
+            return
+
+        if isinstance(frame, UserStoppedSpeakingFrame) and isinstance(source, BaseInputTransport):
+            turn.events["vad_stop"] = data.timestamp
+            vad_analyzer = source.vad_analyzer
+            turn.stop_secs = vad_analyzer.params.stop_secs if vad_analyzer else 0.0
+        elif isinstance(frame, TranscriptionFrame) and isinstance(source, STTService):
+            # Long utterances get several finals, the last one before the LLM
+            # starts is the one that is answered.
+            if "llm_first_token" not in turn.events:
+                turn.events["stt_final"] = data.timestamp
+        elif "vad_stop" not in turn.events:
+            return
+        elif isinstance(frame, LLMTextFrame) and isinstance(source, LLMService):
+            turn.events.setdefault("llm_first_token", data.timestamp)
+        elif isinstance(frame, TTSAudioRawFrame) and isinstance(source, TTSService):
+            turn.events.setdefault("tts_first_audio", data.timestamp)
+        elif isinstance(frame, MetricsFrame) and isinstance(source, (LLMService, TTSService)):
+            kind = "llm" if isinstance(source, LLMService) else "tts"
+            for item in frame.data:
+                if isinstance(item, TTFBMetricsData) and item.value:
+                    turn.ttfb.setdefault(kind, item.value)
+        elif isinstance(frame, BotStartedSpeakingFrame) and isinstance(source, BaseOutputTransport):
+            turn.events["audio_out"] = data.timestamp
+            self._finish(turn)
+            self._turn = None
+
+    def _finish(self, turn: _Turn):
+        # The user stopped talking stop_secs before VAD said so.
+        speech_end = turn.events["vad_stop"] - int(turn.stop_secs * 1e9)
+        waterfall = {
+            stage: (turn.events[stage] - speech_end) / 1e9
+            for stage in TURN_STAGES
+            if stage in turn.events
+        }
+
+        record = {
+            "session_id": self._session_id,
+            "turn": turn.number,
+            "time": time.time(),
+            "stop_secs": turn.stop_secs,
+            "waterfall": waterfall,
+            "llm_ttfb": turn.ttfb.get("llm"),
+            "tts_ttfb": turn.ttfb.get("tts"),
+        }
+        record_turn(record)
+
+        logger.info(
+            f"Turn {turn.number} of {self._session_id}: "
+            + " ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in waterfall.items())
+        )
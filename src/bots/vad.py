@@ -0,0 +1,325 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional
+
+import numpy as np
+from loguru import logger
+from pyloudnorm.iirfilter import IIRfilter
+from scipy.signal import sosfilt
+
+from pipecat.audio.utils import exp_smoothing, normalize_value
+from pipecat.audio.vad.vad_analyzer import VADAnalyzer, VADParams, VADState
+
+from src.bots.audio_buffer import AudioRingBuffer, as_samples
+from src.common.metrics import metrics
+
+try:
+    import onnxruntime
+except ModuleNotFoundError as e:
+    logger.error(f"Exception: {e}")
+    logger.error("In order to use Silero VAD, you need to `pip install pipecat-ai[silero]`.")
+    raise Exception(f"Missing module(s): {e}")
+
+# How long the engine waits for other sessions' chunks before running a batch.
+DEFAULT_BATCH_WINDOW_MS = 4
+DEFAULT_MAX_BATCH_SIZE = 512
+
+# Same as pipecat's SileroVADAnalyzer: the model state is reset periodically
+# so it doesn't drift on long sessions.
+MODEL_RESET_STATES_TIME = 5.0
+
+SILERO_STATE_SIZE = 128
+
+
+def _context_size(sample_rate: int) -> int:
+    return 64 if sample_rate == 16000 else 32
+
+
+def _k_weighting(sample_rate: int) -> np.ndarray:
+    # The filters of pyloudnorm's default "K-weighting" meter, as a cascade
+    # of second-order sections.
+    stages = [
+        IIRfilter(4.0, 1 / np.sqrt(2), 1500.0, sample_rate, "high_shelf"),
+        IIRfilter(0.0, 0.5, 38.0, sample_rate, "high_pass"),
+    ]
+    return np.array([np.concatenate(stage.generate_coefficients()) for stage in stages])
+
+
+class SileroSessionState:
+    """Recurrent state of the Silero model for a single audio stream.
+
+    This is the only per-session part of the model (~1 KB); the ONNX session
+    itself is shared by every stream in the process.
+    """
+
+    def __init__(self):
+        self.reset(0)
+
+    def reset(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self.state = np.zeros((2, 1, SILERO_STATE_SIZE), dtype=np.float32)
+        self.context = np.zeros((1, _context_size(sample_rate or 16000)), dtype=np.float32)
+
+
+class _VADRequest:
+    __slots__ = ("session", "audio", "future")
+
+    def __init__(self, session: SileroSessionState, audio: np.ndarray):
+        self.session = session
+        self.audio = audio
+        self.future: Future = Future()
+
+
+class SharedSileroVADEngine:
+    """Process-wide Silero VAD model with cross-session batching.
+
+    The ONNX model is loaded once. Sessions submit 32 ms chunks together with
+    their own ``SileroSessionState`` and block until the result is ready. A
+    single worker thread collects the chunks that arrive within
+    ``batch_window_ms`` and runs them as one batched inference call (Silero
+    accepts a batch dimension on both the input and the recurrent state).
+    """
+
+    def __init__(
+        self,
+        *,
+        batch_window_ms: float = DEFAULT_BATCH_WINDOW_MS,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    ):
+        self._batch_window = batch_window_ms / 1000
+        self._max_batch_size = max_batch_size
+        self._session = self._load_model()
+        self._queue: "queue.SimpleQueue[Optional[_VADRequest]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="silero-vad", daemon=True)
+        self._thread.start()
+
+    def _load_model(self):
+        try:
+            from importlib_resources import files
+        except ModuleNotFoundError:
+            from importlib.resources import files
+
+        model_file_path = str(files("pipecat.audio.vad.data").joinpath("silero_vad.onnx"))
+
+        logger.debug("Loading shared Silero VAD model...")
+        opts = onnxruntime.SessionOptions()
+        opts.inter_op_num_threads = 1
+        opts.intra_op_num_threads = 1
+        session = onnxruntime.InferenceSession(
+            model_file_path, providers=["CPUExecutionProvider"], sess_options=opts
+        )
+        logger.debug("Loaded shared Silero VAD")
+        return session
+
+    def infer(self, session: SileroSessionState, audio: np.ndarray) -> float:
+        """Blocking call, meant to be run from the transport's VAD executor."""
+        request = _VADRequest(session, audio)
+        self._queue.put(request)
+        return request.future.result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = time.monotonic() + self._batch_window
+            while len(batch) < self._max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    request = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._process(batch)
+                    return
+                batch.append(request)
+            self._process(batch)
+
+    def _process(self, batch: List[_VADRequest]):
+        # A batch can only contain one sample rate, so group by it.
+        by_rate = {}
+        for request in batch:
+            by_rate.setdefault(request.session.sample_rate, []).append(request)
+        for sample_rate, requests in by_rate.items():
+            try:
+                self._infer_batch(sample_rate, requests)
+            except Exception as e:
+                for request in requests:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _infer_batch(self, sample_rate: int, requests: List[_VADRequest]):
+        start = time.perf_counter()
+        context_size = _context_size(sample_rate)
+
+        x = np.concatenate(
+            [
+                np.concatenate((r.session.context, r.audio[np.newaxis, :]), axis=1)
+                for r in requests
+            ],
+            axis=0,
+        )
+        state = np.concatenate([r.session.state for r in requests], axis=1)
+
+        out, new_state = self._session.run(
+            None, {"input": x, "state": state, "sr": np.array(sample_rate, dtype=np.int64)}
+        )
+
+        for i, r in enumerate(requests):
+            r.session.state = new_state[:, i : i + 1, :]
+            r.session.context = x[i : i + 1, -context_size:]
+            r.future.set_result(float(out[i][0]))
+
+        metrics.increment("bot.vad.inference_calls")
+        metrics.increment("bot.vad.chunks", len(requests))
+        metrics.observe("bot.vad.batch_size", len(requests))
+        metrics.observe("bot.vad.batch_time", time.perf_counter() - start)
+
+
+_engine: Optional[SharedSileroVADEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_vad_engine() -> SharedSileroVADEngine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = SharedSileroVADEngine(
+                    batch_window_ms=float(
+                        os.getenv("VAD_BATCH_WINDOW_MS", DEFAULT_BATCH_WINDOW_MS)
+                    ),
+                    max_batch_size=int(os.getenv("VAD_MAX_BATCH_SIZE", DEFAULT_MAX_BATCH_SIZE)),
+                )
+    return _engine
+
+
+class SharedSileroVADAnalyzer(VADAnalyzer):
+    """Drop-in replacement for pipecat's ``SileroVADAnalyzer``.
+
+    Instead of loading its own copy of the model, each analyzer only keeps
+    the recurrent state for its stream and runs inference on the shared
+    engine.
+
+    Incoming audio is buffered in an ``AudioRingBuffer`` rather than a
+    growing ``bytes`` object, and the model input is converted into a
+    preallocated array, so analyzing a chunk doesn't allocate audio buffers.
+    """
+
+    def __init__(self, *, sample_rate: Optional[int] = None, params: Optional[VADParams] = None):
+        self._engine = get_vad_engine()
+        self._state = SileroSessionState()
+        self._ring: Optional[AudioRingBuffer] = None
+        self._model_input = np.zeros(0, dtype=np.float32)
+        self._k_weighting: Optional[np.ndarray] = None
+        super().__init__(sample_rate=sample_rate, params=params)
+        self._last_reset_time = 0
+
+    def set_sample_rate(self, sample_rate: int):
+        if sample_rate != 16000 and sample_rate != 8000:
+            raise ValueError(
+                f"Silero VAD sample rate needs to be 16000 or 8000 (sample rate: {sample_rate})"
+            )
+        super().set_sample_rate(sample_rate)
+        self._state.reset(sample_rate)
+        self._k_weighting = _k_weighting(self.sample_rate)
+
+    def set_params(self, params: VADParams):
+        super().set_params(params)
+        # A few chunks' worth, transports push 10-20 ms at a time.
+        self._ring = AudioRingBuffer(self._vad_frames * self._num_channels * 4)
+        self._model_input = np.zeros(self._vad_frames, dtype=np.float32)
+
+    def num_frames_required(self) -> int:
+        return 512 if self.sample_rate == 16000 else 256
+
+    def voice_confidence(self, buffer) -> float:
+        try:
+            # The engine is done with the input by the time infer() returns,
+            # so the same array is reused for every chunk.
+            audio_float32 = self._model_input
+            np.multiply(as_samples(buffer), 1 / 32768.0, out=audio_float32)
+            confidence = self._engine.infer(self._state, audio_float32)
+
+            curr_time = time.time()
+            if curr_time - self._last_reset_time >= MODEL_RESET_STATES_TIME:
+                self._state.reset(self.sample_rate)
+                self._last_reset_time = curr_time
+
+            return confidence
+        except Exception as e:
+            logger.error(f"Error analyzing audio with Silero VAD: {e}")
+            return 0
+
+    def _get_smoothed_volume(self, audio) -> float:
+        # pipecat's calculate_audio_volume() builds a pyloudnorm Meter (and
+        # recomputes its filter coefficients) for every chunk. With the chunk
+        # as the only gating block, the integrated loudness is simply the mean
+        # square of the K-weighted signal, gated at -70 LUFS.
+        filtered = sosfilt(self._k_weighting, as_samples(audio).astype(np.float64))
+        mean_square = np.dot(filtered, filtered) / len(filtered)
+        loudness = -0.691 + 10.0 * np.log10(mean_square) if mean_square > 0 else -np.inf
+        volume = normalize_value(loudness, -20, 80) if loudness > -70.0 else 0.0
+        return exp_smoothing(volume, self._prev_volume, self._smoothing_factor)
+
+    def analyze_audio(self, buffer) -> VADState:
+        # Same as VADAnalyzer.analyze_audio(), with the ring instead of bytes.
+        self._ring.write(buffer)
+
+        num_required_samples = self._vad_frames * self._num_channels
+        if len(self._ring) < num_required_samples:
+            return self._vad_state
+
+        audio_frames = self._ring.read(num_required_samples)
+
+        confidence = self.voice_confidence(audio_frames)
+
+        volume = self._get_smoothed_volume(audio_frames)
+        self._prev_volume = volume
+
+        speaking = confidence >= self._params.confidence and volume >= self._params.min_volume
+
+        if speaking:
+            match self._vad_state:
+                case VADState.QUIET:
+                    self._vad_state = VADState.STARTING
+                    self._vad_starting_count = 1
+                case VADState.STARTING:
+                    self._vad_starting_count += 1
+                case VADState.STOPPING:
+                    self._vad_state = VADState.SPEAKING
+                    self._vad_stopping_count = 0
+        else:
+            match self._vad_state:
+                case VADState.STARTING:
+                    self._vad_state = VADState.QUIET
+                    self._vad_starting_count = 0
+                case VADState.SPEAKING:
+                    self._vad_state = VADState.STOPPING
+                    self._vad_stopping_count = 1
+                case VADState.STOPPING:
+                    self._vad_stopping_count += 1
+
+        if (
+            self._vad_state == VADState.STARTING
+            and self._vad_starting_count >= self._vad_start_frames
+        ):
+            self._vad_state = VADState.SPEAKING
+            self._vad_starting_count = 0
+
+        if (
+            self._vad_state == VADState.STOPPING
+            and self._vad_stopping_count >= self._vad_stop_frames
+        ):
+            self._vad_state = VADState.QUIET
+            self._vad_stopping_count = 0
+
+        return self._vad_state
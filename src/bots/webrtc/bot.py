@@ -1,15 +1,20 @@
 import asyncio
 import os
 import sys
+import time
 from multiprocessing import Process
-from typing import Awaitable, Callable
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from uuid import uuid4
 
 import aiohttp
+from src.bots.turn_tracer import TurnTracer
 from src.bots.types import BotCallbacks, BotConfig, BotParams
 from src.bots.webrtc.bot_error_pipeline import bot_error_pipeline_task
-from src.bots.webrtc.bot_pipeline import bot_pipeline, bot_pipeline_websocket,bot_pipeline_webrtc
+from src.bots.webrtc.bot_pipeline import TRANSPORTS, bot_pipeline
 from src.bots.webrtc.bot_pipeline_runner import BotPipelineRunner
-from pipecat.transports.network.webrtc_connection import SmallWebRTCConnection
+from src.bots.webrtc.pipeline_pool import pipeline_pool
+from src.bots.webrtc.prewarm import prewarm_session, release_components
+from pipecat.transports.network.webrtc_connection import IceServer, SmallWebRTCConnection
 from src.common.config import SERVICE_API_KEYS
 from pipecat.processors.frameworks.rtvi import (
     RTVIObserver,
@@ -28,6 +33,22 @@ from src.common.config import DEFAULT_BOT_CONFIG, SERVICE_API_KEYS
 
 MAX_SESSION_TIME = int(os.getenv("BOT_MAX_VOICE_SESSION_TIME", 15 * 60)) or 15 * 60
 
+WEBRTC_BOT_PARAMS = BotParams(
+    conversation_id="684fcc587556fc7d2f2a1e66",
+    actions=[],
+    bot_profile="vision",
+    attachments=[],
+)
+
+ice_servers = [
+    IceServer(
+        urls="stun:stun.l.google.com:19302",
+    )
+]
+
+# Keeps a reference to running bots so they are not garbage collected.
+_bot_tasks: Set[asyncio.Task] = set()
+
 
 async def _cleanup(room_url: str, config: BotConfig):
     async with aiohttp.ClientSession() as session:
@@ -49,26 +70,47 @@ async def _cleanup(room_url: str, config: BotConfig):
             logger.error(f"Bot failed to delete room: {e}")
 
 
+def _session_id(transport: str, connection: Any) -> str:
+    pc_id = getattr(connection, "pc_id", None)
+    if pc_id:
+        return pc_id
+    if transport == "daily":
+        return connection[0]
+    return f"{transport}-{uuid4().hex[:8]}"
+
+
 async def _pipeline_task(
+    transport: str,
     params: BotParams,
     config: BotConfig,
-    room_url: str,
-    room_token: str,
-    websocket: WebSocket,
-    pipecat_connection: SmallWebRTCConnection,
-    # db: AsyncSession,
+    connection: Any,
+    prewarm: Optional[asyncio.Task] = None,
+    started_at: Optional[float] = None,
 ) -> Callable[[BotCallbacks], Awaitable[PipelineTask]]:
     async def create_task(callbacks: BotCallbacks) -> PipelineTask:
-        pipeline, rtvi = await bot_pipeline(params, config, callbacks, room_url, room_token, websocket, pipecat_connection)
+        if prewarm:
+            components = await prewarm
+        else:
+            components = await pipeline_pool.acquire(transport, params.bot_profile, config)
+        try:
+            pipeline, rtvi = await bot_pipeline(
+                transport, params, config, callbacks, connection, components, started_at
+            )
+        except Exception:
+            if components:
+                await release_components(components)
+            raise
 
         task = PipelineTask(
             pipeline,
             params=PipelineParams(
-                allow_interruptions=False,
+                allow_interruptions=TRANSPORTS[transport].allow_interruptions,
                 enable_metrics=True,
                 send_initial_empty_metrics=False,
             ),
-            observers=[RTVIObserver(rtvi)]
+            # Idle sessions are ended by BotPipelineRunner.
+            idle_timeout_secs=None,
+            observers=[RTVIObserver(rtvi), TurnTracer(_session_id(transport, connection))],
         )
 
         return task
@@ -81,20 +123,22 @@ async def _bot_main(
     config: BotConfig,
     room_url: str,
     room_token: str,
-    websocket: WebSocket,
+    handle_sigint: bool = True,
 ):
     # subprocess_session_factory = DatabaseSessionFactory()
     # async with subprocess_session_factory() as db:
-        bot_runner = BotPipelineRunner()
+        # Only a process of its own may let the runner take over SIGINT and
+        # SIGTERM, in a worker that would undo the supervisor's handling.
+        bot_runner = BotPipelineRunner(max_session_time=MAX_SESSION_TIME)
         try:
-            task_creator = await _pipeline_task(params, config, room_url, room_token, websocket)
-            await bot_runner.start(task_creator)
+            task_creator = await _pipeline_task("daily", params, config, (room_url, room_token))
+            await bot_runner.start(task_creator, handle_sigint)
         except Exception as e:
             logger.error(f"Error running bot: {e}")
             task_creator = await bot_error_pipeline_task(
                 room_url, room_token, f"Error running bot: {e}"
             )
-            await bot_runner.start(task_creator)
+            await bot_runner.start(task_creator, handle_sigint)
 
         await _cleanup(room_url, config)
 
@@ -107,13 +151,12 @@ def _bot_process(
     config: BotConfig,
     room_url: str,
     room_token: str,
-    websocket: WebSocket,
 ):
     # This is a different process so we need to make sure we have the right log level.
     logger.remove()
     logger.add(sys.stderr, level=os.getenv("BOT_LOG_LEVEL", "INFO"))
 
-    asyncio.run(_bot_main(params, config, room_url, room_token, websocket))
+    asyncio.run(_bot_main(params, config, room_url, room_token))
 
 
 async def bot_create(daily_api_key: str):
@@ -141,6 +184,14 @@ async def bot_launch(
     room_url: str,
     room_token: str,
 ):
+    from src.bots.webrtc.workers import worker_supervisor
+
+    # With worker processes the session joins the least-loaded worker,
+    # otherwise it gets a process of its own.
+    if worker_supervisor.enabled:
+        await worker_supervisor.launch(params, config, room_url, room_token)
+        return
+
     process = Process(target=_bot_process, args=(params, config, room_url, room_token))
     process.start()
 
@@ -149,82 +200,100 @@ async def bot_launch_websocket(
     config: BotConfig,
     websocket: WebSocket,
 ):
-    # process = Process(target=_bot_process, args=(params, config, None, None, websocket))
-    # process.start()
-    bot_runner = BotPipelineRunner()
+    bot_runner = BotPipelineRunner(max_session_time=MAX_SESSION_TIME)
     try:
-        task_creator = await _pipeline_task_websocket(params, config, websocket)
-        await bot_runner.start(task_creator)
+        task_creator = await _pipeline_task("websocket", params, config, websocket)
+        # The server's SIGTERM handler drains sessions, the runner must not replace it.
+        await bot_runner.start(task_creator, handle_sigint=False)
     except Exception as e:
         logger.error(f"Error running bot: {e}")
-        task_creator = await bot_error_pipeline_task(
-            room_url, room_token, f"Error running bot: {e}"
-        )
-        await bot_runner.start(task_creator)
-
-        await _cleanup(room_url, config)
-        logger.info("Bot has finished. Bye!")
+    logger.info("Bot has finished. Bye!")
 
 
-async def _pipeline_task_webrtc(
-    params: BotParams,
-    config: BotConfig,
-    pipecat_connection: SmallWebRTCConnection,
-) -> Callable[[BotCallbacks], Awaitable[PipelineTask]]:
-    async def create_task(callbacks: BotCallbacks) -> PipelineTask:
-        pipeline, rtvi = await bot_pipeline_webrtc(params, config, callbacks, pipecat_connection)
+def bot_prewarm_webrtc() -> asyncio.Task:
+    """Start preparing a WebRTC session, to be passed to ``bot_launch_webrtc``."""
+    return asyncio.create_task(prewarm_session("webrtc", WEBRTC_BOT_PARAMS, DEFAULT_BOT_CONFIG))
 
-        task = PipelineTask(
-            pipeline,
-            params=PipelineParams(
-                allow_interruptions=True,
-                enable_metrics=True,
-                send_initial_empty_metrics=False,
-            ),
-            observers=[RTVIObserver(rtvi)]
-        )
 
-        return task
+async def bot_discard_prewarm(prewarm: asyncio.Task):
+    """Release a prepared session whose connection never came up."""
+    try:
+        components = await prewarm
+        await release_components(components)
+    except Exception as e:
+        logger.debug(f"Discarded session prewarm: {e}")
 
-    return create_task
 
 async def bot_launch_webrtc(
     pipecat_connection: SmallWebRTCConnection,
+    prewarm: Optional[asyncio.Task] = None,
+    started_at: Optional[float] = None,
 ):
-    bot_runner = BotPipelineRunner()
-    params = BotParams(
-        conversation_id="684fcc587556fc7d2f2a1e66",
-        actions=[],
-        bot_profile="vision",
-        attachments=[],
-    )
+    bot_runner = BotPipelineRunner(max_session_time=MAX_SESSION_TIME)
+    params = WEBRTC_BOT_PARAMS
     config = DEFAULT_BOT_CONFIG
     try:
-        task_creator = await _pipeline_task_webrtc(params, config, pipecat_connection)
-        await bot_runner.start(task_creator)
+        task_creator = await _pipeline_task(
+            "webrtc", params, config, pipecat_connection, prewarm, started_at
+        )
+        # The server's SIGTERM handler drains sessions, the runner must not replace it.
+        await bot_runner.start(task_creator, handle_sigint=False)
     except Exception as e:
         logger.error(f"Error running bot: {e}")
-        logger.info("Bot has finished. Bye!")
-
-
-async def _pipeline_task_websocket(
-    params: BotParams,
-    config: BotConfig,
-    websocket: WebSocket,
-) -> Callable[[BotCallbacks], Awaitable[PipelineTask]]:
-    async def create_task(callbacks: BotCallbacks) -> PipelineTask:
-        pipeline, rtvi = await bot_pipeline_websocket(params, config, callbacks, websocket)
-
-        task = PipelineTask(
-            pipeline,
-            params=PipelineParams(
-                allow_interruptions=False,
-                enable_metrics=True,
-                send_initial_empty_metrics=False,
-            ),
-            observers=[RTVIObserver(rtvi)]
+    logger.info("Bot has finished. Bye!")
+
+
+async def bot_offer_webrtc(
+    request: dict,
+    pcs_map: Dict[str, SmallWebRTCConnection],
+    on_closed: Optional[Callable[[str], None]] = None,
+) -> dict:
+    """Handle a WebRTC offer: renegotiate a known peer connection or start a new bot.
+
+    Args:
+        request: The offer (``sdp``, ``type`` and optionally ``pc_id`` and ``restart_pc``).
+        pcs_map: Peer connections owned by this process, keyed by ``pc_id``.
+        on_closed: Called with the ``pc_id`` once a peer connection is closed.
+
+    Returns:
+        dict: The SDP answer, including its ``pc_id``.
+    """
+    pc_id = request.get("pc_id")
+
+    if pc_id and pc_id in pcs_map:
+        pipecat_connection = pcs_map[pc_id]
+        logger.info(f"Reusing existing connection for pc_id: {pc_id}")
+        await pipecat_connection.renegotiate(
+            sdp=request["sdp"], type=request["type"], restart_pc=request.get("restart_pc", False)
         )
+    else:
+        started_at = time.monotonic()
+        # Services, context and provider connections are prepared while the
+        # SDP/ICE negotiation is going on.
+        prewarm = bot_prewarm_webrtc()
 
-        return task
-
-    return create_task
+        pipecat_connection = SmallWebRTCConnection(ice_servers)
+        try:
+            await pipecat_connection.initialize(sdp=request["sdp"], type=request["type"])
+        except Exception:
+            asyncio.create_task(bot_discard_prewarm(prewarm))
+            raise
+
+        @pipecat_connection.event_handler("closed")
+        async def handle_disconnected(webrtc_connection: SmallWebRTCConnection):
+            logger.info(f"Discarding peer connection for pc_id: {webrtc_connection.pc_id}")
+            pcs_map.pop(webrtc_connection.pc_id, None)
+            if on_closed:
+                on_closed(webrtc_connection.pc_id)
+
+        # Start the bot right away instead of after the answer is sent, so the
+        # pipeline (and its provider connections) starts while ICE completes.
+        bot_task = asyncio.create_task(bot_launch_webrtc(pipecat_connection, prewarm, started_at))
+        _bot_tasks.add(bot_task)
+        bot_task.add_done_callback(_bot_tasks.discard)
+
+    answer = pipecat_connection.get_answer()
+    # Updating the peer connection inside the map
+    pcs_map[answer["pc_id"]] = pipecat_connection
+
+    return answer
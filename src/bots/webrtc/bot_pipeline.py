@@ -1,51 +1,51 @@
-from typing import Any
 import os
-from src.bots.persistent_context import PersistentContext
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.bots.fake_services import FAKE_SERVICES, create_fake_services
+from src.bots.greetings import GreetingResponder, greeting_cache
 from src.bots.rtvi import create_rtvi_processor
+from src.bots.speculative import SPECULATIVE_LLM, SpeculativeLLM
+from src.bots.summarize import llm_message, messages_after_summary, summary_message
+from src.bots.tts_cache import CachedCartesiaTTSService, tts_cache
 from src.bots.types import BotCallbacks, BotConfig, BotParams
-from src.common.config import SERVICE_API_KEYS
-from src.common.models import Conversation, Message
+from src.bots.vad import SharedSileroVADAnalyzer
+from src.bots.webrtc.frame_serializer import BotFrameSerializer
+from src.bots.webrtc.websocket_transport import BufferedWebsocketTransport
+from src.common.metrics import metrics
+from src.common.models import Conversation
 from loguru import logger
-from openai._types import NOT_GIVEN
 from deepgram import LiveOptions
-# from sqlalchemy.ext.asyncio import AsyncSession
-from pipecat.transports.base_transport import TransportParams
+from pipecat.transports.base_transport import BaseTransport, TransportParams
 from pipecat.transports.network.small_webrtc import SmallWebRTCTransport
 from pipecat.transports.network.webrtc_connection import SmallWebRTCConnection
 
-from pipecat.audio.vad.silero import SileroVADAnalyzer
-from pipecat.audio.vad.vad_analyzer import VADParams
+from pipecat.audio.vad.vad_analyzer import VADAnalyzer, VADParams
+from pipecat.frames.frames import Frame, TTSAudioRawFrame
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.services.deepseek.llm import DeepSeekLLMService
 from pipecat.services.deepgram.stt import DeepgramSTTService
 from pipecat.services.cartesia.tts import CartesiaTTSService
-from pipecat.processors.frameworks.rtvi import (
-    # RTVIConfig,
-    RTVIActionRun,
-    RTVIMessage,
-    # RTVIProcessor,
-    # RTVIObserver,
+from pipecat.processors.aggregators.llm_response import (
+    LLMAssistantContextAggregator,
+    LLMUserContextAggregator,
 )
-from pipecat.processors.frame_processor import FrameDirection
-# from pipecat.processors.frameworks.rtvi import (
-#     # RTVIBotLLMProcessor,
-#     RTVIBotTranscriptionProcessor,
-#     RTVIBotTTSProcessor,
-#     RTVISpeakingProcessor,
-#     RTVIUserTranscriptionProcessor,
-# )
+from pipecat.processors.frameworks.rtvi import RTVIProcessor
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
 from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContext
-from pipecat.serializers.protobuf import ProtobufFrameSerializer
-from src.bots.webrtc.frame_serializer import BotFrameSerializer
-from pipecat.services.gemini_multimodal_live.gemini import (
-    GeminiMultimodalLiveLLMService,
-)
-# from pipecat.transports.services.daily import DailyParams, DailyTransport
-from pipecat.transports.network.fastapi_websocket import (
-    FastAPIWebsocketParams,
-    FastAPIWebsocketTransport,
-)
-from fastapi import WebSocket
+from pipecat.transports.services.daily import DailyParams, DailyTransport
+from pipecat.transports.network.fastapi_websocket import FastAPIWebsocketParams
+
+GREETING_PROMPT = "Start by greeting the user warmly and introducing yourself."
+
+DEFAULT_TTS_VOICE_ID = "71a7ad14-091c-4e8e-a314-022ece01c121"  # British Reading Lady
+DEFAULT_TTS_LANGUAGE = "en"
+
+# (voice_id, language) combinations whose greetings are rendered ahead of time.
+GREETING_VOICES = [(DEFAULT_TTS_VOICE_ID, DEFAULT_TTS_LANGUAGE)]
+
+DEFAULT_PROFILE = "voice"
+
 
 def flatten_content(content_list):
     # 如果是 [{"type": "text", "text": "你好"}] => "你好"
@@ -53,31 +53,99 @@ def flatten_content(content_list):
         return ''.join([item.get("text", "") for item in content_list])
     return content_list  # already a string
 
-async def bot_pipeline(
-    params: BotParams,
-    config: BotConfig,
-    callbacks: BotCallbacks,
-    room_url: str,
-    room_token: str,
-    websocket: WebSocket,
-    pipecat_connection: SmallWebRTCConnection,
-) -> Pipeline:
-    # transport = DailyTransport(
-    #     room_url,
-    #     room_token,
-    #     "Gemini Bot",
-    #     DailyParams(
-    #         audio_in_sample_rate=16000,
-    #         audio_out_enabled=True,
-    #         audio_out_sample_rate=24000,
-    #         transcription_enabled=False,
-    #         vad_enabled=True,
-    #         vad_analyzer=SileroVADAnalyzer(params=VADParams(stop_secs=0.5)),
-    #         vad_audio_passthrough=True,
-    #     ),
-    # )
-
-    transport = FastAPIWebsocketTransport(
+
+class PipelineComponents:
+    """Everything a voice pipeline needs except the transport.
+
+    These can be created ahead of time (see ``pipeline_pool``) because none of
+    them open provider connections until the pipeline is started.
+    """
+
+    def __init__(
+        self,
+        *,
+        transport: str,
+        profile: str,
+        vad_analyzer: VADAnalyzer,
+        stt: DeepgramSTTService,
+        llm: DeepSeekLLMService,
+        tts: CartesiaTTSService,
+        context: OpenAILLMContext,
+        user_aggregator: LLMUserContextAggregator,
+        assistant_aggregator: LLMAssistantContextAggregator,
+        rtvi: RTVIProcessor,
+        speculative: Optional[SpeculativeLLM] = None,
+    ):
+        self.transport = transport
+        self.profile = profile
+        self.vad_analyzer = vad_analyzer
+        self.stt = stt
+        self.llm = llm
+        self.tts = tts
+        self.context = context
+        self.user_aggregator = user_aggregator
+        self.assistant_aggregator = assistant_aggregator
+        self.rtvi = rtvi
+        self.speculative = speculative
+        self.created_at = time.monotonic()
+        # Set when the components were taken from the warm pool.
+        self.warm = False
+        # Set once the profile's initial messages are in the context.
+        self.context_ready = False
+
+
+class FirstAudioLatencyProcessor(FrameProcessor):
+    """Records the time from session start to the first bot audio frame."""
+
+    def __init__(self, started_at: float, metric: str):
+        super().__init__()
+        self._started_at = started_at
+        self._metric = metric
+        self._reported = False
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if not self._reported and isinstance(frame, TTSAudioRawFrame):
+            self._reported = True
+            latency = time.monotonic() - self._started_at
+            metrics.observe(self._metric, latency)
+            logger.info(f"Connect to first audio: {latency:.3f}s")
+
+        await self.push_frame(frame, direction)
+
+
+#
+# Transports
+#
+
+
+class TransportSpec:
+    def __init__(
+        self,
+        *,
+        create: Callable[[Any, VADAnalyzer], BaseTransport],
+        vad_params: VADParams,
+        allow_interruptions: bool,
+    ):
+        self.create = create
+        self.vad_params = vad_params
+        self.allow_interruptions = allow_interruptions
+
+
+def _create_webrtc_transport(connection: SmallWebRTCConnection, vad_analyzer: VADAnalyzer):
+    return SmallWebRTCTransport(
+        webrtc_connection=connection,
+        params=TransportParams(
+            audio_in_enabled=True,
+            audio_out_enabled=True,
+            vad_analyzer=vad_analyzer,
+        ),
+    )
+
+
+def _create_websocket_transport(websocket, vad_analyzer: VADAnalyzer):
+    return BufferedWebsocketTransport(
         websocket=websocket,
         params=FastAPIWebsocketParams(
             audio_in_sample_rate=16000,
@@ -85,360 +153,257 @@ async def bot_pipeline(
             audio_in_enabled=True,
             audio_out_enabled=True,
             add_wav_header=False,
-            vad_analyzer=SileroVADAnalyzer(params=VADParams(stop_secs=0.5)),
-            serializer=ProtobufFrameSerializer(),
+            vad_analyzer=vad_analyzer,
+            # /api/bot/ws session protocol, see BotFrameSerializer.
+            serializer=BotFrameSerializer(length_prefixed=True),
         ),
     )
-    # transport_params = TransportParams(
-    #     audio_in_enabled=True,
-    #     audio_out_enabled=True,
-    #     audio_out_10ms_chunks=2,
-    #     video_in_enabled=True,
-    #     video_out_enabled=True,
-    #     video_out_is_live=True,
-    #     vad_analyzer=SileroVADAnalyzer(),
-    # )
-    # transport = SmallWebRTCTransport(
-    #     webrtc_connection=pipecat_connection, params=transport_params
-    # )
 
-    conversation = await Conversation.get(params.conversation_id)
-    if not conversation:
-        raise Exception(f"Conversation {params.conversation_id} not found")
-    # messages = [getattr(msg, "content") for msg in conversation.messages]
-    messages = [msg.content for msg in await Message.find(Message.conversation_id == params.conversation_id).to_list()]
-
-    #
-    # RTVI
-    #
-
-    # stt = DeepgramSTTService(
-    #     api_key=os.getenv("DEEPGRAM_API_KEY"),
-    #     live_options=LiveOptions(
-    #         vad_events=True,
-    #     ),
-    # )
-    llm_rt = DeepSeekLLMService(
-        api_key=os.getenv("DEEPSEEK_API_KEY"),
-            model="deepseek-chat",
+
+def _create_daily_transport(room: Tuple[str, str], vad_analyzer: VADAnalyzer):
+    room_url, room_token = room
+    return DailyTransport(
+        room_url,
+        room_token,
+        "Open Sesame",
+        DailyParams(
+            audio_in_sample_rate=16000,
+            audio_out_enabled=True,
+            audio_out_sample_rate=24000,
+            transcription_enabled=False,
+            vad_enabled=True,
+            vad_analyzer=vad_analyzer,
+            vad_audio_passthrough=True,
+        ),
     )
-    # tts = CartesiaTTSService(
-    #     api_key=os.getenv("CARTESIA_API_KEY"),
-    #         voice_id="71a7ad14-091c-4e8e-a314-022ece01c121",  # British Reading Lady
-    #         # language=Language.ZH,
-    # )
-    # llm_rt = GeminiMultimodalLiveLLMService(
-    #     api_key=str(SERVICE_API_KEYS["gemini"]),
-    #     voice_id="Aoede",  # Puck, Charon, Kore, Fenrir, Aoede
-    #     # system_instruction="Talk like a pirate."
-    #     transcribe_user_audio=True,
-    #     transcribe_model_audio=True,
-    #     inference_on_context_initialization=False,
-    # )
-
-    tools = NOT_GIVEN  # todo: implement tools in and set here
-    context_rt = OpenAILLMContext(messages, tools)
-    if isinstance(llm_rt, DeepSeekLLMService):
-        for msg in messages:
-            msg["content"] = flatten_content(msg["content"])
-        context_rt = OpenAILLMContext(messages)
-    else:
-        context_rt = OpenAILLMContext(messages, tools)
-    context_aggregator_rt = llm_rt.create_context_aggregator(context_rt)
-    user_aggregator = context_aggregator_rt.user()
-    assistant_aggregator = context_aggregator_rt.assistant()
-    # await llm_rt.set_context(context_rt)
-    # storage = PersistentContext(context=context_rt)
 
-    rtvi = await create_rtvi_processor(config, user_aggregator)
 
-    processors = [
-        transport.input(),
-        # stt,
-        user_aggregator,
-        rtvi,
-        llm_rt,
-        tts,
-        transport.output(),
-        assistant_aggregator,
-        # storage.create_processor(exit_on_endframe=True),
-    ]
+TRANSPORTS: Dict[str, TransportSpec] = {
+    "webrtc": TransportSpec(
+        create=_create_webrtc_transport, vad_params=VADParams(), allow_interruptions=True
+    ),
+    "websocket": TransportSpec(
+        create=_create_websocket_transport,
+        vad_params=VADParams(stop_secs=0.5),
+        allow_interruptions=False,
+    ),
+    "daily": TransportSpec(
+        create=_create_daily_transport,
+        vad_params=VADParams(stop_secs=0.5),
+        allow_interruptions=False,
+    ),
+}
+
+
+def _register_transport_events(transport_name: str, transport: BaseTransport, callbacks: BotCallbacks):
+    if transport_name == "daily":
+
+        @transport.event_handler("on_first_participant_joined")
+        async def on_first_participant_joined(transport, participant):
+            # Enable both camera and screenshare. From the client side
+            # send just one.
+            await transport.capture_participant_video(
+                participant["id"], framerate=1, video_source="camera"
+            )
+            await transport.capture_participant_video(
+                participant["id"], framerate=1, video_source="screenVideo"
+            )
+            await callbacks.on_first_participant_joined(participant)
+
+        @transport.event_handler("on_participant_joined")
+        async def on_participant_joined(transport, participant):
+            await callbacks.on_participant_joined(participant)
+
+        @transport.event_handler("on_participant_left")
+        async def on_participant_left(transport, participant, reason):
+            await callbacks.on_participant_left(participant, reason)
+
+        @transport.event_handler("on_call_state_updated")
+        async def on_call_state_updated(transport, state):
+            await callbacks.on_call_state_updated(state)
+
+        return
+
+    # Peer-to-peer transports only have a single client, so a client
+    # connecting/disconnecting is the participant joining/leaving.
+    @transport.event_handler("on_client_connected")
+    async def on_client_connected(transport, client):
+        participant = {"id": getattr(client, "pc_id", None)}
+        await callbacks.on_first_participant_joined(participant)
+        await callbacks.on_participant_joined(participant)
 
-    pipeline = Pipeline(processors)
+    @transport.event_handler("on_client_disconnected")
+    async def on_client_disconnected(transport, client):
+        await callbacks.on_participant_left({"id": getattr(client, "pc_id", None)}, "disconnected")
 
-    # @storage.on_context_message
-    # async def on_context_message(messages: list[Any]):
-    #     logger.debug(f"{len(messages)} message(s) received for storage")
-    #     try:
-    #         # await Message.create_messages(
-    #         #     db_session=db, conversation_id=params.conversation_id, messages=messages
-    #         # )
-    #         max_msg = await Message.find(Message.conversation_id == params.conversation_id).sort(-Message.message_number).first_or_none()
-    #         new_number = (max_msg.message_number if max_msg else 0) + 1
-
-    #         for msg in messages:
-    #             # msg 应该是 dict，且有 role 和 content 字段
-    #             message_doc = Message(
-    #                 conversation_id=params.conversation_id,
-    #                 content=msg,  # 这里 msg 是 dict
-    #                 message_number=new_number,
-    #                 language_code=language_code or "unknown",  # 补全为字符串
-    #             )
-    #             await message_doc.insert()
-    #             new_number += 1
-    #     except Exception as e:
-    #         logger.error(f"Error storing messages: {e}")
-    #         raise e
 
-    @rtvi.event_handler("on_client_ready")
-    async def on_client_ready(rtvi):
-        logger.info("Pipecat client ready.")
-        await rtvi.set_bot_ready()
-        # for message in params.actions:
-        #     await rtvi.handle_message(message)
-
-    @transport.event_handler("on_first_participant_joined")
-    async def on_first_participant_joined(transport, participant):
-        # Enable both camera and screenshare. From the client side
-        # send just one.
-        await transport.capture_participant_video(
-            participant["id"], framerate=1, video_source="camera"
-        )
-        await transport.capture_participant_video(
-            participant["id"], framerate=1, video_source="screenVideo"
-        )
-        await callbacks.on_first_participant_joined(participant)
+#
+# Profiles
+#
 
-    @transport.event_handler("on_participant_joined")
-    async def on_participant_joined(transport, participant):
-        await callbacks.on_participant_joined(participant)
 
-    @transport.event_handler("on_participant_left")
-    async def on_participant_left(transport, participant, reason):
-        await callbacks.on_participant_left(participant, reason)
+async def _greeting_messages(params: BotParams) -> List[dict]:
+    return [{"role": "user", "content": GREETING_PROMPT}]
 
-    @transport.event_handler("on_call_state_updated")
-    async def on_call_state_updated(transport, state):
-        await callbacks.on_call_state_updated(state)
 
-    return (pipeline , rtvi)
+async def _conversation_messages(params: BotParams) -> List[dict]:
+    conversation = await Conversation.get(params.conversation_id)
+    if not conversation:
+        raise Exception(f"Conversation {params.conversation_id} not found")
+    # The rolling summary (if any) stands in for the messages it covers.
+    summary = summary_message(conversation)
+    messages = [summary] if summary else []
+    user_id = str(params.user_id) if params.user_id else conversation.createdBy
+    for msg in await messages_after_summary(conversation).to_list():
+        # Chat app messages have an encrypted body, API ones an LLM message.
+        message = llm_message(msg.model_dump(by_alias=True), user_id)
+        if message:
+            messages.append(message)
+    return messages
 
-async def bot_pipeline_webrtc(
-    params: BotParams,
-    config: BotConfig,
-    callbacks: BotCallbacks,
-    pipecat_connection: SmallWebRTCConnection,
-) -> Pipeline:
-    transport_params = TransportParams(
-        audio_in_enabled=True,
-        audio_out_enabled=True,
-        vad_analyzer=SileroVADAnalyzer(),
-        # audio_in_enabled=True,
-        # audio_out_enabled=True,
-        # audio_out_10ms_chunks=2,
-        # video_in_enabled=True,
-        # video_out_enabled=True,
-        # video_out_is_live=True,
-        # vad_analyzer=SileroVADAnalyzer(),
-    )
-    transport = SmallWebRTCTransport(
-        webrtc_connection=pipecat_connection, params=transport_params
-    )
 
-    stt = DeepgramSTTService(
-        api_key=os.getenv("DEEPGRAM_API_KEY"),
-        live_options=LiveOptions(
-            vad_events=True,
-        ),
-    )
-    llm_rt = DeepSeekLLMService(
-        api_key=os.getenv("DEEPSEEK_API_KEY"),
-            model="deepseek-chat",
-    )
-    tts = CartesiaTTSService(
-        api_key=os.getenv("CARTESIA_API_KEY"),
-            voice_id="71a7ad14-091c-4e8e-a314-022ece01c121",  # British Reading Lady
-            # language=Language.ZH,
-    )
+# A profile decides what the LLM context looks like when a session starts.
+PROFILES: Dict[str, Callable[[BotParams], Awaitable[List[dict]]]] = {
+    "voice": _greeting_messages,
+    "conversation": _conversation_messages,
+}
 
-    context_rt = OpenAILLMContext(
-        [
-            {
-                "role": "user",
-                "content": "Start by greeting the user warmly and introducing yourself.",
-            }
-        ],
-    )
 
-    context_aggregator_rt = llm_rt.create_context_aggregator(context_rt)
-    user_aggregator = context_aggregator_rt.user()
-    assistant_aggregator = context_aggregator_rt.assistant()
+def resolve_profile(profile: Optional[str]) -> str:
+    return profile if profile in PROFILES else DEFAULT_PROFILE
 
-    rtvi = await create_rtvi_processor(config, user_aggregator)
 
-    processors = [
-        transport.input(),
-        rtvi,
-        stt,
-        user_aggregator,
-        llm_rt,
-        tts,
-        transport.output(),
-        assistant_aggregator,
-        # storage.create_processor(exit_on_endframe=True),
-    ]
+async def load_context(components: PipelineComponents, params: BotParams):
+    """Fill the context with the profile's initial messages."""
+    components.context.set_messages(await PROFILES[components.profile](params))
+    components.context_ready = True
 
-    pipeline = Pipeline(processors)
 
-    # @rtvi.event_handler("on_bot_started")
-    # async def on_bot_started(rtvi):
-    #     for action in params.actions:
-    #         logger.debug(f"Processing action: {action}")
-    #         await rtvi.handle_message(action)
-    #     action = RTVIActionRun(service="system", action="end")
-    #     message = RTVIMessage(type="action", id="END", data=action.model_dump())
-    #     await rtvi.handle_message(message)
+async def create_pipeline_components(
+    transport: str, profile: str, config: BotConfig
+) -> PipelineComponents:
+    spec = TRANSPORTS[transport]
 
-    @rtvi.event_handler("on_client_ready")
-    async def on_client_ready(rtvi):
-        logger.info("Pipecat client ready.")
-        await rtvi.set_bot_ready()
-        # await rtvi.queue_frames([context_aggregator_rt.user().get_context_frame()])
-        # for message in params.actions:
-        #     await rtvi.handle_message(message)
-
-    @transport.event_handler("on_first_participant_joined")
-    async def on_first_participant_joined(transport, participant):
-        # Enable both camera and screenshare. From the client side
-        # send just one.
-        await transport.capture_participant_video(
-            participant["id"], framerate=1, video_source="camera"
+    if FAKE_SERVICES:
+        stt, llm, tts = create_fake_services()
+    else:
+        stt = DeepgramSTTService(
+            api_key=os.getenv("DEEPGRAM_API_KEY"),
+            live_options=LiveOptions(
+                vad_events=True,
+            ),
         )
-        await transport.capture_participant_video(
-            participant["id"], framerate=1, video_source="screenVideo"
+        llm = DeepSeekLLMService(
+            api_key=os.getenv("DEEPSEEK_API_KEY"),
+            model="deepseek-chat",
+        )
+        tts = CachedCartesiaTTSService(
+            cache=tts_cache,
+            api_key=os.getenv("CARTESIA_API_KEY"),
+            voice_id=DEFAULT_TTS_VOICE_ID,
+            # language=Language.ZH,
         )
-        await callbacks.on_first_participant_joined(participant)
-
-    @transport.event_handler("on_participant_joined")
-    async def on_participant_joined(transport, participant):
-        await callbacks.on_participant_joined(participant)
 
-    @transport.event_handler("on_participant_left")
-    async def on_participant_left(transport, participant, reason):
-        await callbacks.on_participant_left(participant, reason)
+    # Messages are filled in by the profile when the session is bound.
+    context = OpenAILLMContext([])
+    context_aggregator = llm.create_context_aggregator(context)
+    user_aggregator = context_aggregator.user()
+    assistant_aggregator = context_aggregator.assistant()
 
-    @transport.event_handler("on_call_state_updated")
-    async def on_call_state_updated(transport, state):
-        await callbacks.on_call_state_updated(state)
+    rtvi = await create_rtvi_processor(config, user_aggregator)
 
-    return (pipeline , rtvi)
+    return PipelineComponents(
+        transport=transport,
+        profile=profile,
+        vad_analyzer=SharedSileroVADAnalyzer(params=spec.vad_params),
+        stt=stt,
+        llm=llm,
+        tts=tts,
+        context=context,
+        user_aggregator=user_aggregator,
+        assistant_aggregator=assistant_aggregator,
+        rtvi=rtvi,
+        speculative=SpeculativeLLM(llm, context) if SPECULATIVE_LLM else None,
+    )
 
 
-async def bot_pipeline_websocket(
+async def bot_pipeline(
+    transport_name: str,
     params: BotParams,
     config: BotConfig,
     callbacks: BotCallbacks,
-    websocket: WebSocket,
-) -> Pipeline:
-    transport = FastAPIWebsocketTransport(
-        websocket=websocket,
-        params=FastAPIWebsocketParams(
-            audio_in_sample_rate=16000,
-            audio_out_sample_rate=24000,
-            audio_in_enabled=True,
-            audio_out_enabled=True,
-            add_wav_header=False,
-            vad_analyzer=SileroVADAnalyzer(params=VADParams(stop_secs=0.5)),
-            # serializer=BotFrameSerializer(),
-        ),
-    )
+    connection: Any,
+    components: Optional[PipelineComponents] = None,
+    started_at: Optional[float] = None,
+) -> Tuple[Pipeline, RTVIProcessor]:
+    """Bind a transport to a set of pipeline components.
+
+    Args:
+        transport_name: One of ``TRANSPORTS`` ("webrtc", "websocket" or "daily").
+        params: Bot parameters of the session.
+        config: RTVI bot configuration.
+        callbacks: Participant callbacks of the pipeline runner.
+        connection: The transport connection: a ``SmallWebRTCConnection``, a
+            FastAPI ``WebSocket`` or a ``(room_url, room_token)`` tuple.
+        components: Pre-built components (e.g. from the warm pool). They are
+            created on the spot if not given.
+        started_at: When the session was requested (``time.monotonic()``),
+            used for the first audio latency. Defaults to now.
+
+    Returns:
+        Tuple[Pipeline, RTVIProcessor]: The pipeline and its RTVI processor.
+    """
+    started_at = started_at or time.monotonic()
+
+    if components is None:
+        components = await create_pipeline_components(
+            transport_name, resolve_profile(params.bot_profile), config
+        )
 
+    if not components.context_ready:
+        await load_context(components, params)
 
-    stt = DeepgramSTTService(
-        api_key=os.getenv("DEEPGRAM_API_KEY"),
-        live_options=LiveOptions(
-            vad_events=True,
-        ),
-    )
-    llm_rt = DeepSeekLLMService(
-        api_key=os.getenv("DEEPSEEK_API_KEY"),
-            model="deepseek-chat",
-    )
-    tts = CartesiaTTSService(
-        api_key=os.getenv("CARTESIA_API_KEY"),
-            voice_id="71a7ad14-091c-4e8e-a314-022ece01c121",  # British Reading Lady
-            # language=Language.ZH,
-    )
+    transport = TRANSPORTS[transport_name].create(connection, components.vad_analyzer)
+    rtvi = components.rtvi
 
-    context_rt = OpenAILLMContext(
-        [
-            {
-                "role": "user",
-                "content": "Start by greeting the user warmly and introducing yourself.",
-            }
-        ],
+    speculative = components.speculative
+    # Sessions that open with the greeting prompt get a pre-rendered greeting.
+    greeting = (
+        GreetingResponder(
+            greeting_cache,
+            GREETING_PROMPT,
+            components.tts._voice_id,
+            components.tts._settings["language"] or DEFAULT_TTS_LANGUAGE,
+        )
+        if components.profile == "voice"
+        else None
     )
-
-    context_aggregator_rt = llm_rt.create_context_aggregator(context_rt)
-    user_aggregator = context_aggregator_rt.user()
-    assistant_aggregator = context_aggregator_rt.assistant()
-
-    rtvi = await create_rtvi_processor(config, user_aggregator)
-
     processors = [
         transport.input(),
         rtvi,
-        stt,
-        user_aggregator,
-        llm_rt,
-        tts,
+        components.stt,
+        *([speculative.listener()] if speculative else []),
+        components.user_aggregator,
+        *([speculative.gate()] if speculative else []),
+        *([greeting.gate()] if greeting else []),
+        components.llm,
+        components.tts,
+        *([greeting.player()] if greeting else []),
+        FirstAudioLatencyProcessor(
+            started_at,
+            f"bot.pipeline.connect_to_first_audio.{'warm' if components.warm else 'cold'}",
+        ),
         transport.output(),
-        assistant_aggregator,
-        # storage.create_processor(exit_on_endframe=True),
+        components.assistant_aggregator,
     ]
 
     pipeline = Pipeline(processors)
 
-    # @rtvi.event_handler("on_bot_started")
-    # async def on_bot_started(rtvi):
-    #     for action in params.actions:
-    #         logger.debug(f"Processing action: {action}")
-    #         await rtvi.handle_message(action)
-    #     action = RTVIActionRun(service="system", action="end")
-    #     message = RTVIMessage(type="action", id="END", data=action.model_dump())
-    #     await rtvi.handle_message(message)
-
     @rtvi.event_handler("on_client_ready")
     async def on_client_ready(rtvi):
         logger.info("Pipecat client ready.")
         await rtvi.set_bot_ready()
-        # await rtvi.queue_frames([context_aggregator_rt.user().get_context_frame()])
-        # for message in params.actions:
-        #     await rtvi.handle_message(message)
-
-    @transport.event_handler("on_first_participant_joined")
-    async def on_first_participant_joined(transport, participant):
-        # Enable both camera and screenshare. From the client side
-        # send just one.
-        await transport.capture_participant_video(
-            participant["id"], framerate=1, video_source="camera"
-        )
-        await transport.capture_participant_video(
-            participant["id"], framerate=1, video_source="screenVideo"
-        )
-        await callbacks.on_first_participant_joined(participant)
-
-    @transport.event_handler("on_participant_joined")
-    async def on_participant_joined(transport, participant):
-        await callbacks.on_participant_joined(participant)
-
-    @transport.event_handler("on_participant_left")
-    async def on_participant_left(transport, participant, reason):
-        await callbacks.on_participant_left(participant, reason)
-
-    @transport.event_handler("on_call_state_updated")
-    async def on_call_state_updated(transport, state):
-        await callbacks.on_call_state_updated(state)
 
-    return (pipeline , rtvi)
+    _register_transport_events(transport_name, transport, callbacks)
 
+    return (pipeline, rtvi)
@@ -1,22 +1,48 @@
-import asyncio
 import os
+import time
 
-from typing import Awaitable, Callable
+from typing import Awaitable, Callable, Optional
 
-from pipecat.frames.frames import EndFrame, StartInterruptionFrame
+from pipecat.frames.frames import (
+    BotSpeakingFrame,
+    EndFrame,
+    LLMFullResponseEndFrame,
+    StartInterruptionFrame,
+    UserStartedSpeakingFrame,
+)
 from pipecat.pipeline.task import PipelineTask
 from pipecat.pipeline.runner import PipelineRunner
 
 from src.bots.types import BotCallbacks
+from src.common.metrics import metrics
+from src.common.timer_wheel import Timer, timer_wheel
 
 from loguru import logger
 
 
 DEFAULT_MAX_PARTICIPANT_JOIN_SECONDS = 20
+DEFAULT_IDLE_TIMEOUT_SECONDS = 5 * 60
+
+# A session is idle while none of these reach the end of the pipeline.
+ACTIVITY_FRAMES = (BotSpeakingFrame, LLMFullResponseEndFrame, UserStartedSpeakingFrame)
 
 
 class BotPipelineRunner:
-    def __init__(self):
+    """Runs a bot pipeline task and ends it when the session is over.
+
+    Besides the participant callbacks, the session ends when no participant
+    joins in time, after ``max_session_time`` seconds and after
+    ``idle_timeout`` seconds without activity. All three are timers on the
+    shared ``timer_wheel`` (the task's own idle monitor should be disabled
+    with ``idle_timeout_secs=None``).
+    """
+
+    def __init__(
+        self,
+        *,
+        max_session_time: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+    ):
         self._participant_joined = False
         self._callbacks = BotCallbacks(
             on_first_participant_joined=self._on_first_participant_joined,
@@ -25,27 +51,51 @@ class BotPipelineRunner:
             on_call_state_updated=self._on_call_state_updated,
         )
         self._task = None
+        self._max_session_time = max_session_time
+        self._idle_timeout = (
+            idle_timeout
+            if idle_timeout is not None
+            else float(os.getenv("BOT_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT_SECONDS))
+        )
+        self._last_activity = 0.0
+        self._join_timer: Optional[Timer] = None
+        self._session_timer: Optional[Timer] = None
+        self._idle_timer: Optional[Timer] = None
 
     async def start(
         self, create_task: Callable[[BotCallbacks], Awaitable[PipelineTask]], handle_sigint=True
     ):
-        self._task = await create_task(self._callbacks)
+        """Create the task and run it until the session is over.
 
-        runner = PipelineRunner(handle_sigint=handle_sigint)
+        ``handle_sigint`` lets pipecat's runner install SIGINT and SIGTERM
+        handlers that cancel this task. Only for a process running a single
+        session: in the server they would replace its drain on SIGTERM.
+        """
+        self._task = await create_task(self._callbacks)
 
-        pipeline_task = asyncio.create_task(runner.run(self._task))
-        timeout_task = asyncio.create_task(self._participant_join_timeout())
+        self._last_activity = time.monotonic()
+        self._task.set_reached_downstream_filter(ACTIVITY_FRAMES)
 
-        await asyncio.wait({pipeline_task, timeout_task}, return_when=asyncio.FIRST_COMPLETED)
+        @self._task.event_handler("on_frame_reached_downstream")
+        async def on_frame_reached_downstream(task, frame):
+            self._last_activity = time.monotonic()
 
-        # If the timeout task is done, wait for the pipeline to finish.
-        if timeout_task.done():
-            await pipeline_task
+        seconds = int(os.getenv("MAX_PARTICIPANT_JOIN_SECONDS", DEFAULT_MAX_PARTICIPANT_JOIN_SECONDS))
+        self._join_timer = timer_wheel.call_later(seconds, self._on_join_timeout)
+        if self._max_session_time:
+            self._session_timer = timer_wheel.call_later(
+                self._max_session_time, self._on_session_timeout
+            )
+        if self._idle_timeout:
+            self._idle_timer = timer_wheel.call_later(self._idle_timeout, self._on_idle_check)
 
-        # If the pipeline task is finished, cancel the timeout task.
-        if pipeline_task.done():
-            timeout_task.cancel()
-            await timeout_task
+        runner = PipelineRunner(handle_sigint=handle_sigint)
+        try:
+            await runner.run(self._task)
+        finally:
+            for timer in (self._join_timer, self._session_timer, self._idle_timer):
+                if timer:
+                    timer.cancel()
 
     #
     # Daily callbacks
@@ -53,6 +103,8 @@ class BotPipelineRunner:
 
     async def _on_first_participant_joined(self, participant):
         self._participant_joined = True
+        if self._join_timer:
+            self._join_timer.cancel()
 
     async def _on_participant_joined(self, participant):
         logger.info("Participant joined.")
@@ -69,18 +121,27 @@ class BotPipelineRunner:
                 await self._task.queue_frame(EndFrame())
 
     #
-    # Timeout task
+    # Timeouts
     #
 
-    async def _participant_join_timeout(self):
-        try:
-            seconds = int(
-                os.getenv("MAX_PARTICIPANT_JOIN_SECONDS", DEFAULT_MAX_PARTICIPANT_JOIN_SECONDS)
-            )
-            await asyncio.sleep(seconds)
-            if not self._participant_joined:
-                logger.warning("No participant has joined. Exiting.")
-                if self._task:
-                    await self._task.queue_frames([StartInterruptionFrame(), EndFrame()])
-        except asyncio.CancelledError:
-            pass
+    async def _on_join_timeout(self):
+        if not self._participant_joined:
+            logger.warning("No participant has joined. Exiting.")
+            metrics.increment("bot.session.timeout.join")
+            await self._task.queue_frames([StartInterruptionFrame(), EndFrame()])
+
+    async def _on_session_timeout(self):
+        logger.warning(f"Session reached its maximum duration ({self._max_session_time:.0f}s). Exiting.")
+        metrics.increment("bot.session.timeout.max_duration")
+        await self._task.queue_frames([StartInterruptionFrame(), EndFrame()])
+
+    async def _on_idle_check(self):
+        # Activity only moves _last_activity, the timer is re-armed for
+        # whatever is left when it fires.
+        remaining = self._last_activity + self._idle_timeout - time.monotonic()
+        if remaining > 0:
+            self._idle_timer = timer_wheel.call_later(remaining, self._on_idle_check)
+            return
+        logger.warning("Idle pipeline detected, cancelling pipeline task...")
+        metrics.increment("bot.session.timeout.idle")
+        await self._task.cancel()
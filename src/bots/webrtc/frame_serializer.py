@@ -1,11 +1,23 @@
 import base64
 import json
+from typing import Iterator
 
 from loguru import logger
-from pipecat.frames.frames import Frame, TransportMessageUrgentFrame
+from pipecat.frames.frames import Frame, InputAudioRawFrame, OutputAudioRawFrame, TransportMessageUrgentFrame
 from pipecat.serializers.protobuf import ProtobufFrameSerializer
 from pipecat.serializers.base_serializer import FrameSerializer, FrameSerializerType
 
+# Wire format of pipecat's frames.proto, for the audio fast path:
+#   Frame { AudioRawFrame audio = 2; }
+#   AudioRawFrame { uint64 id = 1; string name = 2; bytes audio = 3;
+#                   uint32 sample_rate = 4; uint32 num_channels = 5; optional uint64 pts = 6; }
+#   Frame { MessageFrame message = 4; }   MessageFrame { string data = 1; }
+_WIRE_VARINT = 0
+_WIRE_LEN = 2
+_FRAME_AUDIO_TAG = (2 << 3) | _WIRE_LEN
+_FRAME_MESSAGE_TAG = (4 << 3) | _WIRE_LEN
+_MESSAGE_DATA_TAG = (1 << 3) | _WIRE_LEN
+
 
 def encode_response(data: str | dict) -> str:
     data = data if isinstance(data, str) else json.dumps(data)
@@ -13,9 +25,187 @@ def encode_response(data: str | dict) -> str:
     return f"data: {encoded}\n\n"
 
 
+def _encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _decode_varint(data, pos: int) -> tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _varint_field(number: int, value: int) -> bytes:
+    return _encode_varint((number << 3) | _WIRE_VARINT) + _encode_varint(value)
+
+
+def encode_audio_frame(
+    frame: OutputAudioRawFrame, delimited: bool = False, compact: bool = False
+) -> bytes:
+    """Protobuf-encode an audio frame, copying the audio only once.
+
+    Produces the same bytes as ``ProtobufFrameSerializer`` (which copies the
+    audio into the message and again when serializing it), prefixed with
+    their length if ``delimited``. ``compact`` leaves out the frame id and
+    name, about 25 bytes that clients have no use for.
+    """
+    head = _varint_field(1, frame.id) if frame.id and not compact else b""
+    if frame.name and not compact:
+        name = frame.name.encode("utf-8")
+        head += _encode_varint((2 << 3) | _WIRE_LEN) + _encode_varint(len(name)) + name
+    audio_len = len(frame.audio)
+    if audio_len:
+        head += _encode_varint((3 << 3) | _WIRE_LEN) + _encode_varint(audio_len)
+    tail = b""
+    if frame.sample_rate:
+        tail += _varint_field(4, frame.sample_rate)
+    if frame.num_channels:
+        tail += _varint_field(5, frame.num_channels)
+    if frame.pts:
+        tail += _varint_field(6, frame.pts)
+
+    size = len(head) + audio_len + len(tail)
+    frame_head = bytes((_FRAME_AUDIO_TAG,)) + _encode_varint(size)
+    if delimited:
+        frame_head = _encode_varint(len(frame_head) + size) + frame_head
+    return b"".join((frame_head, head, frame.audio, tail))
+
+
+def _len_field(tag: int, value: bytes) -> bytes:
+    return bytes((tag,)) + _encode_varint(len(value)) + value
+
+
+def encode_message_frame(message: dict) -> bytes:
+    """Protobuf-encode a JSON message the way pipecat's ``MessageFrame`` is sent."""
+    data = json.dumps(message).encode("utf-8")
+    return _len_field(_FRAME_MESSAGE_TAG, _len_field(_MESSAGE_DATA_TAG, data))
+
+
+def decode_message_frame(data) -> dict | None:
+    """Decode a protobuf ``Frame`` holding a JSON message, ``None`` if it isn't one."""
+    if not data or data[0] != _FRAME_MESSAGE_TAG:
+        return None
+    view = memoryview(data)
+    size, pos = _decode_varint(view, 1)
+    end = pos + size
+    while pos < end:
+        key, pos = _decode_varint(view, pos)
+        if key & 0x07 != _WIRE_LEN:
+            return None
+        length, pos = _decode_varint(view, pos)
+        if key == _MESSAGE_DATA_TAG:
+            try:
+                return json.loads(bytes(view[pos : pos + length]))
+            except ValueError:
+                return None
+        pos += length
+    return None
+
+
+def encode_delimited(payload: bytes) -> bytes:
+    """Prefix a serialized frame with its varint length (protobuf's "delimited" format)."""
+    return _encode_varint(len(payload)) + payload
+
+
+def iter_delimited(data: bytes) -> Iterator[memoryview]:
+    """Split a message into its length-prefixed frames, without copying them."""
+    view = memoryview(data)
+    pos = 0
+    while pos < len(view):
+        length, pos = _decode_varint(view, pos)
+        if pos + length > len(view):
+            raise ValueError("Truncated frame")
+        yield view[pos : pos + length]
+        pos += length
+
+
+def decode_audio_frame(data: bytes | memoryview) -> InputAudioRawFrame | None:
+    """Decode a protobuf ``Frame`` holding audio without building message objects.
+
+    Returns ``None`` if ``data`` is not an audio frame.
+    """
+    if not data or data[0] != _FRAME_AUDIO_TAG:
+        return None
+    view = memoryview(data)
+    size, pos = _decode_varint(view, 1)
+    end = pos + size
+
+    audio = b""
+    sample_rate = 0
+    num_channels = 0
+    pts = None
+    while pos < end:
+        key, pos = _decode_varint(view, pos)
+        number, wire_type = key >> 3, key & 0x07
+        if wire_type == _WIRE_VARINT:
+            value, pos = _decode_varint(view, pos)
+            if number == 4:
+                sample_rate = value
+            elif number == 5:
+                num_channels = value
+            elif number == 6:
+                pts = value
+        elif wire_type == _WIRE_LEN:
+            length, pos = _decode_varint(view, pos)
+            if number == 3:
+                audio = bytes(view[pos : pos + length])
+            pos += length
+        else:
+            return None
+
+    frame = InputAudioRawFrame(audio=audio, sample_rate=sample_rate, num_channels=num_channels)
+    if pts:
+        frame.pts = pts
+    return frame
+
+
 class BotFrameSerializer(ProtobufFrameSerializer):
-    def __init__(self):
+    """Protobuf serializer with a fast path for audio, the bulk of the traffic.
+
+    Audio frames are encoded/decoded by hand, without intermediate protobuf
+    messages; everything else goes through ``ProtobufFrameSerializer``.
+
+    With ``length_prefixed`` every frame is sent with a varint length prefix
+    and a websocket message may carry several frames (see ``split``), which
+    is the framing of the ``/api/bot/ws`` session protocol. Audio frames are
+    then also sent without their id and name.
+    """
+
+    def __init__(self, length_prefixed: bool = False):
         super().__init__()
+        self.length_prefixed = length_prefixed
+
+    def split(self, message: str | bytes) -> Iterator[str | bytes | memoryview]:
+        """The serialized frames contained in a websocket message."""
+        if self.length_prefixed and not isinstance(message, str):
+            return iter_delimited(message)
+        return iter((message,))
+
+    async def serialize(self, frame: Frame) -> str | bytes | None:
+        if type(frame) is OutputAudioRawFrame:
+            return encode_audio_frame(
+                frame, delimited=self.length_prefixed, compact=self.length_prefixed
+            )
+        payload = await super().serialize(frame)
+        if payload and self.length_prefixed:
+            return encode_delimited(payload)
+        return payload
 
-    async def deserialize(self, data: str | bytes) -> Frame | None:
-        return await super().deserialize(data)
+    async def deserialize(self, data: str | bytes | memoryview) -> Frame | None:
+        if isinstance(data, str):
+            return await super().deserialize(data)
+        frame = decode_audio_frame(data)
+        if frame is not None:
+            return frame
+        return await super().deserialize(bytes(data))
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Set, Tuple
+
+from loguru import logger
+
+from src.bots.types import BotConfig
+from src.bots.webrtc.bot_pipeline import (
+    PipelineComponents,
+    create_pipeline_components,
+    resolve_profile,
+)
+from src.common.config import DEFAULT_BOT_CONFIG
+from src.common.metrics import metrics
+
+DEFAULT_WARM_POOL_SIZE = 2
+
+# Components sitting in the pool longer than this are rebuilt, so that
+# long-idle service objects don't carry stale state.
+DEFAULT_WARM_POOL_MAX_AGE_SECONDS = 15 * 60
+
+# (transport, profile) combinations kept warm.
+DEFAULT_WARM_POOL_KEYS = [("webrtc", "voice"), ("websocket", "voice")]
+
+
+class PipelinePool:
+    """Small pool of pre-built, not-yet-started pipeline components.
+
+    Building the services, VAD analyzer and RTVI processor takes a noticeable
+    amount of time. The pool does it ahead of time for every
+    ``(transport, profile)`` key so that a new session only has to bind its
+    transport. Only sessions using the default bot config are served from the
+    pool, since the RTVI processor is built from it.
+    """
+
+    def __init__(
+        self,
+        *,
+        size: int = DEFAULT_WARM_POOL_SIZE,
+        max_age: float = DEFAULT_WARM_POOL_MAX_AGE_SECONDS,
+        keys: Iterable[Tuple[str, str]] = DEFAULT_WARM_POOL_KEYS,
+    ):
+        self._size = size
+        self._max_age = max_age
+        self._keys = list(keys)
+        self._pool: Dict[Tuple[str, str], Deque[PipelineComponents]] = {
+            key: deque() for key in self._keys
+        }
+        self._refilling: Set[Tuple[str, str]] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._started = False
+
+    async def start(self):
+        if self._size <= 0:
+            return
+        self._started = True
+        await asyncio.gather(*[self._refill(key) for key in self._keys])
+        logger.info(f"Warm pipeline pool ready: {self.sizes()}")
+
+    async def stop(self):
+        self._started = False
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for components in self._pool.values():
+            components.clear()
+
+    def sizes(self) -> Dict[str, int]:
+        return {f"{t}/{p}": len(components) for (t, p), components in self._pool.items()}
+
+    async def acquire(
+        self, transport: str, profile: Optional[str], config: BotConfig
+    ) -> Optional[PipelineComponents]:
+        """Take warm components for ``(transport, profile)``, if there are any.
+
+        Returns ``None`` when the pool can't serve the request; the caller
+        then builds the components itself.
+        """
+        key = (transport, resolve_profile(profile))
+        pool = self._pool.get(key)
+        if pool is None or config != DEFAULT_BOT_CONFIG:
+            metrics.increment("bot.pipeline_pool.bypass")
+            return None
+
+        components = None
+        now = time.monotonic()
+        while pool:
+            candidate = pool.popleft()
+            if now - candidate.created_at < self._max_age:
+                components = candidate
+                break
+
+        self._schedule_refill(key)
+
+        if components is None:
+            metrics.increment("bot.pipeline_pool.miss")
+            return None
+
+        components.warm = True
+        metrics.increment("bot.pipeline_pool.hit")
+        self._update_gauges()
+        return components
+
+    def _schedule_refill(self, key: Tuple[str, str]):
+        # Processes that never started the pool (e.g. one-off bot processes)
+        # don't keep warm components around.
+        if not self._started or key in self._refilling:
+            return
+        task = asyncio.create_task(self._refill(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refill(self, key: Tuple[str, str]):
+        self._refilling.add(key)
+        transport, profile = key
+        try:
+            pool = self._pool[key]
+            while len(pool) < self._size:
+                start = time.monotonic()
+                components = await create_pipeline_components(
+                    transport, profile, DEFAULT_BOT_CONFIG
+                )
+                metrics.observe("bot.pipeline_pool.build_time", time.monotonic() - start)
+                pool.append(components)
+        except Exception as e:
+            logger.error(f"Unable to pre-build pipeline for {transport}/{profile}: {e}")
+        finally:
+            self._refilling.discard(key)
+            self._update_gauges()
+
+    def _update_gauges(self):
+        for name, size in self.sizes().items():
+            metrics.set_gauge(f"bot.pipeline_pool.size.{name}", size)
+
+
+pipeline_pool = PipelinePool(
+    size=int(os.getenv("BOT_WARM_POOL_SIZE", DEFAULT_WARM_POOL_SIZE)),
+    max_age=float(os.getenv("BOT_WARM_POOL_MAX_AGE", DEFAULT_WARM_POOL_MAX_AGE_SECONDS)),
+)
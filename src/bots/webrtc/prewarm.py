@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+from loguru import logger
+
+from pipecat.services.openai.llm import OpenAILLMService
+from pipecat.services.websocket_service import WebsocketService
+
+from src.bots.fake_services import FakeLLMService
+from src.bots.types import BotConfig, BotParams
+from src.bots.webrtc.bot_pipeline import (
+    PipelineComponents,
+    create_pipeline_components,
+    load_context,
+    resolve_profile,
+)
+from src.bots.webrtc.pipeline_pool import pipeline_pool
+from src.common.metrics import metrics
+
+# Provider warm-ups are best effort, we never want them to hold a session back.
+PREWARM_TIMEOUT_SECONDS = 5.0
+
+
+async def _warm_llm(components: PipelineComponents):
+    # A cheap request leaves a keep-alive HTTPS connection in the client's
+    # pool, so the first completion doesn't pay for DNS and TLS.
+    if isinstance(components.llm, OpenAILLMService) and not isinstance(
+        components.llm, FakeLLMService
+    ):
+        await components.llm._client.models.list()
+
+
+async def _warm_tts(components: PipelineComponents):
+    # Websocket services skip connecting in start() if the socket is already
+    # open, so opening it now simply moves the handshake earlier.
+    if isinstance(components.tts, WebsocketService):
+        await components.tts._connect_websocket()
+
+
+async def _best_effort(name: str, coro):
+    start = time.monotonic()
+    try:
+        await asyncio.wait_for(coro, PREWARM_TIMEOUT_SECONDS)
+        metrics.observe(f"bot.prewarm.{name}", time.monotonic() - start)
+    except Exception as e:
+        metrics.increment(f"bot.prewarm.{name}.failed")
+        logger.warning(f"Unable to pre-warm {name}: {e}")
+
+
+async def prewarm_session(
+    transport: str, params: BotParams, config: BotConfig
+) -> PipelineComponents:
+    """Get pipeline components ready while the transport is still connecting.
+
+    Takes components from the warm pool (or builds them), loads the
+    conversation context and opens provider connections, all concurrently.
+    The result is handed to ``bot_pipeline`` once the transport is ready.
+
+    Deepgram is not warmed up here: its connect isn't idempotent, so it
+    connects when the pipeline starts, which now also overlaps with ICE.
+
+    If loading the context fails (or the prewarm is cancelled) the
+    components are released before the error propagates.
+    """
+    start = time.monotonic()
+
+    components = await pipeline_pool.acquire(transport, params.bot_profile, config)
+    if components is None:
+        components = await create_pipeline_components(
+            transport, resolve_profile(params.bot_profile), config
+        )
+
+    steps = [
+        asyncio.ensure_future(load_context(components, params)),
+        asyncio.ensure_future(_best_effort("llm", _warm_llm(components))),
+        asyncio.ensure_future(_best_effort("tts", _warm_tts(components))),
+    ]
+    try:
+        await asyncio.gather(*steps)
+    except BaseException:
+        # Nobody gets the components. Stop the warm-ups still running so
+        # they can't open a connection after this, then close what they opened.
+        for step in steps:
+            step.cancel()
+        await asyncio.gather(*steps, return_exceptions=True)
+        await release_components(components)
+        raise
+
+    metrics.observe("bot.prewarm.total", time.monotonic() - start)
+    return components
+
+
+async def release_components(components: PipelineComponents):
+    """Close connections opened by ``prewarm_session`` for a session that never started."""
+    if isinstance(components.tts, WebsocketService):
+        try:
+            await components.tts._disconnect_websocket()
+        except Exception as e:
+            logger.warning(f"Unable to close pre-warmed TTS connection: {e}")
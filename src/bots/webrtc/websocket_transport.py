@@ -0,0 +1,74 @@
+from loguru import logger
+
+from pipecat.frames.frames import InputAudioRawFrame, StartFrame
+from pipecat.transports.network.fastapi_websocket import (
+    FastAPIWebsocketInputTransport,
+    FastAPIWebsocketOutputTransport,
+    FastAPIWebsocketTransport,
+)
+
+from src.bots.audio_buffer import RingBufferMediaSender
+from src.bots.webrtc.frame_serializer import BotFrameSerializer
+
+
+class BufferedWebsocketInputTransport(FastAPIWebsocketInputTransport):
+    """Websocket input that understands messages carrying several frames.
+
+    This is the only reader of the socket once the session is running.
+    """
+
+    async def _receive_messages(self):
+        serializer = self._params.serializer
+        try:
+            async for message in self._client.receive():
+                if not serializer:
+                    continue
+
+                records = (
+                    serializer.split(message)
+                    if isinstance(serializer, BotFrameSerializer)
+                    else (message,)
+                )
+                for record in records:
+                    frame = await serializer.deserialize(record)
+
+                    if not frame:
+                        continue
+
+                    if isinstance(frame, InputAudioRawFrame):
+                        await self.push_audio_frame(frame)
+                    else:
+                        await self.push_frame(frame)
+        except Exception as e:
+            logger.error(f"{self} exception receiving data: {e.__class__.__name__} ({e})")
+
+        await self._client.trigger_client_disconnected()
+
+
+class BufferedWebsocketOutputTransport(FastAPIWebsocketOutputTransport):
+    """Websocket output that chunks audio with a ``RingBufferMediaSender``.
+
+    Only the default destination is used by our websocket sessions, so that
+    is the only sender created.
+    """
+
+    async def set_transport_ready(self, frame: StartFrame):
+        self._media_senders[None] = RingBufferMediaSender(
+            self,
+            destination=None,
+            sample_rate=self.sample_rate,
+            audio_chunk_size=self.audio_chunk_size,
+            params=self._params,
+        )
+        await self._media_senders[None].start(frame)
+
+
+class BufferedWebsocketTransport(FastAPIWebsocketTransport):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._input = BufferedWebsocketInputTransport(
+            self, self._client, self._params, name=self._input_name
+        )
+        self._output = BufferedWebsocketOutputTransport(
+            self, self._client, self._params, name=self._output_name
+        )
@@ -0,0 +1,361 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import signal
+import sys
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from loguru import logger
+
+from src.bots.types import BotConfig, BotParams
+from src.common.metrics import metrics
+
+# 0 keeps every session inside the web server process.
+DEFAULT_WORKER_COUNT = 0
+
+WORKER_REQUEST_TIMEOUT_SECONDS = 30.0
+WORKER_STOP_TIMEOUT_SECONDS = 10.0
+
+
+class WorkerError(Exception):
+    pass
+
+
+#
+# Supervisor side
+#
+
+
+class _WorkerHandle:
+    def __init__(self, worker_id: int, process: multiprocessing.Process, conn: Connection):
+        self.worker_id = worker_id
+        self.process = process
+        self.conn = conn
+        self.sessions: Set[str] = set()
+        # Sessions being set up (offers in flight) count towards the load too.
+        self.pending = 0
+        # Reported by the worker's LoadMonitor.
+        self.cpu = 0.0
+        self.loop_lag = 0.0
+
+    @property
+    def load(self) -> int:
+        return len(self.sessions) + self.pending
+
+
+class WorkerSupervisor:
+    """Runs a fixed pool of bot worker processes.
+
+    Each worker runs its own event loop and hosts many sessions. New sessions
+    go to the least-loaded worker and every later request for a session
+    (e.g. a WebRTC renegotiation) is routed to the worker that owns it,
+    keyed by ``pc_id`` (or the room URL for Daily sessions).
+
+    Workers talk to the supervisor over a ``multiprocessing`` pipe that is
+    read from the supervisor's event loop, so no extra threads are needed.
+    """
+
+    def __init__(self, count: int = DEFAULT_WORKER_COUNT):
+        self._count = count
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers: Dict[int, _WorkerHandle] = {}
+        self._routes: Dict[str, int] = {}
+        self._requests: Dict[int, Tuple[int, asyncio.Future]] = {}
+        self._request_ids = itertools.count()
+        self._stopping = False
+        # Called with the session id whenever a session goes away.
+        self.on_session_ended: Optional[Callable[[str], None]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._workers)
+
+    def owner(self, session_id: str) -> Optional[int]:
+        return self._routes.get(session_id)
+
+    def next_worker_load(self) -> Tuple[float, float]:
+        """CPU usage and loop lag of the worker the next session would go to."""
+        if not self._workers:
+            return 0.0, 0.0
+        handle = self._least_loaded()
+        return handle.cpu, handle.loop_lag
+
+    async def start(self):
+        if self._count <= 0:
+            return
+        self._stopping = False
+        for worker_id in range(self._count):
+            self._spawn(worker_id)
+        logger.info(f"Started {self._count} bot worker process(es)")
+
+    async def stop(self):
+        self._stopping = True
+        for handle in list(self._workers.values()):
+            try:
+                handle.conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+        for handle in list(self._workers.values()):
+            await asyncio.to_thread(handle.process.join, WORKER_STOP_TIMEOUT_SECONDS)
+            if handle.process.is_alive():
+                logger.warning(f"Bot worker {handle.worker_id} did not stop, terminating")
+                handle.process.terminate()
+            self._remove(handle)
+
+    async def offer(self, request: dict) -> dict:
+        pc_id = request.get("pc_id")
+        worker_id = self._routes.get(pc_id) if pc_id else None
+        new_session = worker_id is None or worker_id not in self._workers
+        handle = self._least_loaded() if new_session else self._workers[worker_id]
+
+        # The route itself is added when the worker reports the session as
+        # started, which it does before answering.
+        if new_session:
+            handle.pending += 1
+        try:
+            return await self._call(handle, "offer", request)
+        finally:
+            if new_session:
+                handle.pending -= 1
+                self._update_gauges()
+
+    async def launch(self, params: BotParams, config: BotConfig, room_url: str, room_token: str):
+        handle = self._least_loaded()
+        handle.pending += 1
+        try:
+            await self._call(handle, "launch", params, config, room_url, room_token)
+        finally:
+            handle.pending -= 1
+            self._update_gauges()
+
+    def _spawn(self, worker_id: int):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_process,
+            args=(worker_id, child_conn),
+            name=f"bot-worker-{worker_id}",
+        )
+        process.start()
+        child_conn.close()
+
+        handle = _WorkerHandle(worker_id, process, parent_conn)
+        self._workers[worker_id] = handle
+        asyncio.get_running_loop().add_reader(parent_conn.fileno(), self._on_readable, handle)
+        self._update_gauges()
+
+    def _least_loaded(self) -> _WorkerHandle:
+        if not self._workers:
+            raise WorkerError("No bot workers available")
+        return min(self._workers.values(), key=lambda h: (h.load, h.worker_id))
+
+    async def _call(self, handle: _WorkerHandle, command: str, *args) -> Any:
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._requests[request_id] = (handle.worker_id, future)
+        try:
+            handle.conn.send((command, request_id, *args))
+            return await asyncio.wait_for(future, WORKER_REQUEST_TIMEOUT_SECONDS)
+        finally:
+            self._requests.pop(request_id, None)
+
+    def _on_readable(self, handle: _WorkerHandle):
+        try:
+            while handle.conn.poll():
+                self._handle_message(handle, handle.conn.recv())
+        except (EOFError, OSError):
+            self._on_worker_exit(handle)
+
+    def _handle_message(self, handle: _WorkerHandle, message: tuple):
+        kind = message[0]
+        if kind == "response":
+            _, request_id, result, error = message
+            entry = self._requests.get(request_id)
+            if entry is None or entry[1].done():
+                return
+            if error is not None:
+                entry[1].set_exception(WorkerError(error))
+            else:
+                entry[1].set_result(result)
+        elif kind == "session_started":
+            self._add_route(handle, message[1])
+        elif kind == "session_ended":
+            self._drop_route(message[1])
+        elif kind == "turn":
+            # Sessions run here, so /api/metrics/turns is served from here.
+            from src.bots.turn_tracer import record_turn
+
+            record_turn(message[1])
+        elif kind == "load":
+            _, handle.cpu, handle.loop_lag = message
+            metrics.set_gauge(f"bot.workers.{handle.worker_id}.cpu", handle.cpu)
+            metrics.set_gauge(f"bot.workers.{handle.worker_id}.loop_lag", handle.loop_lag)
+
+    def _add_route(self, handle: _WorkerHandle, session_id: str):
+        self._routes[session_id] = handle.worker_id
+        handle.sessions.add(session_id)
+        self._update_gauges()
+
+    def _drop_route(self, session_id: str):
+        worker_id = self._routes.pop(session_id, None)
+        handle = self._workers.get(worker_id)
+        if handle:
+            handle.sessions.discard(session_id)
+        self._update_gauges()
+        if worker_id is not None and self.on_session_ended:
+            self.on_session_ended(session_id)
+
+    def _remove(self, handle: _WorkerHandle):
+        try:
+            asyncio.get_running_loop().remove_reader(handle.conn.fileno())
+        except (OSError, ValueError):
+            pass
+        handle.conn.close()
+        self._workers.pop(handle.worker_id, None)
+        for session_id in list(handle.sessions):
+            self._drop_route(session_id)
+        for worker_id, future in list(self._requests.values()):
+            if worker_id == handle.worker_id and not future.done():
+                future.set_exception(WorkerError(f"Bot worker {worker_id} exited"))
+        self._update_gauges()
+
+    def _on_worker_exit(self, handle: _WorkerHandle):
+        if handle.worker_id not in self._workers:
+            return
+        lost = len(handle.sessions)
+        self._remove(handle)
+        if self._stopping:
+            return
+        logger.error(f"Bot worker {handle.worker_id} exited, {lost} session(s) lost. Restarting.")
+        metrics.increment("bot.workers.restarts")
+        self._spawn(handle.worker_id)
+
+    def _update_gauges(self):
+        for handle in self._workers.values():
+            metrics.set_gauge(f"bot.workers.{handle.worker_id}.sessions", handle.load)
+        metrics.set_gauge("bot.workers.sessions", len(self._routes))
+
+
+#
+# Worker side
+#
+
+
+class _Worker:
+    def __init__(self, worker_id: int, conn: Connection):
+        self._worker_id = worker_id
+        self._conn = conn
+        self._pcs_map = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._stopped = asyncio.Event()
+
+    async def run(self):
+        # Imported here so the supervisor doesn't need the whole bot stack.
+        from src.bots.greetings import greeting_cache
+        from src.bots.turn_tracer import turn_listeners
+        from src.bots.webrtc.bot_pipeline import GREETING_VOICES
+        from src.bots.webrtc.pipeline_pool import pipeline_pool
+        from src.common.database import MongoDB
+        from src.common.models import Attachment, Conversation, Message
+        from src.webapp.capacity import LoadMonitor
+
+        await MongoDB.init([Conversation, Message, Attachment])
+        await pipeline_pool.start()
+        await greeting_cache.start(GREETING_VOICES)
+
+        # The supervisor admits sessions based on the load of its workers.
+        monitor = LoadMonitor(f"bot.workers.{self._worker_id}")
+        monitor.on_sample = lambda m: self._send(("load", m.cpu, m.loop_lag))
+        await monitor.start()
+        turn_listeners.append(lambda record: self._send(("turn", record)))
+
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self._conn.fileno(), self._on_readable)
+        logger.info(f"Bot worker {self._worker_id} ready (pid {os.getpid()})")
+
+        await self._stopped.wait()
+
+        loop.remove_reader(self._conn.fileno())
+        await asyncio.gather(*[pc.disconnect() for pc in self._pcs_map.values()])
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await monitor.stop()
+        await pipeline_pool.stop()
+        await greeting_cache.stop()
+
+    def _on_readable(self):
+        try:
+            while self._conn.poll():
+                message = self._conn.recv()
+                if message[0] == "stop":
+                    self._stopped.set()
+                    return
+                self._spawn_task(self._handle(*message))
+        except (EOFError, OSError):
+            # The supervisor is gone, no one will route anything to us anymore.
+            self._stopped.set()
+
+    def _spawn_task(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _send(self, message: tuple):
+        try:
+            self._conn.send(message)
+        except (BrokenPipeError, OSError):
+            self._stopped.set()
+
+    async def _handle(self, command: str, request_id: int, *args):
+        try:
+            if command == "offer":
+                result = await self._offer(*args)
+            elif command == "launch":
+                result = await self._launch(*args)
+            else:
+                raise WorkerError(f"Unknown command: {command}")
+            self._send(("response", request_id, result, None))
+        except Exception as e:
+            logger.exception(f"Bot worker {self._worker_id} failed to handle {command}: {e}")
+            self._send(("response", request_id, None, str(e)))
+
+    async def _offer(self, request: dict) -> dict:
+        from src.bots.webrtc.bot import bot_offer_webrtc
+
+        known = request.get("pc_id") in self._pcs_map
+        answer = await bot_offer_webrtc(
+            request, self._pcs_map, on_closed=lambda pc_id: self._send(("session_ended", pc_id))
+        )
+        if not known:
+            self._send(("session_started", answer["pc_id"]))
+        return answer
+
+    async def _launch(self, params: BotParams, config: BotConfig, room_url: str, room_token: str):
+        from src.bots.webrtc.bot import _bot_main
+
+        async def run_bot():
+            try:
+                # The runner must not replace SIG_IGN, shutdown is driven by the supervisor.
+                await _bot_main(params, config, room_url, room_token, handle_sigint=False)
+            finally:
+                self._send(("session_ended", room_url))
+
+        self._send(("session_started", room_url))
+        self._spawn_task(run_bot())
+        return True
+
+
+def _worker_process(worker_id: int, conn: Connection):
+    # This is a different process so we need to make sure we have the right log level.
+    logger.remove()
+    logger.add(sys.stderr, level=os.getenv("BOT_LOG_LEVEL", "INFO"))
+
+    # Shutdown is driven by the supervisor, don't die with the server's Ctrl+C.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    asyncio.run(_Worker(worker_id, conn).run())
+
+
+worker_supervisor = WorkerSupervisor(int(os.getenv("BOT_WORKERS", DEFAULT_WORKER_COUNT)))
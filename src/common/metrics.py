@@ -0,0 +1,90 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, Iterable, Optional
+
+# Number of most recent observations kept per histogram to compute percentiles.
+DEFAULT_HISTOGRAM_WINDOW = 2048
+
+
+def percentile(values: Iterable[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of ``values`` (``pct`` in 0..100)."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class Metrics:
+    """Process-wide counters, gauges and windowed histograms.
+
+    Names are free-form strings, usually dotted (``"bot.http.admission.rejected"``).
+    Everything is kept in memory and exported through ``snapshot()``, which is
+    what the ``/api/metrics`` endpoint returns.
+    """
+
+    def __init__(self, histogram_window: int = DEFAULT_HISTOGRAM_WINDOW):
+        self._lock = threading.Lock()
+        self._histogram_window = histogram_window
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._histograms: Dict[str, Deque[float]] = {}
+        self._started_at = time.time()
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = deque(maxlen=self._histogram_window)
+                self._histograms[name] = histogram
+            histogram.append(value)
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def histogram(self, name: str) -> list[float]:
+        with self._lock:
+            return list(self._histograms.get(name, ()))
+
+    def summary(self, name: str) -> dict:
+        values = self.histogram(name)
+        return {
+            "count": len(values),
+            "mean": sum(values) / len(values) if values else None,
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "p99": percentile(values, 99),
+            "max": max(values) if values else None,
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            names = list(self._histograms.keys())
+        return {
+            "uptime": time.time() - self._started_at,
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": {name: self.summary(name) for name in names},
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+metrics = Metrics()
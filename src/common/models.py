@@ -3,8 +3,9 @@ from datetime import datetime
 from typing import Any, List, Optional
 
 from loguru import logger
-from pydantic import BaseModel, Field, validator
+from pydantic import AliasChoices, BaseModel, Field, model_validator, validator
 from beanie import Document, Link
+from pymongo import DESCENDING, IndexModel
 
 # ==========================
 # Beanie Document Models
@@ -16,9 +17,17 @@ class Conversation(Document):
     createdAt: datetime = Field(default_factory=datetime.utcnow)
     updatedAt: datetime = Field(default_factory=datetime.utcnow)
     messageCount: int = 0
+    # createdAt of the last numbered message, see src/common/sequences.py.
+    lastMessageAt: Optional[datetime] = None
     # _participants: List[str] = Field(default_factory=list)
     createdBy: Optional[str] = None
     isRemove: bool = False
+    # Rolling summary of the messages up to (summaryUntil, summaryMessageId),
+    # see src/bots/summarize.py.
+    summary: Optional[str] = None
+    summaryUntil: Optional[datetime] = None
+    summaryMessageId: Optional[str] = None
+    summaryMessageCount: int = 0
 
     @validator("createdBy", pre=True)
     def str_created_by(cls, v):
@@ -26,6 +35,13 @@ class Conversation(Document):
 
     class Settings:
         name = "socialize:conversations"
+        indexes = [
+            # Conversation listing, see get_conversations().
+            IndexModel(
+                [("archived", 1), ("updatedAt", DESCENDING), ("_id", DESCENDING)],
+                name="archived_updatedAt_id",
+            ),
+        ]
 
 class Message(Document):
     id: Optional[str] = Field(default=None, alias="_id") 
@@ -34,6 +50,10 @@ class Message(Document):
     role: Optional[str] = None
     contentType: Optional[str] = None
     userId: Optional[str] = None
+    # LLM message ({"role", "content"}) of messages written through the API.
+    content: Optional[dict] = None
+    # Position in the conversation, see src/common/sequences.py.
+    message_number: Optional[int] = Field(default=None, alias="messageNumber")
     language_code: str = "english"
     created_at: datetime = Field(default_factory=datetime.utcnow, alias="createdAt")
     updated_at: datetime = Field(default_factory=datetime.utcnow, alias="updatedAt")
@@ -54,6 +74,21 @@ class Message(Document):
     class Settings:
         name = "socialize:messages"
         use_state_management = True
+        indexes = [
+            # Paging through a conversation, see get_conversation_messages().
+            IndexModel(
+                [("conversationId", 1), ("createdAt", 1), ("_id", 1)],
+                name="conversationId_createdAt_id",
+            ),
+            # Only messages written before numbering started lack a number
+            # (the field is missing or null, both left out of the index).
+            IndexModel(
+                [("conversationId", 1), ("messageNumber", 1)],
+                name="conversationId_messageNumber",
+                unique=True,
+                partialFilterExpression={"messageNumber": {"$type": "int"}},
+            ),
+        ]
 
 class Attachment(Document):
     attachment_id: str = Field(default_factory=lambda: str(uuid.uuid4()), alias="_id")
@@ -73,6 +108,17 @@ class Attachment(Document):
     class Settings:
         name = "attachments"
 
+class JobCheckpoint(Document):
+    """Progress of a resumable background job, one document per job."""
+
+    id: Optional[str] = Field(default=None, alias="_id")
+    cursor: Optional[str] = None
+    processed: int = 0
+    updatedAt: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "job_checkpoints"
+
 # ==========================
 # Pydantic Models (保留)
 # ==========================
@@ -81,8 +127,9 @@ class ConversationModel(BaseModel):
     id: str = Field(alias="_id")
     title: Optional[str] = None
     archived: Optional[bool] = False
-    created_at: datetime
-    updated_at: datetime
+    # The documents call them createdAt/updatedAt.
+    created_at: datetime = Field(validation_alias=AliasChoices("created_at", "createdAt"))
+    updated_at: datetime = Field(validation_alias=AliasChoices("updated_at", "updatedAt"))
 
     model_config = {"from_attributes": True, "arbitrary_types_allowed": True}
 
@@ -90,6 +137,11 @@ class ConversationModel(BaseModel):
     def str_id(cls, v):
         return str(v)
 
+class ConversationPage(BaseModel):
+    conversations: List[ConversationModel]
+    # Pass as ``cursor`` to get the next page, None on the last page.
+    next_cursor: Optional[str] = None
+
 class ConversationCreateModel(BaseModel):
     title: Optional[str] = None
 
@@ -128,6 +180,42 @@ class MessageCreateModel(BaseModel):
         "extra": "allow",
     }
 
+class MessageImportModel(BaseModel):
+    """A message of a bulk import, see src/webapp/message_import.py.
+
+    Takes messages as the API writes them (``content``) or as the chat app
+    stores them (encrypted ``body``, ``role``, ``userId``). Dumped by alias
+    it is the message document, less conversationId, messageNumber and
+    updatedAt.
+    """
+
+    # Given ids make re-running an import skip what is already there.
+    id: Optional[str] = Field(
+        default=None, validation_alias=AliasChoices("_id", "id"), serialization_alias="_id"
+    )
+    content: Optional[dict] = None
+    body: Optional[str] = None
+    role: Optional[str] = None
+    contentType: Optional[str] = None
+    userId: Optional[str] = None
+    language_code: str = "english"
+    created_at: Optional[datetime] = Field(
+        default=None,
+        validation_alias=AliasChoices("createdAt", "created_at"),
+        serialization_alias="createdAt",
+    )
+    extra_metadata: Optional[dict] = None
+
+    @validator("id", "userId", pre=True)
+    def str_ids(cls, v):
+        return str(v) if v is not None else v
+
+    @model_validator(mode="after")
+    def content_or_body(self):
+        if self.content is None and self.body is None:
+            raise ValueError("Either content or body is required")
+        return self
+
 class MessageModel(BaseModel):
     message_id: str = Field(alias="_id")
     conversation_id: str
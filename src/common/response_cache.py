@@ -0,0 +1,163 @@
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+
+from src.common.metrics import metrics
+
+# How long a response is served from memory. Writes through this process
+# invalidate it right away, the TTL bounds how stale it gets after writes
+# elsewhere (other server processes, the chat app). 0 disables the cache.
+DEFAULT_RESPONSE_CACHE_TTL_SECONDS = 5.0
+DEFAULT_RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Tag of every conversation listing.
+CONVERSATIONS_TAG = "conversations"
+
+
+def conversation_tag(conversation_id: str) -> str:
+    """Tag of the cached reads of one conversation."""
+    return f"conversation:{conversation_id}"
+
+
+class CachedResponse:
+    """A serialized response body and its validators."""
+
+    def __init__(self, body: bytes, etag: str, last_modified: Optional[datetime] = None):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class _Entry:
+    def __init__(self, response: CachedResponse, expires_at: float, tags: Set[str]):
+        self.response = response
+        self.expires_at = expires_at
+        self.tags = tags
+
+
+class ResponseCache:
+    """Serialized responses, kept for ``ttl`` seconds and ``max_bytes`` in total.
+
+    Entries are stored with tags, and writes drop every entry of a tag they
+    make stale with ``invalidate()``. Once over ``max_bytes`` the least
+    recently used entries go first.
+
+    A response built from reads that raced a write must not be stored:
+    take ``generation`` before reading and pass it to ``put()``, which
+    skips the response if anything was invalidated meanwhile.
+
+    Must be used from the event loop's thread.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        ttl: float = DEFAULT_RESPONSE_CACHE_TTL_SECONDS,
+        max_bytes: int = DEFAULT_RESPONSE_CACHE_MAX_BYTES,
+    ):
+        self._name = name
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._ttl > 0 and self._max_bytes > 0
+
+    @property
+    def generation(self) -> int:
+        """Bumped by every invalidation."""
+        return self._generation
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            metrics.increment(f"{self._name}.miss")
+            return None
+        self._entries.move_to_end(key)
+        metrics.increment(f"{self._name}.hit")
+        return entry.response
+
+    def put(
+        self,
+        key: str,
+        response: CachedResponse,
+        tags: Iterable[str] = (),
+        generation: Optional[int] = None,
+    ):
+        if not self.enabled or len(response.body) > self._max_bytes:
+            return
+        if generation is not None and generation != self._generation:
+            metrics.increment(f"{self._name}.stale")
+            return
+        if key in self._entries:
+            self._remove(key)
+        entry = _Entry(response, time.monotonic() + self._ttl, set(tags))
+        self._entries[key] = entry
+        self._bytes += len(response.body)
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+        while self._bytes > self._max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            metrics.increment(f"{self._name}.evicted")
+        self._update_gauges()
+
+    def invalidate(self, tag: str):
+        self._generation += 1
+        keys = self._tags.pop(tag, None)
+        if not keys:
+            return
+        for key in keys:
+            self._remove(key)
+        metrics.increment(f"{self._name}.invalidated", len(keys))
+        self._update_gauges()
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self._tags.clear()
+        self._bytes = 0
+        self._update_gauges()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry.response.body)
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _update_gauges(self):
+        metrics.set_gauge(f"{self._name}.entries", len(self._entries))
+        metrics.set_gauge(f"{self._name}.bytes", self._bytes)
+
+
+response_cache = ResponseCache(
+    "webapp.response_cache",
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", DEFAULT_RESPONSE_CACHE_TTL_SECONDS)),
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", DEFAULT_RESPONSE_CACHE_MAX_BYTES)),
+)
+
+
+def invalidate_conversation(conversation_id: Optional[str] = None):
+    """Drop the cached reads a write to a conversation makes stale: the
+    listings (its position, title or count changed) and its own."""
+    response_cache.invalidate(CONVERSATIONS_TAG)
+    if conversation_id:
+        response_cache.invalidate(conversation_tag(str(conversation_id)))
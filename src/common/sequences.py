@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+from src.common.database import raw_id
+from src.common.metrics import metrics
+from src.common.models import Conversation
+
+
+class MessageNumbers:
+    """Numbers and creation times reserved for ``count`` new messages."""
+
+    def __init__(self, first: int, first_created_at: datetime, count: int):
+        self.first = first
+        self.first_created_at = first_created_at
+        self.count = count
+
+    def number(self, index: int) -> int:
+        return self.first + index
+
+    def created_at(self, index: int) -> datetime:
+        # Mongo dates have millisecond precision.
+        return self.first_created_at + timedelta(milliseconds=index)
+
+
+async def reserve_message_numbers(conversation_id: str, count: int = 1) -> Optional[MessageNumbers]:
+    """Reserve ``count`` consecutive message numbers of a conversation.
+
+    The conversation's ``messageCount`` is the counter: one atomic update
+    hands out the numbers, so concurrent writers never get the same ones,
+    and it bumps ``updatedAt`` on the way. Numbers of messages that end up
+    not being written are skipped, not reused. ``messageCount`` is also the
+    chat app's message count, it now goes up for the messages written here.
+
+    The same update hands out the messages' ``createdAt``, one millisecond
+    apart and after those of the previous reservation (``lastMessageAt``),
+    so reads ordered by (createdAt, _id) agree with the numbers even when
+    concurrent writes land out of order.
+
+    Returns:
+        The reserved numbers (they start at 1) and creation times, or None
+        if the conversation doesn't exist.
+    """
+    now = datetime.utcnow()
+    conversation = await Conversation.get_motor_collection().find_one_and_update(
+        {"_id": raw_id(conversation_id)},
+        [
+            {
+                "$set": {
+                    "messageCount": {"$add": [{"$ifNull": ["$messageCount", 0]}, count]},
+                    # Adding a number to a date adds milliseconds.
+                    "lastMessageAt": {
+                        "$add": [{"$max": [now, {"$add": ["$lastMessageAt", 1]}]}, count - 1]
+                    },
+                    "updatedAt": now,
+                }
+            }
+        ],
+        projection={"messageCount": 1, "lastMessageAt": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if conversation is None:
+        return None
+    metrics.increment("webapp.messages.numbers_reserved", count)
+    return MessageNumbers(
+        conversation["messageCount"] - count + 1,
+        conversation["lastMessageAt"] - timedelta(milliseconds=count - 1),
+        count,
+    )
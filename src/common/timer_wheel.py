@@ -0,0 +1,191 @@
+import asyncio
+import inspect
+import math
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from loguru import logger
+
+from src.common.metrics import metrics
+
+DEFAULT_TICK_SECONDS = 0.1
+DEFAULT_SLOTS = 64
+# 64 slots of 0.1 s per level: 6.4 s, ~7 min, ~7.5 h, ~20 days.
+DEFAULT_LEVELS = 4
+
+
+class Timer:
+    """A callback scheduled on a ``TimerWheel``."""
+
+    __slots__ = ("deadline", "_callback", "_args", "_wheel", "_slot")
+
+    def __init__(self, wheel: "TimerWheel", deadline: int, callback: Callable, args: tuple):
+        self.deadline = deadline
+        self._callback = callback
+        self._args = args
+        self._wheel = wheel
+        self._slot: Optional[Dict["Timer", None]] = None
+
+    @property
+    def active(self) -> bool:
+        return self._slot is not None
+
+    def cancel(self):
+        """Unschedule the timer, in constant time. Does nothing if it already fired."""
+        if self._slot is not None:
+            del self._slot[self]
+            self._slot = None
+            self._wheel._count -= 1
+
+
+class TimerWheel:
+    """Process-wide hierarchical timer wheel for coarse timeouts.
+
+    Timers are kept in ``levels`` wheels of ``slots`` slots. The first wheel
+    has one slot per ``tick``; each following one has slots as wide as a whole
+    turn of the previous wheel, whose timers are moved down a level when
+    their slot comes up. Scheduling and cancelling are O(1) and a single
+    task advances the wheel, only while there are timers, instead of one
+    sleeping task per timeout.
+
+    Timers fire up to one tick late. Callbacks may be plain functions or
+    coroutine functions; the latter run as tasks of their own.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        tick: float = DEFAULT_TICK_SECONDS,
+        slots: int = DEFAULT_SLOTS,
+        levels: int = DEFAULT_LEVELS,
+    ):
+        self._name = name
+        self._tick = tick
+        self._slots = slots
+        self._wheels: List[List[Dict[Timer, None]]] = [
+            [{} for _ in range(slots)] for _ in range(levels)
+        ]
+        # Ticks elapsed since _origin (the loop time of tick 0).
+        self._now = 0
+        self._origin = 0.0
+        self._count = 0
+        self._task: Optional[asyncio.Task] = None
+        self._callbacks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def call_later(self, delay: float, callback: Callable, *args: Any) -> Timer:
+        """Call ``callback(*args)`` after ``delay`` seconds.
+
+        Must be called from the event loop's thread.
+        """
+        loop = asyncio.get_running_loop()
+        if self._task and self._task.get_loop() is not loop:
+            # Left by another loop, e.g. the server's in a forked bot process:
+            # its timers and tasks never run here.
+            self._clear()
+            self._callbacks.clear()
+        if not self._task:
+            # Nothing was running, start counting ticks from now.
+            self._origin = loop.time()
+            self._now = 0
+            self._task = loop.create_task(self._run())
+
+        deadline = math.ceil((loop.time() + delay - self._origin) / self._tick)
+        timer = Timer(self, max(deadline, self._now + 1), callback, args)
+        self._insert(timer)
+        self._count += 1
+        metrics.set_gauge(f"{self._name}.pending", self._count)
+        return timer
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._clear()
+
+    def _clear(self):
+        self._task = None
+        for wheel in self._wheels:
+            for slot in wheel:
+                for timer in slot:
+                    timer._slot = None
+                slot.clear()
+        self._count = 0
+
+    def _insert(self, timer: Timer):
+        ticks = timer.deadline - self._now
+        level = 0
+        span = self._slots
+        # Level n holds timers due within slots ** (n + 1) ticks, the last one
+        # also those beyond its range (they go round again).
+        while ticks >= span and level < len(self._wheels) - 1:
+            level += 1
+            span *= self._slots
+        index = (timer.deadline // (span // self._slots)) % self._slots
+        slot = self._wheels[level][index]
+        slot[timer] = None
+        timer._slot = slot
+
+    def _advance(self):
+        self._now += 1
+
+        # Higher levels first: their timers may land in the lower slots that
+        # come up on this very tick.
+        for level in range(len(self._wheels) - 1, 0, -1):
+            width = self._slots**level
+            if self._now % width:
+                continue
+            index = (self._now // width) % self._slots
+            slot = self._wheels[level][index]
+            self._wheels[level][index] = {}
+            for timer in slot:
+                self._insert(timer)
+
+        index = self._now % self._slots
+        slot = self._wheels[0][index]
+        if not slot:
+            return
+        self._wheels[0][index] = {}
+        for timer in slot:
+            if timer.deadline > self._now:
+                # Scheduled beyond the top level's range, not due yet.
+                self._insert(timer)
+                continue
+            timer._slot = None
+            self._count -= 1
+            self._fire(timer)
+        metrics.set_gauge(f"{self._name}.pending", self._count)
+
+    def _fire(self, timer: Timer):
+        metrics.increment(f"{self._name}.fired")
+        try:
+            result = timer._callback(*timer._args)
+            if inspect.isawaitable(result):
+                task = asyncio.ensure_future(result)
+                self._callbacks.add(task)
+                task.add_done_callback(self._callback_done)
+        except Exception as e:
+            logger.exception(f"{self._name}: timer callback failed: {e}")
+
+    def _callback_done(self, task: asyncio.Task):
+        self._callbacks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.opt(exception=task.exception()).error(f"{self._name}: timer callback failed")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._count:
+                next_tick = self._origin + (self._now + 1) * self._tick
+                await asyncio.sleep(max(0.0, next_tick - loop.time()))
+                # Catch up on every tick missed while the loop was busy.
+                due = int((loop.time() - self._origin) / self._tick)
+                while self._now < due and self._count:
+                    self._advance()
+        finally:
+            self._task = None
+
+
+timer_wheel = TimerWheel("timers")
@@ -2,6 +2,7 @@ import asyncio
 import functools
 import os
 import shutil
+import signal
 import subprocess
 from pathlib import Path
 from typing import Callable, Dict, Literal
@@ -304,8 +305,11 @@ def run(
         console.print(f"Reload: {'enabled' if reload else 'disabled'}", style="blue")
         console.print("\nPress CTRL+C to stop the server\n", style="yellow")
 
-        # Run uvicorn
-        subprocess.run(command)
+        # Run uvicorn. SIGTERM is passed on so that it can drain live voice
+        # sessions (in Docker this is PID 1 and would otherwise just exit).
+        process = subprocess.Popen(command)
+        signal.signal(signal.SIGTERM, lambda signum, frame: process.send_signal(signum))
+        process.wait()
 
     except KeyboardInterrupt:
         console.print("\nServer stopped", style="yellow")
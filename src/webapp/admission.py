@@ -0,0 +1,230 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional
+
+from fastapi import HTTPException, status
+from loguru import logger
+
+from src.common.metrics import metrics
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MAX_QUEUE = 32
+DEFAULT_MAX_QUEUE_WAIT_SECONDS = 10.0
+
+# Used for Retry-After until we have measured how long a slot is usually held.
+DEFAULT_SERVICE_TIME_SECONDS = 5.0
+
+# Anonymous requests (no user_id) share a single fairness bucket.
+ANONYMOUS_USER = "__anonymous__"
+
+
+class AdmissionRejected(Exception):
+    def __init__(
+        self,
+        reason: str,
+        retry_after: int,
+        status_code: int = status.HTTP_429_TOO_MANY_REQUESTS,
+    ):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+    def to_http_exception(self) -> HTTPException:
+        return HTTPException(
+            status_code=self.status_code,
+            detail=self.reason,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+
+class _Waiter:
+    def __init__(self, user_id: str, deadline: float):
+        self.user_id = user_id
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class AdmissionLease:
+    """A granted slot. Releasing it more than once is a no-op."""
+
+    def __init__(self, controller: "AdmissionController", user_id: str):
+        self._controller = controller
+        self._user_id = user_id
+        self._acquired_at = time.monotonic()
+        self._released = False
+
+    @property
+    def user_id(self) -> str:
+        return self._user_id
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(self, time.monotonic() - self._acquired_at)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class AdmissionController:
+    """Concurrency cap with a bounded, fair wait queue.
+
+    At most ``max_concurrency`` leases are active at once. Requests beyond
+    that wait in a queue of at most ``max_queue`` entries, and give up with
+    ``AdmissionRejected`` once they have waited ``max_queue_wait`` seconds.
+    Waiters are grouped per user and a freed slot goes to the next user in
+    round-robin order, so one user sending a burst can't starve the others.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        max_queue_wait: float = DEFAULT_MAX_QUEUE_WAIT_SECONDS,
+    ):
+        self._name = name
+        self._max_concurrency = max(1, max_concurrency)
+        self._max_queue = max(0, max_queue)
+        self._max_queue_wait = max_queue_wait
+        self._active = 0
+        self._queued = 0
+        # user_id -> waiters of that user, in arrival order. The OrderedDict
+        # order is the round-robin order across users.
+        self._waiters: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._active_per_user: Dict[str, int] = {}
+        self._avg_service_time: Optional[float] = None
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    async def acquire(self, user_id: Optional[str] = None) -> AdmissionLease:
+        user_id = user_id or ANONYMOUS_USER
+
+        if self._active < self._max_concurrency and self._queued == 0:
+            metrics.observe(f"{self._name}.queue_wait", 0.0)
+            return self._grant(user_id)
+
+        if self._queued >= self._max_queue:
+            self._reject("queue_full")
+            raise AdmissionRejected("Server is busy, please retry later", self._retry_after())
+
+        waiter = _Waiter(user_id, time.monotonic() + self._max_queue_wait)
+        self._waiters.setdefault(user_id, deque()).append(waiter)
+        self._queued += 1
+        self._update_gauges()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self._max_queue_wait)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # If a slot was handed over while we were being cancelled give it back.
+            if waiter.future.done() and not waiter.future.cancelled():
+                waiter.future.result().release()
+            else:
+                self._remove_waiter(waiter)
+            raise
+
+        if waiter.future.done() and not waiter.future.cancelled():
+            lease = waiter.future.result()
+            metrics.observe(f"{self._name}.queue_wait", time.monotonic() - waiter.enqueued_at)
+            return lease
+
+        self._remove_waiter(waiter)
+        self._reject("deadline")
+        raise AdmissionRejected("Timed out waiting for capacity", self._retry_after())
+
+    def _grant(self, user_id: str) -> AdmissionLease:
+        self._active += 1
+        self._active_per_user[user_id] = self._active_per_user.get(user_id, 0) + 1
+        metrics.increment(f"{self._name}.admitted")
+        self._update_gauges()
+        return AdmissionLease(self, user_id)
+
+    def _release(self, lease: AdmissionLease, held_for: float):
+        self._active -= 1
+        remaining = self._active_per_user.get(lease.user_id, 1) - 1
+        if remaining > 0:
+            self._active_per_user[lease.user_id] = remaining
+        else:
+            self._active_per_user.pop(lease.user_id, None)
+
+        if self._avg_service_time is None:
+            self._avg_service_time = held_for
+        else:
+            self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * held_for
+
+        self._dispatch()
+        self._update_gauges()
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self._active < self._max_concurrency and self._waiters:
+            user_id, waiters = next(iter(self._waiters.items()))
+            waiter = waiters.popleft()
+            self._queued -= 1
+            # Move this user to the back of the round-robin order.
+            if waiters:
+                self._waiters.move_to_end(user_id)
+            else:
+                del self._waiters[user_id]
+
+            # Shed waiters whose deadline has passed; their acquire() will
+            # time out on its own.
+            if waiter.deadline <= now or waiter.future.done():
+                continue
+
+            waiter.future.set_result(self._grant(user_id))
+
+    def _remove_waiter(self, waiter: _Waiter):
+        waiters = self._waiters.get(waiter.user_id)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        self._queued -= 1
+        if not waiters:
+            del self._waiters[waiter.user_id]
+        self._update_gauges()
+
+    def _reject(self, reason: str):
+        metrics.increment(f"{self._name}.rejected")
+        metrics.increment(f"{self._name}.rejected.{reason}")
+        logger.warning(
+            f"{self._name}: rejecting request ({reason}), "
+            f"active={self._active} queued={self._queued}"
+        )
+
+    def _retry_after(self) -> int:
+        service_time = self._avg_service_time or DEFAULT_SERVICE_TIME_SECONDS
+        # Rough estimate of how long until everyone ahead of a new request
+        # has been served.
+        estimate = service_time * (self._queued + 1) / self._max_concurrency
+        return max(1, math.ceil(min(estimate, self._max_queue_wait * 2)))
+
+    def _update_gauges(self):
+        metrics.set_gauge(f"{self._name}.active", self._active)
+        metrics.set_gauge(f"{self._name}.queued", self._queued)
+
+
+http_bot_admission = AdmissionController(
+    "bot.http.admission",
+    max_concurrency=int(os.getenv("BOT_HTTP_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+    max_queue=int(os.getenv("BOT_HTTP_MAX_QUEUE", DEFAULT_MAX_QUEUE)),
+    max_queue_wait=float(os.getenv("BOT_HTTP_MAX_QUEUE_WAIT", DEFAULT_MAX_QUEUE_WAIT_SECONDS)),
+)
@@ -1,4 +1,7 @@
+from src.bots.turn_tracer import TURN_STAGES, turn_records
 from src.common.config import SERVICE_API_KEYS
+from src.common.metrics import metrics
+from src.webapp.capacity import voice_capacity
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 
@@ -19,3 +22,27 @@ async def config():
         "webrtc-enabled": bool(SERVICE_API_KEYS["daily"]),
         "gemini-api-key": SERVICE_API_KEYS["gemini"],
     }
+
+
+@router.get("/ready", response_class=JSONResponse)
+async def ready():
+    # Fails while draining so load balancers stop sending new sessions here.
+    if voice_capacity.draining:
+        return JSONResponse({"ready": False, "sessions": voice_capacity.sessions}, status_code=503)
+    return {"ready": True, "sessions": voice_capacity.sessions}
+
+
+@router.get("/metrics", response_class=JSONResponse)
+async def get_metrics():
+    return metrics.snapshot()
+
+
+@router.get("/metrics/turns", response_class=JSONResponse)
+async def get_turn_metrics():
+    # Bot workers send their turns to this process, so this covers all of them.
+    return {
+        "stages": {stage: metrics.summary(f"bot.turn.{stage}") for stage in TURN_STAGES},
+        "llm_ttfb": metrics.summary("bot.turn.llm_ttfb"),
+        "tts_ttfb": metrics.summary("bot.turn.tts_ttfb"),
+        "turns": list(turn_records),
+    }
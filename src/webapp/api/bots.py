@@ -1,17 +1,30 @@
 from src.bots.http.bot import http_bot_pipeline
 from src.bots.types import BotParams
 from src.bots.webrtc.bot import bot_create, bot_launch, bot_launch_websocket
+from src.bots.webrtc.frame_serializer import (
+    decode_message_frame,
+    encode_delimited,
+    encode_message_frame,
+    iter_delimited,
+)
 from src.common.config import DEFAULT_BOT_CONFIG, SERVICE_API_KEYS
 from src.common.models import Attachment, Conversation, Message
-from fastapi import APIRouter, Depends, HTTPException, status, Query, WebSocket
+from src.webapp.admission import AdmissionRejected, http_bot_admission
+from src.webapp.capacity import voice_capacity
+from src.webapp.session_tokens import SessionTokenError, session_tokens
+from fastapi import APIRouter, Depends, HTTPException, status, Query, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from loguru import logger
 from bson import ObjectId
-import json
-import urllib.parse
+import asyncio
+import uuid
+from typing import Optional
 
 router = APIRouter(prefix="/bot")
 
+WEBSOCKET_HANDSHAKE_TIMEOUT_SECONDS = 10.0
+
 @router.post("/action", response_class=StreamingResponse)
 async def stream_action(params: BotParams) -> StreamingResponse:
     if not params.conversation_id:
@@ -21,19 +34,36 @@ async def stream_action(params: BotParams) -> StreamingResponse:
         )
         
     config = DEFAULT_BOT_CONFIG
-    
-    attachments = []
-    if params.attachments:
-        attachments = await Attachment.find(Attachment.attachment_id.in_(params.attachments)).to_list()
+
+    # Wait for a pipeline slot (or get rejected) before doing any work.
+    try:
+        lease = await http_bot_admission.acquire(params.user_id)
+    except AdmissionRejected as e:
+        raise e.to_http_exception()
+
+    try:
+        attachments = []
+        if params.attachments:
+            attachments = await Attachment.find(Attachment.attachment_id.in_(params.attachments)).to_list()
+    except Exception:
+        lease.release()
+        raise
 
     async def generate():
-        messages = await Message.find(Message.conversation_id == params.conversation_id).to_list()
-        gen, task = await http_bot_pipeline(params, config, messages, attachments, None)
-        async for chunk in gen:
-            yield chunk
-        await task
+        try:
+            messages = await Message.find(Message.conversation_id == params.conversation_id).to_list()
+            gen, task = await http_bot_pipeline(params, config, messages, attachments, None)
+            async for chunk in gen:
+                yield chunk
+            await task
+        finally:
+            lease.release()
 
-    return StreamingResponse(generate(), media_type="text/event-stream")
+    # The background task makes sure the slot is freed even if the client goes
+    # away before the stream is consumed.
+    return StreamingResponse(
+        generate(), media_type="text/event-stream", background=BackgroundTask(lease.release)
+    )
 
 
 @router.post("/connect", response_class=JSONResponse)
@@ -63,52 +93,75 @@ async def connect(params: BotParams):
             detail="Missing API key for transport service",
         )
     
-    # 将 BotParams 编码为查询参数
-    params_dict = params.dict()
-    params_json = json.dumps(params_dict)
-    encoded_params = urllib.parse.quote(params_json)
-    
-    ws_url = f"ws://localhost:7860/api/bot/ws?params={encoded_params}"
-    return JSONResponse({"ws_url": ws_url})
+    # The params travel in a short-lived signed token that the client sends
+    # as the first message of the session, see websocket_endpoint().
+    return JSONResponse(
+        {"ws_url": "ws://localhost:7860/api/bot/ws", "token": session_tokens.issue(params)}
+    )
+
+
+async def _session_handshake(websocket: WebSocket) -> Optional[BotParams]:
+    """Read the session token the client sends first and acknowledge it.
+
+    Returns:
+        The session's params, or None if the client went away.
+
+    Raises:
+        SessionTokenError: If the first message isn't a valid token.
+    """
+    try:
+        data = await asyncio.wait_for(websocket.receive_bytes(), WEBSOCKET_HANDSHAKE_TIMEOUT_SECONDS)
+    except WebSocketDisconnect:
+        return None
+    except (asyncio.TimeoutError, KeyError):
+        raise SessionTokenError("Expected a session token")
+
+    records = list(iter_delimited(data))
+    hello = decode_message_frame(records[0]) if records else None
+    if not isinstance(hello, dict) or not isinstance(hello.get("token"), str):
+        raise SessionTokenError("Expected a session token")
+
+    params = session_tokens.verify(hello["token"])
+    try:
+        await websocket.send_bytes(encode_delimited(encode_message_frame({"type": "session-ready"})))
+    except WebSocketDisconnect:
+        return None
+    return params
+
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, params: str = Query(None)):
-    print(f"params: {params}")
+async def websocket_endpoint(websocket: WebSocket):
+    """Voice session over a websocket.
+
+    Every binary message carries one or more protobuf ``Frame`` messages
+    (pipecat's frames.proto), each prefixed with its varint length. The
+    client starts with a ``MessageFrame`` holding ``{"token": ...}`` (from
+    ``/bot/connect``) and the server answers ``{"type": "session-ready"}``;
+    after that audio and RTVI messages flow both ways and the bot's
+    transport is the only reader of the socket.
+    """
     await websocket.accept()
-    print("WebSocket connection accepted")
-    
+
     try:
-        # 解码并解析 BotParams
-        if params:
-            decoded_params = urllib.parse.unquote(params)
-            params_dict = json.loads(decoded_params)
-            bot_params = BotParams(**params_dict)
-            print(f"Received BotParams: {bot_params}")
-        else:
-            print("No params received in WebSocket connection")
-            return
-        
-        config = DEFAULT_BOT_CONFIG
-        await bot_launch_websocket(bot_params, config, websocket)
-        
-        # 保持 WebSocket 连接活跃
-        try:
-            while True:
-                # 接收消息
-                data = await websocket.receive_text()
-                print(f"Received message: {data}")
-                
-                # 这里可以添加消息处理逻辑
-                # 例如：将消息转发给 bot pipeline
-                
-        except Exception as e:
-            print(f"WebSocket error: {e}")
-            
-    except Exception as e:
-        print(f"Exception in websocket_endpoint: {e}")
-        try:
-            await websocket.close()
-        except:
-            pass
+        params = await _session_handshake(websocket)
+    except (SessionTokenError, ValueError, IndexError) as e:
+        logger.warning(f"Rejected websocket session: {e}")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+        return
+    if params is None:
+        logger.debug("Websocket client left during the session handshake")
+        return
 
+    try:
+        voice_capacity.check()
+    except AdmissionRejected as e:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason=e.reason)
+        return
 
+    session_id = f"ws-{uuid.uuid4().hex}"
+    voice_capacity.add(session_id)
+    try:
+        logger.debug(f"Starting websocket bot for conversation {params.conversation_id}")
+        await bot_launch_websocket(params, DEFAULT_BOT_CONFIG, websocket)
+    finally:
+        voice_capacity.discard(session_id)
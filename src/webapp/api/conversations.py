@@ -1,74 +1,146 @@
 import base64
 import mimetypes
+from datetime import datetime, timedelta
 
-from src.bots.summarize import generate_conversation_summary
+from src.bots.summary_scheduler import summary_scheduler
 from src.common.config import DEFAULT_LLM_CONTEXT
+from src.common.database import raw_id
 from src.common.models import (
     Attachment,
     AttachmentUploadResponse,
     Conversation,
     ConversationCreateModel,
     ConversationModel,
+    ConversationPage,
     ConversationUpdateModel,
     Message,
     MessageCreateModel,
     MessageModel,
 )
+from src.common.response_cache import (
+    CONVERSATIONS_TAG,
+    CachedResponse,
+    conversation_tag,
+    invalidate_conversation,
+    response_cache,
+)
+from src.common.sequences import reserve_message_numbers
+from src.webapp.conditional import (
+    cache_key,
+    conditional_response,
+    is_not_modified,
+    make_etag,
+    not_modified_response,
+    validator_headers,
+)
+from src.webapp.message_import import ConversationGone, import_messages
+from src.webapp.pagination import InvalidCursor, encode_cursor, keyset_after
+from src.webapp.serializers import (
+    CONVERSATION_PROJECTION,
+    MESSAGE_PROJECTION,
+    conversation_json,
+    conversation_version,
+    dumps,
+    message_json,
+)
 from fastapi import (
     APIRouter,
-    BackgroundTasks,
     File,
     HTTPException,
+    Request,
     UploadFile,
     status,
 )
+from bson import ObjectId
 from pydantic import ValidationError
+from pymongo import ASCENDING, DESCENDING
 from fastapi.responses import StreamingResponse
 
 router = APIRouter(prefix="/conversations")
 
+DEFAULT_MESSAGES_PAGE_SIZE = 100
+MAX_MESSAGES_PAGE_SIZE = 1000
+# Documents fetched per round trip when streaming messages.
+MESSAGES_STREAM_BATCH_SIZE = 200
 
-@router.get("", response_model=list[ConversationModel], name="Get Conversations")
+
+@router.get("", response_model=ConversationPage, name="Get Conversations")
 async def get_conversations(
-    page: int = 1,
+    request: Request,
+    cursor: str | None = None,
     per_page: int = 10,
     archived: bool = False,
     q: str | None = None,
 ):
     """
-    Retrieve a list of conversations with optional pagination and filtering.
+    Retrieve a page of conversations, most recently updated first.
+
+    Pages are keyset paginated on (updatedAt, _id), so every page costs the
+    same however deep it is. The documents are read as raw projections and
+    serialized straight to the response, without Beanie or response model
+    validation.
+
+    Responses carry an ETag, a request with a matching If-None-Match gets
+    an empty 304. There is no Last-Modified: a conversation deleted or
+    archived off the page changes the page but no updatedAt on it. They are
+    also cached in memory for a few seconds, until a write invalidates them.
 
     Args:
-        page (int): The page number for pagination. Defaults to 1.
+        request (Request): The request, for its conditional headers.
+        cursor (str | None): The next_cursor of the previous page, None for the first page.
         per_page (int): The number of items per page for pagination. Defaults to 10.
         archived (bool): Filter conversations by archived status. Defaults to False.
         q (str | None): Optional query parameter to search for a conversation by ID.
 
     Returns:
-        list[ConversationModel]: A list of conversation models.
+        ConversationPage: The conversations and the cursor of the next page.
 
     Raises:
-        HTTPException: If the page or per_page is less than 1.
+        HTTPException: If per_page is less than 1 or the cursor is invalid (400).
         HTTPException: If a conversation with the specified ID is not found.
     """
-    if page < 1:
-        raise HTTPException(status_code=400, detail="Page must be greater than 0")
     if per_page < 1:
         raise HTTPException(status_code=400, detail="Per page must be greater than 0")
 
+    key = cache_key(request)
+    cached = response_cache.get(key)
+    if cached:
+        return conditional_response(request, cached)
+    generation = response_cache.generation
+
+    collection = Conversation.get_motor_collection()
     if q:
         print(f"Getting conversation by id: {q}")
-        conversation = await Conversation.get(q)
-        if conversation:
-            return [ConversationModel.model_validate(conversation)]
-        else:
+        conversation = await collection.find_one({"_id": raw_id(q)}, CONVERSATION_PROJECTION)
+        if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
-
-    offset = (page - 1) * per_page
-    conversations = await Conversation.find(
-        Conversation.archived == archived
-    ).sort(-Conversation.updated_at).skip(offset).limit(per_page).to_list()
-    return [ConversationModel.model_validate(conv.dict(by_alias=True)) for conv in conversations]
+        docs, next_cursor = [conversation], None
+    else:
+        query = {"archived": archived}
+        if cursor:
+            try:
+                query.update(keyset_after("updatedAt", cursor))
+            except InvalidCursor as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        # One more than a page tells whether there is a next one.
+        docs = (
+            await collection.find(query, CONVERSATION_PROJECTION)
+            .sort([("updatedAt", DESCENDING), ("_id", DESCENDING)])
+            .limit(per_page + 1)
+            .to_list(per_page + 1)
+        )
+        next_cursor = None
+        if len(docs) > per_page:
+            docs = docs[:per_page]
+            next_cursor = encode_cursor(docs[-1]["updatedAt"], docs[-1]["_id"])
+
+    response = CachedResponse(
+        dumps({"conversations": [conversation_json(doc) for doc in docs], "next_cursor": next_cursor}),
+        etag=make_etag([conversation_version(doc) for doc in docs], next_cursor),
+    )
+    response_cache.put(key, response, [CONVERSATIONS_TAG], generation)
+    return conditional_response(request, response)
 
 
 @router.post("", response_model=ConversationModel, status_code=status.HTTP_201_CREATED)
@@ -82,24 +154,38 @@ async def create_conversation(conversation: ConversationCreateModel):
     Returns:
         ConversationModel: The newly created conversation model.
     """
-    new_convo = Conversation(title=conversation.title or "New conversation")
+    initial_messages = []
+    for message_data in DEFAULT_LLM_CONTEXT or []:
+        try:
+            initial_messages.append(MessageCreateModel.model_validate(message_data))
+        except ValidationError:
+            continue
+
+    # A new conversation numbers and timestamps its first messages itself,
+    # like reserve_message_numbers() would.
+    now = datetime.utcnow()
+    created_at = [now + timedelta(milliseconds=index) for index in range(len(initial_messages))]
+    new_convo = Conversation(
+        title=conversation.title or "New conversation",
+        messageCount=len(initial_messages),
+        lastMessageAt=created_at[-1] if created_at else None,
+    )
     await new_convo.insert()
-    if DEFAULT_LLM_CONTEXT:
-        for message_data in DEFAULT_LLM_CONTEXT:
-            try:
-                msg = MessageCreateModel.model_validate(message_data)
-                # 自动编号 message_number
-                max_msg = await Message.find(Message.conversation_id == new_convo.id).sort(-Message.message_number).first_or_none()
-                new_number = (max_msg.message_number if max_msg else 0) + 1
-                message_doc = Message(
+    if initial_messages:
+        await Message.insert_many(
+            [
+                Message(
+                    id=str(ObjectId()),
                     conversation_id=new_convo.id,
                     content=msg.content,
-                    message_number=new_number,
+                    message_number=index + 1,
+                    created_at=created_at[index],
                     extra_metadata=msg.extra_metadata,
                 )
-                await message_doc.insert()
-            except ValidationError:
-                continue
+                for index, msg in enumerate(initial_messages)
+            ]
+        )
+    invalidate_conversation()
     return ConversationModel.model_validate(new_convo.dict(by_alias=True))
 
 
@@ -121,6 +207,7 @@ async def delete_conversation(conversation_id: str):
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     await conversation.delete()
+    invalidate_conversation(conversation_id)
     return {"detail": "Conversation deleted successfully"}
 
 
@@ -144,7 +231,12 @@ async def update_conversation(conversation_id: str, conversation_update: Convers
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
     update_data = conversation_update.model_dump(exclude_unset=True)
     if update_data:
-        await Conversation.find_one({"_id": conversation_id}).update({"$set": update_data})
+        # Moves the conversation up the list and changes its validators.
+        update_data["updatedAt"] = datetime.utcnow()
+        await Conversation.get_motor_collection().update_one(
+            {"_id": raw_id(conversation_id)}, {"$set": update_data}
+        )
+        invalidate_conversation(conversation_id)
     updated = await Conversation.get(conversation_id)
     return ConversationModel.model_validate(updated.dict(by_alias=True))
 
@@ -153,32 +245,125 @@ async def update_conversation(conversation_id: str, conversation_update: Convers
     "/{conversation_id}/messages", response_model=dict, name="Get Conversation and Messages"
 )
 async def get_conversation_messages(
+    request: Request,
     conversation_id: str,
-    background_tasks: BackgroundTasks,
+    before: str | None = None,
+    after: str | None = None,
+    limit: int = DEFAULT_MESSAGES_PAGE_SIZE,
+    stream: bool = False,
 ):
     """
-    Retrieve a conversation and its associated messages by conversation ID.
+    Retrieve a conversation and a page of its messages, oldest first.
+
+    Without a cursor the page holds the latest messages. ``before`` pages
+    back through older messages and ``after`` fetches newer ones, both
+    taking a cursor from a previous response.
+
+    With ``stream`` the response is NDJSON instead: a line with the
+    conversation, then one line per message (all of them, or those before
+    or after the cursor), serialized straight from the database cursor.
+
+    The ETag and Last-Modified come from the conversation (its updatedAt
+    and messageCount), so a poll with a matching If-None-Match or
+    If-Modified-Since gets an empty 304 without the messages being read.
+    Pages are also cached in memory for a few seconds, until a write to the
+    conversation invalidates them.
 
     Args:
+        request (Request): The request, for its conditional headers.
         conversation_id (str): The unique identifier of the conversation to retrieve.
+        before (str | None): Cursor, only return messages older than it.
+        after (str | None): Cursor, only return messages newer than it.
+        limit (int): Maximum number of messages per page. Defaults to 100.
+        stream (bool): Stream every message as NDJSON instead of returning a page.
 
     Returns:
-        dict: A dictionary containing the conversation and a list of its messages.
+        dict: The conversation, its messages, ``before_cursor``/``after_cursor``
+        (the oldest and newest message of the page) and ``has_more`` (more
+        messages in the direction of travel).
 
     Raises:
         HTTPException: If the conversation with the specified ID is not found (404).
+        HTTPException: If both cursors are given, a cursor is invalid or limit is out of range (400).
     """
-    conversation = await Conversation.get(conversation_id)
+    if before and after:
+        raise HTTPException(status_code=400, detail="Pass either before or after, not both")
+    if not 1 <= limit <= MAX_MESSAGES_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400, detail=f"Limit must be between 1 and {MAX_MESSAGES_PAGE_SIZE}"
+        )
+
+    key = cache_key(request)
+    cached = None if stream else response_cache.get(key)
+    if cached:
+        summary_scheduler.request(conversation_id)
+        return conditional_response(request, cached)
+    generation = response_cache.generation
+
+    conversation = await Conversation.get_motor_collection().find_one(
+        {"_id": raw_id(conversation_id)}, CONVERSATION_PROJECTION
+    )
     if not conversation:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
-    messages = await Message.find(Message.conversation_id == conversation_id).sort(Message.message_number).to_list()
-    message_count = len(messages)
-    # if conversation.title == "New conversation" and message_count > 3:
-    #     background_tasks.add_task(generate_conversation_summary, conversation_id, None)
-    return {
-        "conversation": ConversationModel.model_validate(conversation.dict(by_alias=True)),
-        "messages": [MessageModel.model_validate(msg.dict(by_alias=True)) for msg in messages],
-    }
+    created_by = str(conversation["createdBy"]) if conversation.get("createdBy") is not None else None
+    etag = make_etag(conversation_version(conversation), before, after, limit, stream)
+    last_modified = conversation.get("updatedAt")
+
+    query = {"conversationId": conversation_id}
+    try:
+        if before:
+            query.update(keyset_after("createdAt", before))
+        elif after:
+            query.update(keyset_after("createdAt", after, descending=False))
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Debounced and deduplicated, page loads don't each cost an LLM call.
+    summary_scheduler.request(conversation_id)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    conversation = conversation_json(conversation)
+    collection = Message.get_motor_collection()
+
+    if stream:
+        cursor = collection.find(query, MESSAGE_PROJECTION, batch_size=MESSAGES_STREAM_BATCH_SIZE)
+        cursor = cursor.sort([("createdAt", ASCENDING), ("_id", ASCENDING)])
+
+        async def lines():
+            yield dumps({"conversation": conversation}) + b"\n"
+            # One batch of documents in memory at a time.
+            async for doc in cursor:
+                yield dumps(message_json(doc, conversation_id, created_by)) + b"\n"
+
+        return StreamingResponse(
+            lines(), media_type="application/x-ndjson", headers=validator_headers(etag, last_modified)
+        )
+
+    # The latest and older pages are read newest first, newer ones oldest first.
+    direction = ASCENDING if after else DESCENDING
+    docs = (
+        await collection.find(query, MESSAGE_PROJECTION)
+        .sort([("createdAt", direction), ("_id", direction)])
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if direction == DESCENDING:
+        docs.reverse()
+
+    body = dumps(
+        {
+            "conversation": conversation,
+            "messages": [message_json(doc, conversation_id, created_by) for doc in docs],
+            "before_cursor": encode_cursor(docs[0]["createdAt"], docs[0]["_id"]) if docs else before,
+            "after_cursor": encode_cursor(docs[-1]["createdAt"], docs[-1]["_id"]) if docs else after,
+            "has_more": has_more,
+        }
+    )
+    response = CachedResponse(body, etag, last_modified)
+    response_cache.put(key, response, [conversation_tag(conversation_id)], generation)
+    return conditional_response(request, response)
 
 
 @router.post(
@@ -201,19 +386,60 @@ async def create_message(
     Raises:
         HTTPException: If the conversation with the specified ID is not found (404).
     """
-    conversation = await Conversation.get(conversation_id)
-    if not conversation:
+    # Checks the conversation exists and numbers the message in one round trip.
+    numbers = await reserve_message_numbers(conversation_id)
+    if numbers is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
-    max_msg = await Message.find(Message.conversation_id == conversation_id).sort(-Message.message_number).first_or_none()
-    new_number = (max_msg.message_number if max_msg else 0) + 1
     new_message = Message(
+        id=str(ObjectId()),
         conversation_id=conversation_id,
         content=message.content,
-        message_number=new_number,
+        message_number=numbers.first,
+        created_at=numbers.created_at(0),
         extra_metadata=message.extra_metadata,
     )
     await new_message.insert()
-    return MessageModel.model_validate(new_message.dict(by_alias=True))
+    invalidate_conversation(conversation_id)
+    summary_scheduler.request(conversation_id)
+    return MessageModel.model_validate(message_json(new_message.model_dump(by_alias=True), conversation_id))
+
+
+@router.post("/{conversation_id}/messages/import", response_model=dict, name="Import Messages")
+async def import_conversation_messages(conversation_id: str, request: Request):
+    """
+    Import many messages into a conversation at once, e.g. when migrating
+    or syncing from the chat app.
+
+    The body is a JSON array of messages or NDJSON (one message per line),
+    each a ``MessageImportModel``. It is read and validated as it arrives,
+    and written in batches, so it can hold many thousands of messages.
+    Messages are numbered in the order they are sent. One that fails
+    validation or can't be written (e.g. its ``_id`` was already imported)
+    is reported and skipped, the rest are still imported.
+
+    Args:
+        conversation_id (str): The unique identifier of the conversation to import into.
+        request (Request): The request, its body holds the messages.
+
+    Returns:
+        dict: ``received``, ``imported`` and ``failed`` counts, ``errors`` as
+        ``{index, error}`` (index of the message in the body), ``elapsed``
+        seconds and ``messages_per_second``.
+
+    Raises:
+        HTTPException: If the conversation with the specified ID is not found (404).
+    """
+    collection = Conversation.get_motor_collection()
+    if not await collection.find_one({"_id": raw_id(conversation_id)}, {"_id": 1}):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+    try:
+        result = await import_messages(conversation_id, request.stream())
+    except ConversationGone:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+    if result["imported"]:
+        invalidate_conversation(conversation_id)
+        summary_scheduler.request(conversation_id)
+    return result
 
 
 @router.post("/upload", response_model=AttachmentUploadResponse)
@@ -0,0 +1,242 @@
+import asyncio
+import os
+import resource
+import signal
+import time
+from typing import Callable, Optional, Set, Tuple
+
+from fastapi import status
+from loguru import logger
+
+from src.common.metrics import metrics
+from src.webapp.admission import AdmissionRejected
+
+DEFAULT_MAX_VOICE_SESSIONS = 50
+# Fraction of one core. Pipelines share a single event loop (per process), so
+# that is what saturates first.
+DEFAULT_MAX_CPU = 0.85
+DEFAULT_MAX_LOOP_LAG_SECONDS = 0.05
+DEFAULT_DRAIN_TIMEOUT_SECONDS = 15 * 60
+
+LOAD_SAMPLE_INTERVAL_SECONDS = 0.25
+# Weight of the newest sample in the moving averages (~2 s time constant).
+LOAD_SMOOTHING = 0.12
+
+# Clients are told to come back after roughly this long when we're full.
+OVERLOAD_RETRY_AFTER_SECONDS = 5
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Peak rather than current, but better than nothing (kB on Linux).
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class LoadMonitor:
+    """Samples the CPU usage, event loop lag and memory of the current process.
+
+    CPU and loop lag are exponential moving averages: CPU as a fraction of
+    one core (all threads of the process), loop lag as how late a timer
+    fires. RSS is the latest sample, in bytes.
+    """
+
+    def __init__(self, name: str, interval: float = LOAD_SAMPLE_INTERVAL_SECONDS):
+        self._name = name
+        self._interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.cpu = 0.0
+        self.loop_lag = 0.0
+        self.rss = 0
+        # Called after every sample, e.g. to report the load elsewhere.
+        self.on_sample: Optional[Callable[["LoadMonitor"], None]] = None
+
+    async def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_wall, last_cpu = time.monotonic(), time.process_time()
+        while True:
+            expected = loop.time() + self._interval
+            await asyncio.sleep(self._interval)
+            lag = max(0.0, loop.time() - expected)
+
+            wall, cpu = time.monotonic(), time.process_time()
+            usage = (cpu - last_cpu) / max(wall - last_wall, 1e-6)
+            last_wall, last_cpu = wall, cpu
+
+            self.cpu += LOAD_SMOOTHING * (usage - self.cpu)
+            self.loop_lag += LOAD_SMOOTHING * (lag - self.loop_lag)
+            self.rss = _rss_bytes()
+            metrics.set_gauge(f"{self._name}.cpu", self.cpu)
+            metrics.set_gauge(f"{self._name}.loop_lag", self.loop_lag)
+            metrics.set_gauge(f"{self._name}.rss", self.rss)
+
+            if self.on_sample:
+                self.on_sample(self)
+
+
+class VoiceCapacity:
+    """Admission and graceful drain for voice sessions of a server process.
+
+    A new session is admitted while the process hosts fewer than
+    ``max_sessions`` and its CPU usage and event loop lag are below their
+    limits; otherwise ``check()`` rejects it, so an overloaded server turns
+    new callers away instead of degrading every call in progress.
+
+    On SIGTERM the server drains: new sessions are rejected (and ``/api/ready``
+    fails, so load balancers move on) while live sessions get up to
+    ``drain_timeout`` seconds to finish. Only then is the signal passed on to
+    uvicorn, which shuts down as usual.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_sessions: int = DEFAULT_MAX_VOICE_SESSIONS,
+        max_cpu: float = DEFAULT_MAX_CPU,
+        max_loop_lag: float = DEFAULT_MAX_LOOP_LAG_SECONDS,
+        drain_timeout: float = DEFAULT_DRAIN_TIMEOUT_SECONDS,
+    ):
+        self._name = name
+        self._max_sessions = max_sessions
+        self._max_cpu = max_cpu
+        self._max_loop_lag = max_loop_lag
+        self._drain_timeout = drain_timeout
+        self._sessions: Set[str] = set()
+        self._draining = False
+        self._drain_task: Optional[asyncio.Task] = None
+        self._changed: Optional[asyncio.Event] = None
+        self.monitor = LoadMonitor(name)
+        # Returns the (cpu, loop_lag) the limits are checked against. This
+        # process by default; replaced when sessions run in worker processes.
+        self.load: Callable[[], Tuple[float, float]] = lambda: (
+            self.monitor.cpu,
+            self.monitor.loop_lag,
+        )
+
+    @property
+    def sessions(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
+
+    async def start(self):
+        self._changed = asyncio.Event()
+        await self.monitor.start()
+
+    async def stop(self):
+        await self.monitor.stop()
+
+    def check(self):
+        """Raise ``AdmissionRejected`` if a new session can't be taken right now."""
+        if self._draining:
+            self._reject("draining", "Server is shutting down")
+        if len(self._sessions) >= self._max_sessions:
+            self._reject("sessions", "Too many voice sessions, please retry later")
+        cpu, loop_lag = self.load()
+        if cpu >= self._max_cpu:
+            self._reject("cpu", "Server is overloaded, please retry later")
+        if loop_lag >= self._max_loop_lag:
+            self._reject("loop_lag", "Server is overloaded, please retry later")
+
+    def add(self, session_id: str):
+        self._sessions.add(session_id)
+        self._update()
+
+    def discard(self, session_id: str):
+        self._sessions.discard(session_id)
+        self._update()
+
+    def install_signal_handler(self):
+        """Drain on SIGTERM before handing the signal to the current handler (uvicorn's).
+
+        Must be called from the main thread, with the server's loop running.
+        A second SIGTERM skips the wait.
+        """
+        loop = asyncio.get_running_loop()
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def pass_on(signum, frame):
+            if callable(previous):
+                previous(signum, frame)
+            elif previous == signal.SIG_DFL:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.raise_signal(signum)
+
+        def on_sigterm(signum, frame):
+            if self._draining:
+                pass_on(signum, frame)
+                return
+
+            async def drain_then_exit():
+                await self.drain()
+                pass_on(signum, frame)
+
+            self._draining = True
+            self._drain_task = loop.create_task(drain_then_exit())
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+
+    async def drain(self, timeout: Optional[float] = None) -> int:
+        """Stop admitting sessions and wait for the live ones to end.
+
+        Returns:
+            int: The number of sessions still running when the wait ended.
+        """
+        timeout = self._drain_timeout if timeout is None else timeout
+        self._draining = True
+        metrics.set_gauge(f"{self._name}.draining", 1)
+        logger.info(f"Draining {len(self._sessions)} voice session(s), waiting up to {timeout:.0f}s")
+
+        deadline = time.monotonic() + timeout
+        while self._sessions and self._changed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+        if self._sessions:
+            logger.warning(f"Drain deadline reached with {len(self._sessions)} session(s) left")
+        else:
+            logger.info("All voice sessions finished")
+        return len(self._sessions)
+
+    def _reject(self, reason: str, detail: str):
+        metrics.increment(f"{self._name}.rejected")
+        metrics.increment(f"{self._name}.rejected.{reason}")
+        logger.warning(f"{self._name}: rejecting session ({reason}), sessions={len(self._sessions)}")
+        raise AdmissionRejected(
+            detail, OVERLOAD_RETRY_AFTER_SECONDS, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    def _update(self):
+        metrics.set_gauge(f"{self._name}.sessions", len(self._sessions))
+        if self._changed:
+            self._changed.set()
+
+
+voice_capacity = VoiceCapacity(
+    "bot.voice.capacity",
+    max_sessions=int(os.getenv("BOT_MAX_VOICE_SESSIONS", DEFAULT_MAX_VOICE_SESSIONS)),
+    max_cpu=float(os.getenv("BOT_MAX_CPU", DEFAULT_MAX_CPU)),
+    max_loop_lag=float(os.getenv("BOT_MAX_LOOP_LAG", DEFAULT_MAX_LOOP_LAG_SECONDS)),
+    drain_timeout=float(os.getenv("BOT_DRAIN_TIMEOUT", DEFAULT_DRAIN_TIMEOUT_SECONDS)),
+)
@@ -0,0 +1,79 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from src.common.metrics import metrics
+from src.common.response_cache import CachedResponse
+
+# Clients may keep responses, but must revalidate them before every use.
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """A weak ETag of the state a response was built from (not of its bytes)."""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def cache_key(request: Request) -> str:
+    return f"{request.url.path}?{request.url.query}"
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Whether the client's copy is still current (RFC 9110 section 13.1)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, and If-Modified-Since is ignored when present.
+        if if_none_match.strip() == "*":
+            return True
+        tag = _opaque(etag)
+        return any(_opaque(candidate) == tag for candidate in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP dates have whole seconds.
+        return _utc(last_modified).replace(microsecond=0) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_utc(last_modified), usegmt=True)
+    return headers
+
+
+def not_modified_response(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    metrics.increment("webapp.conditional.not_modified")
+    return Response(status_code=304, headers=validator_headers(etag, last_modified))
+
+
+def conditional_response(request: Request, response: CachedResponse) -> Response:
+    """``response`` as a 200, or an empty 304 if the client's copy is current."""
+    if is_not_modified(request, response.etag, response.last_modified):
+        return not_modified_response(response.etag, response.last_modified)
+    return Response(
+        response.body,
+        media_type="application/json",
+        headers=validator_headers(response.etag, response.last_modified),
+    )
+
+
+def _opaque(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def _utc(value: datetime) -> datetime:
+    # Mongo hands back naive datetimes in UTC.
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
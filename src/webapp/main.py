@@ -1,28 +1,39 @@
 import os
 import sys
 from contextlib import asynccontextmanager
-from typing import Dict
+from typing import Dict, Set
 import asyncio
-
-from src.bots.webrtc.bot import bot_launch_websocket, bot_launch_webrtc
+import time
+
+from src.bots.greetings import greeting_cache
+from src.bots.llm_client import summary_llm
+from src.bots.summary_scheduler import summary_scheduler
+from src.bots.title_jobs import DEFAULT_TITLE_JOB_INTERVAL_SECONDS, title_batch_job
+from src.bots.webrtc.bot import bot_offer_webrtc
+from src.bots.webrtc.bot_pipeline import GREETING_VOICES
+from src.bots.webrtc.pipeline_pool import pipeline_pool
+from src.bots.webrtc.workers import worker_supervisor
 from dotenv import load_dotenv
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from loguru import logger
 
+from .admission import AdmissionRejected
 from .api import router as api_router
+from .capacity import voice_capacity
+from .session_registry import (
+    InProcessSessionRegistry,
+    SessionForwarder,
+    SessionRegistry,
+    create_session_registry,
+)
 from pipecat_ai_small_webrtc_prebuilt.frontend import SmallWebRTCPrebuiltUI
 # 新增导入
 from src.common.database import MongoDB
-from src.common.models import Conversation, Message, Attachment
-from pipecat.transports.network.webrtc_connection import IceServer, SmallWebRTCConnection
-
-ice_servers = [
-    IceServer(
-        urls="stun:stun.l.google.com:19302",
-    )
-]
+from src.common.metrics import metrics
+from src.common.models import Attachment, Conversation, JobCheckpoint, Message
+from pipecat.transports.network.webrtc_connection import SmallWebRTCConnection
 
 load_dotenv(override=True)
 
@@ -35,18 +46,100 @@ logger.add(sys.stderr, level=os.getenv("WEBAPP_LOG_LEVEL", "DEBUG"))
 
 pcs_map: Dict[str, SmallWebRTCConnection] = {}
 
+# Which server process owns each session. Replaced in lifespan() by the
+# backend configured with SESSION_REGISTRY_URL.
+session_registry: SessionRegistry = InProcessSessionRegistry()
+session_forwarder = SessionForwarder()
+_registry_tasks: Set[asyncio.Task] = set()
+
+
+def _session_owner() -> str:
+    return session_forwarder.address or "local"
+
+
+def _owns_session(pc_id: str) -> bool:
+    return pc_id in pcs_map or worker_supervisor.owner(pc_id) is not None
+
+
+def _on_session_closed(pc_id: str):
+    voice_capacity.discard(pc_id)
+    task = asyncio.create_task(session_registry.unregister(pc_id))
+    _registry_tasks.add(task)
+    task.add_done_callback(_registry_tasks.discard)
+
+
+async def _offer_locally(request: dict) -> dict:
+    pc_id = request.get("pc_id")
+    known = bool(pc_id) and _owns_session(pc_id)
+    if not known:
+        # Renegotiations of live sessions are always served, even when
+        # draining or overloaded.
+        try:
+            voice_capacity.check()
+        except AdmissionRejected as e:
+            raise e.to_http_exception()
+    if worker_supervisor.enabled:
+        answer = await worker_supervisor.offer(request)
+    else:
+        answer = await bot_offer_webrtc(request, pcs_map, on_closed=_on_session_closed)
+    if not known:
+        voice_capacity.add(answer["pc_id"])
+        await session_registry.register(answer["pc_id"], _session_owner())
+    return answer
+
+
+async def _on_forwarded_request(message: dict) -> dict:
+    if message.get("type") == "offer":
+        return await _offer_locally(message["request"])
+    raise ValueError(f"Unknown forwarded request: {message.get('type')}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     try:
         # 初始化 MongoDB/Beanie
-        await MongoDB.init([Conversation, Message, Attachment])
-        coros = [pc.disconnect() for pc in pcs_map.values()]
-        await asyncio.gather(*coros)
-        pcs_map.clear()
+        await MongoDB.init([Conversation, Message, Attachment, JobCheckpoint])
     except Exception as e:
         logger.error(f"MongoDB connection failed: {str(e)}")
         os._exit(1)
+    global session_registry
+    session_registry = create_session_registry()
+    if session_registry.shared:
+        await session_forwarder.start(_on_forwarded_request)
+
+    # Sessions either run in worker processes or in this one, only the
+    # latter needs warm pipelines here.
+    worker_supervisor.on_session_ended = _on_session_closed
+    await worker_supervisor.start()
+    if not worker_supervisor.enabled:
+        await pipeline_pool.start()
+        await greeting_cache.start(GREETING_VOICES)
+
+    # Admission is checked against the worker that would get the session.
+    if worker_supervisor.enabled:
+        voice_capacity.load = worker_supervisor.next_worker_load
+    await voice_capacity.start()
+    voice_capacity.install_signal_handler()
+    await summary_scheduler.start()
+    await title_batch_job.start(
+        float(os.getenv("TITLE_JOB_INTERVAL", DEFAULT_TITLE_JOB_INTERVAL_SECONDS))
+    )
     yield
+    # On SIGTERM live sessions were drained before we got here, whatever is
+    # left (or everything, on Ctrl+C) is disconnected now.
+    await asyncio.gather(*[pc.disconnect() for pc in pcs_map.values()], return_exceptions=True)
+    await title_batch_job.stop()
+    await summary_scheduler.stop()
+    await summary_llm.close()
+    await voice_capacity.stop()
+    await pipeline_pool.stop()
+    await greeting_cache.stop()
+    await worker_supervisor.stop()
+    for pc_id in list(pcs_map.keys()):
+        await session_registry.unregister(pc_id)
+    await asyncio.gather(*_registry_tasks, return_exceptions=True)
+    await session_forwarder.stop()
+    await session_registry.close()
     # MongoDB 不需要像 SQLAlchemy 那样关闭连接，通常直接 yield 即可
 
 app = FastAPI(
@@ -73,28 +166,20 @@ async def home():
     return "Sesame is running"
 
 @app.post("/api/bot")
-async def offer(request: dict, background_tasks: BackgroundTasks):
+async def offer(request: dict):
     pc_id = request.get("pc_id")
 
-    if pc_id and pc_id in pcs_map:
-        pipecat_connection = pcs_map[pc_id]
-        logger.info(f"Reusing existing connection for pc_id: {pc_id}")
-        await pipecat_connection.renegotiate(
-            sdp=request["sdp"], type=request["type"], restart_pc=request.get("restart_pc", False)
-        )
-    else:
-        pipecat_connection = SmallWebRTCConnection(ice_servers)
-        await pipecat_connection.initialize(sdp=request["sdp"], type=request["type"])
-
-        @pipecat_connection.event_handler("closed")
-        async def handle_disconnected(webrtc_connection: SmallWebRTCConnection):
-            logger.info(f"Discarding peer connection for pc_id: {webrtc_connection.pc_id}")
-            pcs_map.pop(webrtc_connection.pc_id, None)
-
-        background_tasks.add_task(bot_launch_webrtc, pipecat_connection)
-
-    answer = pipecat_connection.get_answer()
-    # Updating the peer connection inside the map
-    pcs_map[answer["pc_id"]] = pipecat_connection
-
-    return answer
\ No newline at end of file
+    # Renegotiations must reach the process that holds the peer connection,
+    # which might be another server worker.
+    if pc_id and not _owns_session(pc_id) and session_registry.shared:
+        start = time.perf_counter()
+        owner = await session_registry.lookup(pc_id)
+        metrics.observe("webapp.sessions.lookup_time", time.perf_counter() - start)
+        if owner and owner != _session_owner():
+            try:
+                return await session_forwarder.forward(owner, {"type": "offer", "request": request})
+            except ConnectionError as e:
+                logger.warning(f"Dropping session {pc_id} of unreachable owner: {e}")
+                await session_registry.unregister(pc_id)
+
+    return await _offer_locally(request)
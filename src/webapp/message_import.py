@@ -0,0 +1,241 @@
+import codecs
+import json
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from src.common.metrics import metrics
+from src.common.models import Message, MessageImportModel
+from src.common.sequences import reserve_message_numbers
+
+# Messages numbered and written per round trip.
+DEFAULT_IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_MESSAGES = 100_000
+# Per-item errors reported back, the rest are only counted.
+MAX_IMPORT_ERRORS = 1000
+
+_WHITESPACE = " \t\r\n"
+
+
+class ConversationGone(Exception):
+    """The conversation was deleted while its messages were being imported."""
+
+
+class MalformedImport(Exception):
+    """The body is neither NDJSON nor a JSON array, nothing after ``index``
+    could be read."""
+
+    def __init__(self, index: int, error: str):
+        super().__init__(error)
+        self.index = index
+
+
+async def iter_import_items(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Decode a request body of messages as it arrives.
+
+    The body is either a JSON array or NDJSON (one message per line), told
+    apart by its first character. Yields ``(index, item)``, where item is
+    the decoded JSON or the ``ValueError`` a line of NDJSON failed with.
+
+    Raises:
+        MalformedImport: If the JSON array is broken, its items can't be
+            told apart after that.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    json_decoder = json.JSONDecoder()
+    buffer = ""
+    array: Optional[bool] = None
+    # Parse position in buffer, and for arrays whether an item was read
+    # since the last comma.
+    position = 0
+    after_item = False
+    index = 0
+    done = False
+
+    async for chunk in _with_end(chunks):
+        if chunk is None:
+            buffer += decoder.decode(b"", final=True)
+            done = True
+        else:
+            buffer += decoder.decode(chunk)
+
+        if array is None:
+            stripped = buffer.lstrip(_WHITESPACE + "\ufeff")
+            if not stripped:
+                continue
+            array = stripped[0] == "["
+            position = len(buffer) - len(stripped) + (1 if array else 0)
+
+        if not array:
+            # Whole lines only, the last one may still be incomplete.
+            lines = buffer.split("\n")
+            buffer = "" if done else lines.pop()
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    yield index, json.loads(line)
+                except ValueError as e:
+                    yield index, e
+                index += 1
+            continue
+
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position == len(buffer):
+                break
+            char = buffer[position]
+            if char == "]" and (after_item or index == 0):
+                return
+            if char == "," and after_item:
+                position += 1
+                after_item = False
+                continue
+            if after_item:
+                raise MalformedImport(index, f"Expected ',' or ']' at character {position}")
+            try:
+                item, end = json_decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                if done:
+                    raise MalformedImport(index, e.msg)
+                # Most likely an item cut in two by the chunk boundary.
+                break
+            yield index, item
+            index += 1
+            position = end
+            after_item = True
+
+        # Drop what was parsed so the buffer holds at most one item.
+        buffer = buffer[position:]
+        position = 0
+
+    if array:
+        raise MalformedImport(index, "Unterminated JSON array")
+
+
+async def _with_end(chunks: AsyncIterator[bytes]) -> AsyncIterator[Optional[bytes]]:
+    async for chunk in chunks:
+        yield chunk
+    yield None
+
+
+def _validation_error(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'message'}: {error['msg']}"
+        for error in e.errors()
+    )
+
+
+class MessageImport:
+    """Imports a stream of messages into one conversation.
+
+    Items are validated as they arrive and the valid ones are written a
+    batch at a time: one update reserves the batch's message numbers and
+    creation times (in the order they were sent), one unordered
+    ``insert_many`` writes it. Invalid items and failed writes (e.g. an id that was already
+    imported) don't stop the import, they are reported by their index in
+    the body.
+    """
+
+    def __init__(self, conversation_id: str, batch_size: int = DEFAULT_IMPORT_BATCH_SIZE):
+        self._conversation_id = conversation_id
+        self._batch_size = batch_size
+        self._batch: List[Tuple[int, dict]] = []
+        self.received = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    async def add(self, index: int, item: Any):
+        self.received += 1
+        if isinstance(item, Exception):
+            self.reject(index, f"Invalid JSON: {item}")
+            return
+        try:
+            message = MessageImportModel.model_validate(item)
+        except ValidationError as e:
+            self.reject(index, _validation_error(e))
+            return
+        self._batch.append((index, message.model_dump(by_alias=True, exclude_none=True)))
+        if len(self._batch) >= self._batch_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+
+        numbers = await reserve_message_numbers(self._conversation_id, len(batch))
+        if numbers is None:
+            raise ConversationGone(self._conversation_id)
+        now = datetime.utcnow()
+        docs = []
+        for index, (_, doc) in enumerate(batch):
+            doc.setdefault("_id", str(ObjectId()))
+            # Without a createdAt of their own they stay in the order sent.
+            doc.setdefault("createdAt", numbers.created_at(index))
+            doc["conversationId"] = self._conversation_id
+            doc["messageNumber"] = numbers.number(index)
+            doc["updatedAt"] = now
+            docs.append(doc)
+
+        try:
+            await Message.get_motor_collection().insert_many(docs, ordered=False)
+            self.imported += len(docs)
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            self.imported += e.details.get("nInserted", len(docs) - len(write_errors))
+            for error in write_errors:
+                self.reject(batch[error["index"]][0], error.get("errmsg", "Write failed"))
+
+    def reject(self, index: int, error: str):
+        self.failed += 1
+        if len(self.errors) < MAX_IMPORT_ERRORS:
+            self.errors.append({"index": index, "error": error})
+
+
+async def import_messages(
+    conversation_id: str,
+    chunks: AsyncIterator[bytes],
+    batch_size: int = DEFAULT_IMPORT_BATCH_SIZE,
+) -> Dict[str, Any]:
+    """Import the messages of a request body (see ``iter_import_items``).
+
+    Returns:
+        Dict[str, Any]: How many messages were received, imported and
+        failed, the first ``MAX_IMPORT_ERRORS`` errors as ``{index, error}``,
+        and the import's duration and throughput.
+
+    Raises:
+        ConversationGone: If the conversation was deleted meanwhile.
+    """
+    start = time.perf_counter()
+    job = MessageImport(conversation_id, batch_size)
+    try:
+        async for index, item in iter_import_items(chunks):
+            if index >= MAX_IMPORT_MESSAGES:
+                job.reject(index, f"Over {MAX_IMPORT_MESSAGES} messages, the rest was not imported")
+                break
+            await job.add(index, item)
+    except MalformedImport as e:
+        job.reject(e.index, f"Malformed body, the rest was not imported: {e}")
+    await job.flush()
+
+    elapsed = time.perf_counter() - start
+    rate = job.imported / elapsed if elapsed else 0.0
+    metrics.increment("webapp.messages.imported", job.imported)
+    metrics.increment("webapp.messages.import_failed", job.failed)
+    metrics.observe("webapp.messages.import_rate", rate)
+    return {
+        "received": job.received,
+        "imported": job.imported,
+        "failed": job.failed,
+        "errors": job.errors,
+        "elapsed": round(elapsed, 3),
+        "messages_per_second": round(rate, 1),
+    }
@@ -0,0 +1,42 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Tuple
+
+from src.common.database import raw_id
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort_value: datetime, id: Any) -> str:
+    """Opaque cursor for keyset pagination on ``(sort_value, _id)``."""
+    payload = json.dumps([sort_value.isoformat(), str(id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Any]:
+    """The ``(sort_value, _id)`` a cursor was made from.
+
+    Raises:
+        InvalidCursor: If the cursor wasn't made by ``encode_cursor()``.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(sort_value), raw_id(id)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_after(field: str, cursor: str, descending: bool = True) -> dict:
+    """Filter for the documents that come after ``cursor`` in ``(field, _id)`` order.
+
+    Raises:
+        InvalidCursor: If the cursor is invalid.
+    """
+    sort_value, id = decode_cursor(cursor)
+    op = "$lt" if descending else "$gt"
+    return {"$or": [{field: {op: sort_value}}, {field: sort_value, "_id": {op: id}}]}
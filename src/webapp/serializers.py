@@ -0,0 +1,106 @@
+import json
+from datetime import datetime
+from typing import Any, Optional
+
+from bson import ObjectId
+
+from src.bots.http.bot import decrypt_cryptojs
+from src.bots.summarize import message_role
+
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+# What the conversation endpoints read of a conversation document.
+CONVERSATION_PROJECTION = {
+    "title": 1,
+    "archived": 1,
+    "createdAt": 1,
+    "updatedAt": 1,
+    "createdBy": 1,
+    "messageCount": 1,
+}
+
+# What the message endpoints read of a message document.
+MESSAGE_PROJECTION = {
+    "body": 1,
+    "role": 1,
+    "userId": 1,
+    "content": 1,
+    "messageNumber": 1,
+    "language_code": 1,
+    "createdAt": 1,
+    "updatedAt": 1,
+    "extra_metadata": 1,
+}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """JSON for documents straight from Mongo (datetimes and ObjectIds included).
+
+    With orjson installed it does the encoding, several times faster than
+    the json module.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default)
+    return json.dumps(value, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def conversation_json(doc: dict) -> dict:
+    """A raw conversation document (read with ``CONVERSATION_PROJECTION``)
+    in the shape of ``ConversationModel``."""
+    return {
+        "_id": str(doc["_id"]),
+        "title": doc.get("title"),
+        "archived": doc.get("archived", False),
+        "created_at": doc.get("createdAt"),
+        "updated_at": doc.get("updatedAt"),
+    }
+
+
+def conversation_version(doc: dict) -> tuple:
+    """What a conversation's responses are built from, for their ETags.
+
+    Writes through the API and the bots move ``updatedAt``, new messages
+    ``messageCount``; the other app's renames may move neither, so the
+    title is in too.
+    """
+    return (
+        str(doc["_id"]),
+        doc.get("updatedAt"),
+        doc.get("messageCount"),
+        doc.get("title"),
+        doc.get("archived"),
+    )
+
+
+def message_json(doc: dict, conversation_id: str, created_by: Optional[str] = None) -> dict:
+    """A raw message document (read with ``MESSAGE_PROJECTION``) in the
+    shape of ``MessageModel``. ``created_by`` is the conversation's."""
+    content = doc.get("content")
+    if content is None:
+        # Messages written by the chat app only have an (encrypted) body.
+        body = doc.get("body")
+        content = {
+            "role": message_role(doc, created_by),
+            "content": decrypt_cryptojs(body, "future") if body else "",
+        }
+    return {
+        "_id": str(doc["_id"]),
+        "conversation_id": conversation_id,
+        "message_number": doc.get("messageNumber", 0),
+        "content": content,
+        "language_code": doc.get("language_code", "english"),
+        "created_at": doc.get("createdAt"),
+        "updated_at": doc.get("updatedAt"),
+        "extra_metadata": doc.get("extra_metadata"),
+    }
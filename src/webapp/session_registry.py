@@ -0,0 +1,306 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from loguru import logger
+
+from src.common.database import MongoDB
+from src.common.metrics import metrics
+
+DEFAULT_SESSION_REGISTRY_URL = "memory://"
+
+# Entries of owners that stopped without cleaning up eventually expire.
+DEFAULT_SESSION_TTL_SECONDS = 6 * 60 * 60
+
+FORWARD_TIMEOUT_SECONDS = 30.0
+# How old a forwarded request may be, replays after that are rejected.
+FORWARD_MAX_AGE_SECONDS = 30.0
+
+
+class SessionRegistry(ABC):
+    """Maps a session id (e.g. a WebRTC ``pc_id``) to the process that owns it.
+
+    Owners are addresses of a ``SessionForwarder``, so any process can hand a
+    request for a session it doesn't own to the one that does.
+    """
+
+    # Whether other processes can see the sessions registered here.
+    shared = True
+
+    @abstractmethod
+    async def register(self, session_id: str, owner: str):
+        pass
+
+    @abstractmethod
+    async def lookup(self, session_id: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    async def unregister(self, session_id: str):
+        pass
+
+    async def close(self):
+        pass
+
+
+class InProcessSessionRegistry(SessionRegistry):
+    """Plain dict, for a single server process."""
+
+    shared = False
+
+    def __init__(self):
+        self._sessions: Dict[str, str] = {}
+
+    async def register(self, session_id: str, owner: str):
+        self._sessions[session_id] = owner
+
+    async def lookup(self, session_id: str) -> Optional[str]:
+        return self._sessions.get(session_id)
+
+    async def unregister(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+
+class SQLiteSessionRegistry(SessionRegistry):
+    """SQLite file shared by the server processes of a single host."""
+
+    def __init__(self, path: str, ttl: float = DEFAULT_SESSION_TTL_SECONDS):
+        self._path = path
+        self._ttl = ttl
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(session_id TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._lock = asyncio.Lock()
+
+    async def _execute(self, sql: str, args: tuple = ()):
+        # A write waits for the file lock when another process holds it, so
+        # queries run off the loop, one at a time on the shared connection.
+        async with self._lock:
+            return await asyncio.to_thread(lambda: self._db.execute(sql, args).fetchone())
+
+    async def register(self, session_id: str, owner: str):
+        await self._execute(
+            "INSERT OR REPLACE INTO sessions (session_id, owner, expires_at) VALUES (?, ?, ?)",
+            (session_id, owner, time.time() + self._ttl),
+        )
+
+    async def lookup(self, session_id: str) -> Optional[str]:
+        row = await self._execute(
+            "SELECT owner FROM sessions WHERE session_id = ? AND expires_at > ?",
+            (session_id, time.time()),
+        )
+        return row[0] if row else None
+
+    async def unregister(self, session_id: str):
+        await self._execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    async def close(self):
+        async with self._lock:
+            await asyncio.to_thread(self._db.close)
+
+
+class MongoSessionRegistry(SessionRegistry):
+    """Collection in the app's MongoDB, shared across hosts."""
+
+    def __init__(self, collection_name: str = "sesame:sessions", ttl: float = DEFAULT_SESSION_TTL_SECONDS):
+        self._collection = MongoDB.get_client().get_default_database()[collection_name]
+        self._ttl = ttl
+        self._indexed = False
+
+    async def _ensure_index(self):
+        if not self._indexed:
+            await self._collection.create_index("expiresAt", expireAfterSeconds=0)
+            self._indexed = True
+
+    async def register(self, session_id: str, owner: str):
+        await self._ensure_index()
+        await self._collection.replace_one(
+            {"_id": session_id},
+            {
+                "_id": session_id,
+                "owner": owner,
+                "expiresAt": datetime.utcnow() + timedelta(seconds=self._ttl),
+            },
+            upsert=True,
+        )
+
+    async def lookup(self, session_id: str) -> Optional[str]:
+        doc = await self._collection.find_one({"_id": session_id}, {"owner": 1})
+        return doc["owner"] if doc else None
+
+    async def unregister(self, session_id: str):
+        await self._collection.delete_one({"_id": session_id})
+
+
+def create_session_registry(url: Optional[str] = None) -> SessionRegistry:
+    """Build a registry from a URL: ``memory://``, ``sqlite:///path/to/file`` or ``mongodb://``.
+
+    ``mongodb://`` without a host uses the app's own MongoDB connection.
+    """
+    url = url or os.getenv("SESSION_REGISTRY_URL", DEFAULT_SESSION_REGISTRY_URL)
+    if url.startswith("memory://"):
+        return InProcessSessionRegistry()
+    if url.startswith("sqlite://"):
+        path = url[len("sqlite://") :].lstrip("/") or "sesame-sessions.db"
+        if url.startswith("sqlite:////"):
+            path = "/" + path
+        return SQLiteSessionRegistry(path)
+    if url.startswith("mongodb://"):
+        return MongoSessionRegistry()
+    raise ValueError(f"Unsupported session registry URL: {url}")
+
+
+class SessionForwarder:
+    """Small RPC endpoint so other server processes can reach this one.
+
+    Requests are single JSON lines; the reply is a single JSON line with
+    either ``result`` or ``error``. It listens on a Unix socket only its
+    user can connect to, or on TCP when ``SESSION_FORWARD_HOST`` is set
+    (needed across hosts). Over TCP it binds to ``SESSION_FORWARD_BIND``
+    (default: ``SESSION_FORWARD_HOST``, the address other processes reach
+    it at).
+
+    Requests are signed with an HMAC of ``SESSION_FORWARD_SECRET`` (or
+    ``SESSION_TOKEN_SECRET``) and a timestamp, and ones with a wrong
+    signature or older than ``FORWARD_MAX_AGE_SECONDS`` are rejected. TCP
+    requires a secret; without one the Unix socket's permissions are the
+    only protection.
+    """
+
+    def __init__(self, secret: Optional[bytes] = None):
+        if secret is None:
+            secret = os.getenv("SESSION_FORWARD_SECRET") or os.getenv("SESSION_TOKEN_SECRET")
+            secret = secret.encode("utf-8") if secret else None
+        self._secret = secret
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handler: Optional[Callable[[dict], Awaitable[dict]]] = None
+        self.address: Optional[str] = None
+
+    async def start(self, handler: Callable[[dict], Awaitable[dict]]):
+        self._handler = handler
+        host = os.getenv("SESSION_FORWARD_HOST")
+        if host:
+            if not self._secret:
+                raise RuntimeError(
+                    "SESSION_FORWARD_HOST requires SESSION_FORWARD_SECRET (or SESSION_TOKEN_SECRET)"
+                )
+            bind = os.getenv("SESSION_FORWARD_BIND") or host
+            port = int(os.getenv("SESSION_FORWARD_PORT", 0))
+            self._server = await asyncio.start_server(self._on_connection, bind, port)
+            port = self._server.sockets[0].getsockname()[1]
+            self.address = f"tcp://{host}:{port}"
+        else:
+            directory = os.getenv("SESSION_FORWARD_DIR", tempfile.gettempdir())
+            path = os.path.join(directory, f"sesame-{os.getpid()}.sock")
+            if os.path.exists(path):
+                os.unlink(path)
+            self._server = await asyncio.start_unix_server(self._on_connection, path)
+            os.chmod(path, 0o600)
+            self.address = f"unix://{path}"
+        logger.info(f"Session forwarder listening on {self.address}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            if self.address and self.address.startswith("unix://"):
+                try:
+                    os.unlink(self.address[len("unix://") :])
+                except FileNotFoundError:
+                    pass
+        self._server = None
+
+    async def forward(self, owner: str, request: dict) -> dict:
+        """Send ``request`` to the process at ``owner`` and return its reply.
+
+        Raises:
+            ConnectionError: If the owner can't be reached.
+            RuntimeError: If the owner failed to handle the request.
+        """
+        start = time.perf_counter()
+        try:
+            if owner.startswith("unix://"):
+                reader, writer = await asyncio.open_unix_connection(owner[len("unix://") :])
+            else:
+                host, port = owner[len("tcp://") :].rsplit(":", 1)
+                reader, writer = await asyncio.open_connection(host, int(port))
+        except OSError as e:
+            raise ConnectionError(f"Session owner {owner} unreachable: {e}")
+
+        try:
+            writer.write(self._envelope(request) + b"\n")
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), FORWARD_TIMEOUT_SECONDS)
+        finally:
+            writer.close()
+
+        if not line:
+            raise ConnectionError(f"Session owner {owner} closed the connection")
+        reply = json.loads(line)
+        metrics.observe("webapp.sessions.forward_time", time.perf_counter() - start)
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply["result"]
+
+    def _sign(self, timestamp: str, body: str) -> str:
+        return hmac.new(self._secret, f"{timestamp}.{body}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def _envelope(self, request: dict) -> bytes:
+        body = json.dumps(request)
+        timestamp = repr(time.time())
+        signature = self._sign(timestamp, body) if self._secret else None
+        return json.dumps({"t": timestamp, "b": body, "s": signature}).encode("utf-8")
+
+    def _open(self, line: bytes) -> dict:
+        """The request in an envelope, checked against the secret.
+
+        Raises:
+            PermissionError: If the signature is wrong or the request too old.
+        """
+        try:
+            envelope = json.loads(line)
+            timestamp, body, signature = envelope["t"], envelope["b"], envelope["s"]
+            age = time.time() - float(timestamp)
+        except (ValueError, KeyError, TypeError):
+            raise PermissionError("Malformed forwarded request")
+        if self._secret and not (
+            isinstance(signature, str) and hmac.compare_digest(signature, self._sign(timestamp, body))
+        ):
+            raise PermissionError("Invalid forwarded request signature")
+        if abs(age) > FORWARD_MAX_AGE_SECONDS:
+            raise PermissionError("Forwarded request expired")
+        return json.loads(body)
+
+    async def _on_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            line = await reader.readline()
+            if not line:
+                return
+            try:
+                request = self._open(line)
+            except PermissionError as e:
+                metrics.increment("webapp.sessions.forward_rejected")
+                logger.warning(f"Rejected forwarded request: {e}")
+                reply = {"error": str(e)}
+            else:
+                try:
+                    reply = {"result": await self._handler(request)}
+                except Exception as e:
+                    logger.exception(f"Error handling forwarded request: {e}")
+                    reply = {"error": str(e)}
+            writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+            await writer.drain()
+        finally:
+            writer.close()
@@ -0,0 +1,92 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+
+from loguru import logger
+from pydantic import ValidationError
+
+from src.bots.types import BotParams
+
+DEFAULT_SESSION_TOKEN_TTL_SECONDS = 60
+
+# Truncated HMAC-SHA256, plenty for tokens that live a minute.
+SIGNATURE_SIZE = 16
+
+
+class SessionTokenError(Exception):
+    pass
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class SessionTokens:
+    """Short-lived tokens that carry the ``BotParams`` of a websocket session.
+
+    ``/api/bot/connect`` issues one and the client presents it as the first
+    message on ``/api/bot/ws``. Tokens are signed rather than stored, so any
+    server process sharing ``SESSION_TOKEN_SECRET`` can accept them.
+    """
+
+    def __init__(self, secret: bytes, ttl: float = DEFAULT_SESSION_TOKEN_TTL_SECONDS):
+        self._secret = secret
+        self._ttl = ttl
+
+    def issue(self, params: BotParams) -> str:
+        payload = {
+            "p": params.model_dump(mode="json", exclude_defaults=True),
+            "e": int(time.time() + self._ttl),
+        }
+        body = _b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        return f"{body}.{self._sign(body)}"
+
+    def verify(self, token: str) -> BotParams:
+        """Return the params of a token.
+
+        Raises:
+            SessionTokenError: If the token is malformed, forged or expired.
+        """
+        body, _, signature = token.partition(".")
+        # Bytes, compare_digest() rejects str with non-ASCII characters.
+        if (
+            not body
+            or not body.isascii()
+            or not hmac.compare_digest(signature.encode("utf-8"), self._sign(body).encode("ascii"))
+        ):
+            raise SessionTokenError("Invalid session token")
+        try:
+            payload = json.loads(_b64decode(body))
+            params = BotParams(**payload["p"])
+        except (ValueError, KeyError, TypeError, ValidationError):
+            raise SessionTokenError("Invalid session token")
+        if payload.get("e", 0) < time.time():
+            raise SessionTokenError("Session token expired")
+        return params
+
+    def _sign(self, body: str) -> str:
+        digest = hmac.new(self._secret, body.encode("ascii"), hashlib.sha256).digest()
+        return _b64encode(digest[:SIGNATURE_SIZE])
+
+
+def _secret() -> bytes:
+    secret = os.getenv("SESSION_TOKEN_SECRET")
+    if secret:
+        return secret.encode("utf-8")
+    logger.warning(
+        "SESSION_TOKEN_SECRET is not set, websocket session tokens are only valid in this process"
+    )
+    return secrets.token_bytes(32)
+
+
+session_tokens = SessionTokens(
+    _secret(), float(os.getenv("SESSION_TOKEN_TTL", DEFAULT_SESSION_TOKEN_TTL_SECONDS))
+)
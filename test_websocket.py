@@ -1,13 +1,21 @@
 #!/usr/bin/env python3
 """
-测试 WebSocket 连接和参数传递功能
+测试 WebSocket 连接和会话令牌握手
 """
 
 import asyncio
-import json
-import urllib.parse
+
+import requests
 import websockets
 
+from src.bots.webrtc.frame_serializer import (
+    decode_message_frame,
+    encode_delimited,
+    encode_message_frame,
+    iter_delimited,
+)
+
+
 async def test_websocket_connection():
     # 模拟 BotParams
     bot_params = {
@@ -16,34 +24,32 @@ async def test_websocket_connection():
         "bot_profile": "vision",
         "attachments": []
     }
-    
-    # 编码参数
-    params_json = json.dumps(bot_params)
-    encoded_params = urllib.parse.quote(params_json)
-    
-    # WebSocket URL
-    ws_url = f"ws://localhost:7860/bot/ws?params={encoded_params}"
-    
+
+    # 先通过 /connect 获取会话令牌
+    response = requests.post("http://localhost:7860/api/bot/connect", json=bot_params)
+    response.raise_for_status()
+    session = response.json()
+    ws_url = session["ws_url"]
+
     print(f"Connecting to: {ws_url}")
-    
+
     try:
         async with websockets.connect(ws_url) as websocket:
             print("WebSocket connected successfully!")
-            
-            # 发送测试消息
-            test_message = {"type": "test", "content": "Hello from client"}
-            await websocket.send(json.dumps(test_message))
-            print(f"Sent message: {test_message}")
-            
-            # 等待响应
+
+            # 第一条消息必须是会话令牌
+            await websocket.send(encode_delimited(encode_message_frame({"token": session["token"]})))
+
+            # 等待 session-ready 响应
             try:
                 response = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                print(f"Received response: {response}")
+                for record in iter_delimited(response):
+                    print(f"Received response: {decode_message_frame(record)}")
             except asyncio.TimeoutError:
                 print("No response received within 5 seconds")
-                
+
     except Exception as e:
         print(f"Connection failed: {e}")
 
 if __name__ == "__main__":
-    asyncio.run(test_websocket_connection()) 
\ No newline at end of file
+    asyncio.run(test_websocket_connection())